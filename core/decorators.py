@@ -1,11 +1,17 @@
 """
-Rate limiting decorators for Django views
+Rate limiting and HTTP caching decorators for Django views
 """
+import hashlib
+import re
 from functools import wraps
+from csp.constants import NONCE
+from django.conf import settings
 from django.core.cache import cache
 from django.http import HttpResponse
 from django.contrib import messages
+from django.middleware.csrf import _unmask_cipher_token
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
 
 
 def rate_limit(key_prefix, limit, period, message=None, methods=None):
@@ -63,6 +69,99 @@ def rate_limit(key_prefix, limit, period, message=None, methods=None):
     return decorator
 
 
+CSRF_TOKEN_RE = re.compile(rb"[A-Za-z0-9]{64}")
+
+
+def _csp_enforces_nonce():
+    policies = [
+        getattr(settings, "CONTENT_SECURITY_POLICY", None) or {},
+        getattr(settings, "CONTENT_SECURITY_POLICY_REPORT_ONLY", None) or {},
+    ]
+    return any(
+        NONCE in (sources or ())
+        for policy in policies
+        for sources in (policy.get("DIRECTIVES") or {}).values()
+    )
+
+
+def _content_etag(request, response):
+    """
+    Strong ETag from the response body. CSRF tokens are re-masked and CSP
+    nonces regenerated on every render, so both are normalized before
+    hashing and the CSRF secret's digest is mixed in instead.
+    """
+    secret = request.META.get("CSRF_COOKIE") or ""
+    body = response.content
+
+    # Only safe while the CSP header does not pin the nonce: a 304 carries a
+    # fresh header that would no longer match the cached page's nonce.
+    nonce = getattr(request, "_csp_nonce", None)
+    if isinstance(nonce, str) and not _csp_enforces_nonce():
+        body = body.replace(nonce.encode(), b"{nonce}")
+
+    def normalize(match):
+        token = match.group().decode()
+        if secret and _unmask_cipher_token(token) == secret:
+            return b"{csrf}"
+        return match.group()
+
+    body = CSRF_TOKEN_RE.sub(normalize, body)
+    digest = hashlib.sha256(body)
+    digest.update(hashlib.sha256(secret.encode()).digest())
+    digest.update(b"hx" if request.headers.get("HX-Request") else b"page")
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def cache_policy(max_age=0, vary=("Cookie", "HX-Request")):
+    """
+    Cache-Control, Vary and ETag/304 handling for GET/HEAD storefront pages
+
+    Anonymous 200 responses get a content-hash ETag and are answered with a
+    304 when the client already has them. They are always private because
+    pages carry the shopper's session cart and CSRF token. Authenticated
+    responses are marked private and no-cache without validators. Responses
+    that already set Cache-Control (e.g. cached product grids) keep their own
+    policy.
+
+    Args:
+        max_age (int): Seconds the browser may reuse a page without
+            revalidating (default 0: always revalidate)
+        vary (tuple): Request headers the response varies on; HX-Request keeps
+            HTMX partials and full pages apart in caches
+
+    Example:
+        @cache_policy()
+        def about(request):
+            ...
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = view_func(request, *args, **kwargs)
+            if request.method not in ("GET", "HEAD"):
+                return response
+
+            patch_vary_headers(response, vary)
+            if response.status_code != 200 or response.streaming or response.has_header("Cache-Control"):
+                return response
+
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+                return response
+
+            if max_age:
+                patch_cache_control(response, private=True, max_age=max_age)
+            else:
+                patch_cache_control(response, private=True, no_cache=True)
+
+            if not response.has_header("ETag"):
+                response.headers["ETag"] = _content_etag(request, response)
+            return get_conditional_response(request, etag=response.headers["ETag"], response=response)
+
+        return wrapper
+    return decorator
+
+
 def get_client_ip(request):
     """
     Get the client's IP address from the request
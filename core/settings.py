@@ -68,6 +68,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
     'core.middleware.HtmxMessageMiddleware',
+    'order.middleware.CartCookieMiddleware',
 ]
 
 if DEBUG:
@@ -116,6 +117,44 @@ else:
         "default": dj_database_url.config(conn_max_age=600)
     }
 
+# ============================================================
+# CACHE
+# ============================================================
+
+# Catalog snapshots and rate limits must be shared by every gunicorn worker,
+# so production points this at Redis. Without REDIS_URL each process keeps
+# its own cache and catalog changes take up to CATALOG_CACHE_TIMEOUT to show.
+REDIS_URL = config("REDIS_URL", default="")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+
+CATALOG_CACHE_TIMEOUT = config("CATALOG_CACHE_TIMEOUT", default=300, cast=int)
+
+# Rendered cart sidebars are cached per cart version (see order.cart)
+CART_CACHE_TIMEOUT = config("CART_CACHE_TIMEOUT", default=3600, cast=int)
+
+# "cookie" keeps anonymous shoppers' carts in a signed cookie until they
+# outgrow CART_COOKIE_MAX_BYTES; "session" always uses the cart tables
+CART_BACKEND = config("CART_BACKEND", default="session")
+CART_COOKIE_MAX_BYTES = config("CART_COOKIE_MAX_BYTES", default=2048, cast=int)
+
+# Products per storefront grid page; later pages load as the shopper scrolls
+STOREFRONT_PAGE_SIZE = config("STOREFRONT_PAGE_SIZE", default=24, cast=int)
+
+# Product image derivatives are built on a background thread after commit;
+# disable to build them inline (management commands, debugging)
+IMAGE_DERIVATIVES_ASYNC = config("IMAGE_DERIVATIVES_ASYNC", default=True, cast=bool)
+
 # ============================================================
 # STATIC & MEDIA
 # ============================================================
@@ -124,6 +163,9 @@ STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_DIRS = [BASE_DIR / "static"]
 
+# Standalone Tailwind CLI used by `manage.py build_assets` (static/build)
+TAILWINDCSS_VERSION = config("TAILWINDCSS_VERSION", default="v3.4.17")
+
 if DEBUG:
     STORAGES = {
         "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
@@ -156,6 +198,18 @@ STRIPE_PUBLISHABLE_KEY = config("STRIPE_PUBLISHABLE_KEY", default="")
 STRIPE_SECRET_KEY = config("STRIPE_SECRET_KEY", default="")
 STRIPE_WEBHOOK_SECRET = config("STRIPE_WEBHOOK_SECRET", default="")
 
+# Shared Stripe HTTP client (order.stripe_client): pooled keep-alive
+# connections, bounded timeouts (seconds), jittered retries and a circuit
+# breaker that fails fast after consecutive connection/5xx failures.
+# STRIPE_API_BASE points the client at a local Stripe stand-in.
+STRIPE_API_BASE = config("STRIPE_API_BASE", default="https://api.stripe.com")
+STRIPE_CONNECT_TIMEOUT = config("STRIPE_CONNECT_TIMEOUT", default=3.0, cast=float)
+STRIPE_READ_TIMEOUT = config("STRIPE_READ_TIMEOUT", default=10.0, cast=float)
+STRIPE_MAX_NETWORK_RETRIES = config("STRIPE_MAX_NETWORK_RETRIES", default=2, cast=int)
+STRIPE_POOL_SIZE = config("STRIPE_POOL_SIZE", default=10, cast=int)
+STRIPE_BREAKER_THRESHOLD = config("STRIPE_BREAKER_THRESHOLD", default=5, cast=int)
+STRIPE_BREAKER_RESET_SECONDS = config("STRIPE_BREAKER_RESET_SECONDS", default=30.0, cast=float)
+
 # ============================================================
 # CRISPY FORMS
 # ============================================================
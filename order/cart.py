@@ -0,0 +1,644 @@
+"""
+Server-side cart store
+
+Cart lines live in their own table (Cart/CartLine) instead of a JSON list in
+the session, so adding, updating or deleting a line is a single-row write and
+the session itself is only written once, when the cart is created and its id
+stored under CART_SESSION_KEY.
+
+Identical adds (same product, size, category, color and back name) are merged
+into one line by incrementing its quantity. Lines are addressed by their
+primary key, which stays stable for the life of the line.
+
+Whenever a cart changes, CartCookieMiddleware reissues a signed "cart" cookie
+holding the line count, a fresh version token and the cart id. The sidebar
+fragment is cached and ETagged by that version, so unchanged carts are served
+from cache or as 304s, empty carts without touching the database, and the
+badge count is read from the cookie in the browser.
+
+With CART_BACKEND = "cookie", anonymous shoppers' carts (and their selected
+collection) are kept in signed cookies instead (CookieCart), so browsing and
+carting write nothing to the database until checkout. A cart that outgrows
+CART_COOKIE_MAX_BYTES moves into the server-side store.
+"""
+import hashlib
+import json
+import secrets
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from .catalog import get_catalog_version, get_variant_index
+from .models import Cart, CartLine, Product
+from .pricing import PRICING_VERSION, from_cents, parse_id, price_cart, to_cents
+
+CART_SESSION_KEY = "cart_id"
+# Carts from before the cart store, imported on first access
+LEGACY_SESSION_KEY = "current_order_items"
+
+CART_COOKIE = "cart"
+CART_ITEMS_COOKIE = "cart_items"
+COLLECTION_COOKIE = "collection"
+COLLECTION_SESSION_KEY = "selected_collection_id"
+CART_TEMPLATE = "order/partials/_shopping-cart.html"
+CART_OOB_TEMPLATE = "order/partials/_cart-oob.html"
+# Largest quantity a single bulk or roster add may ask for per line
+MAX_LINE_QUANTITY = 500
+
+_signer = signing.Signer(salt="order.cart")
+_ITEMS_SALT = "order.cart.items"
+
+
+def line_key(product_id, size, category_id=None, color_id=None, back_name=""):
+    """Identity of a cart line; adds with the same key are merged"""
+    identity = [parse_id(product_id), size or "", parse_id(category_id), parse_id(color_id), back_name or ""]
+    return hashlib.sha256(json.dumps(identity).encode()).hexdigest()
+
+
+class SessionCart:
+    """
+    The cart belonging to a session.
+
+    ``items()`` returns the lines as dicts in the shape price_cart and the
+    cart templates expect (product_id, product_name, size, quantity,
+    color_id, color_name, category_id, category_name, price, back_name) plus
+    ``line_id`` and the line's ``product``. Lines and prices are loaded once
+    and reused until the cart changes, so the cart sidebar, the summary modal
+    and checkout share them within a request (see get_cart).
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self._lines = None
+        self._priced = None
+        # New version token when the cart cookie needs reissuing (see
+        # CartCookieMiddleware)
+        self.version = None
+        if LEGACY_SESSION_KEY in session:
+            self._import_legacy(session.pop(LEGACY_SESSION_KEY) or [])
+
+    @property
+    def cart_id(self):
+        return self.session.get(CART_SESSION_KEY)
+
+    def _cart_id(self, create=False):
+        cart_id = self.cart_id
+        if cart_id is None and create:
+            cart_id = Cart.objects.create().pk
+            self.session[CART_SESSION_KEY] = cart_id
+        return cart_id
+
+    def _import_legacy(self, items):
+        products = Product.objects.in_bulk({parse_id(item.get("product_id")) for item in items} - {None})
+        for item in items:
+            product = products.get(parse_id(item.get("product_id")))
+            if product is None:
+                continue
+            self.add(
+                product.pk,
+                item.get("product_name") or product.name,
+                item.get("size"),
+                item.get("quantity", 1),
+                color_id=item.get("color_id"),
+                color_name=item.get("color_name"),
+                category_id=item.get("category_id"),
+                category_name=item.get("category_name"),
+                price=item.get("price"),
+                back_name=item.get("back_name"),
+            )
+
+    @property
+    def changed(self):
+        return self.version is not None
+
+    def touch(self):
+        """Give the cart a new version so its cookie is reissued"""
+        self.version = secrets.token_hex(8)
+
+    def _changed(self):
+        self._lines = None
+        self._priced = None
+        self.touch()
+
+    def lines(self):
+        """CartLines with their products, in the order they were added"""
+        if self._lines is None:
+            cart_id = self.cart_id
+            self._lines = list(
+                CartLine.objects.filter(cart_id=cart_id).select_related("product")
+            ) if cart_id is not None else []
+        return self._lines
+
+    def items(self):
+        return [
+            {
+                "line_id": line.pk,
+                "product": line.product,
+                "product_id": line.product_id,
+                "product_name": line.product.name,
+                "size": line.size,
+                "quantity": line.quantity,
+                "color_id": line.color_id,
+                "color_name": line.color_name,
+                "category_id": line.category_id,
+                "category_name": line.category_name,
+                "price": str(line.price),
+                "back_name": line.back_name,
+            }
+            for line in self.lines()
+        ]
+
+    def priced(self):
+        """price_cart's (priced_lines, total_cents) for the cart"""
+        if self._priced is None:
+            self._priced = price_cart(self.items())
+        return self._priced
+
+    def __len__(self):
+        if self._lines is None:
+            cart_id = self.cart_id
+            return CartLine.objects.filter(cart_id=cart_id).count() if cart_id is not None else 0
+        return len(self._lines)
+
+    def add(self, product_id, product_name, size, quantity=1, color_id=None, color_name=None,
+            category_id=None, category_name=None, price=None, back_name=""):
+        """
+        Add ``quantity`` of a line, merging into an identical existing line.
+
+        Returns:
+            the line's id
+        """
+        cart_id = self._cart_id(create=True)
+        key = line_key(product_id, size, category_id, color_id, back_name)
+        quantity = max(int(quantity or 1), 1)
+        self._changed()
+
+        lines = CartLine.objects.filter(cart_id=cart_id, line_key=key)
+        if not lines.update(quantity=F("quantity") + quantity):
+            try:
+                with transaction.atomic():
+                    return CartLine.objects.create(
+                        cart_id=cart_id,
+                        line_key=key,
+                        product_id=product_id,
+                        product_name=product_name,
+                        size=size or "",
+                        quantity=quantity,
+                        color_id=parse_id(color_id),
+                        color_name=color_name,
+                        category_id=parse_id(category_id),
+                        category_name=category_name,
+                        price=Decimal(price or "0.00"),
+                        back_name=back_name or "",
+                    ).pk
+            except IntegrityError:
+                # A concurrent add created the line first
+                lines.update(quantity=F("quantity") + quantity)
+        return lines.values_list("pk", flat=True).first()
+
+    def add_many(self, product_id, product_name, quantities, color_id=None, color_name=None,
+                 category_id=None, category_name=None, price=None, back_name=""):
+        """
+        Add several sizes of one product variant at once.
+
+        Args:
+            quantities: {size: quantity}
+        """
+        self.add_lines([
+            {
+                "product_id": product_id, "product_name": product_name, "size": size, "quantity": quantity,
+                "color_id": color_id, "color_name": color_name, "category_id": category_id,
+                "category_name": category_name, "price": price, "back_name": back_name,
+            }
+            for size, quantity in quantities.items()
+        ])
+
+    def add_lines(self, lines):
+        """
+        Add many lines at once (dicts of add's arguments). Existing lines are
+        incremented with a single UPDATE and new ones created with a single
+        INSERT, all in one transaction.
+        """
+        merged = {}
+        for line in lines:
+            if line["quantity"] <= 0:
+                continue
+            key = line_key(line["product_id"], line["size"], line["category_id"], line["color_id"], line["back_name"])
+            if key in merged:
+                merged[key] = {**merged[key], "quantity": merged[key]["quantity"] + line["quantity"]}
+            else:
+                merged[key] = line
+        if not merged:
+            return
+        cart_id = self._cart_id(create=True)
+        self._changed()
+
+        try:
+            with transaction.atomic():
+                existing_lines = CartLine.objects.filter(cart_id=cart_id, line_key__in=merged)
+                existing = set(existing_lines.values_list("line_key", flat=True))
+                if existing:
+                    existing_lines.update(quantity=F("quantity") + Case(
+                        *(When(line_key=key, then=Value(merged[key]["quantity"])) for key in existing),
+                        output_field=PositiveIntegerField(),
+                    ))
+                CartLine.objects.bulk_create([
+                    CartLine(
+                        cart_id=cart_id,
+                        line_key=key,
+                        product_id=line["product_id"],
+                        product_name=line["product_name"],
+                        size=line["size"],
+                        quantity=line["quantity"],
+                        color_id=parse_id(line["color_id"]),
+                        color_name=line["color_name"],
+                        category_id=parse_id(line["category_id"]),
+                        category_name=line["category_name"],
+                        price=Decimal(line["price"] or "0.00"),
+                        back_name=line["back_name"] or "",
+                    )
+                    for key, line in merged.items() if key not in existing
+                ])
+        except IntegrityError:
+            # A concurrent add created one of the lines first
+            with transaction.atomic():
+                for line in merged.values():
+                    self.add(**line)
+
+    def set_quantity(self, line_id, quantity):
+        """Set a line's quantity, removing it at zero. Returns False if not in this cart."""
+        if quantity <= 0:
+            return self.remove(line_id)
+        self._changed()
+        return bool(CartLine.objects.filter(cart_id=self.cart_id, pk=line_id).update(quantity=quantity))
+
+    def remove(self, line_id):
+        """Delete a line. Returns False if it is not in this cart."""
+        self._changed()
+        deleted, _ = CartLine.objects.filter(cart_id=self.cart_id, pk=line_id).delete()
+        return bool(deleted)
+
+    def clear(self):
+        """Delete the cart and forget it in the session"""
+        cart_id = self.session.pop(CART_SESSION_KEY, None)
+        if cart_id is not None:
+            Cart.objects.filter(pk=cart_id).delete()
+        self._lines = []
+        self._priced = None
+        self.touch()
+
+
+class CookieCart:
+    """
+    An anonymous shopper's cart held in a signed cookie, with the same
+    interface as SessionCart. Each line is stored as a compact row
+
+        [line id, product id, size, quantity, category id, color id, back name, base cents]
+
+    and product, category and color names are resolved when the cart is read.
+    """
+    cart_id = None
+
+    def __init__(self, request):
+        self.request = request
+        self._items = None
+        self._priced = None
+        self.version = None
+        self.rows, self.next_id = self._load(request.COOKIES.get(CART_ITEMS_COOKIE))
+
+    @staticmethod
+    def _load(value):
+        if value:
+            try:
+                data = signing.loads(value, salt=_ITEMS_SALT)
+                return [list(row) for row in data["l"]], int(data["n"])
+            except (signing.BadSignature, KeyError, TypeError, ValueError):
+                pass
+        return [], 1
+
+    def dumps(self):
+        """The signed cookie value for the cart"""
+        return signing.dumps({"n": self.next_id, "l": self.rows}, salt=_ITEMS_SALT, compress=True)
+
+    @property
+    def changed(self):
+        return self.version is not None
+
+    def touch(self):
+        """Version the cart by its contents so identical carts share a cached fragment"""
+        self.version = hashlib.sha256(json.dumps(self.rows).encode()).hexdigest()[:16]
+
+    def _changed(self):
+        self._items = None
+        self._priced = None
+        self.touch()
+
+    def _row(self, line_id):
+        for row in self.rows:
+            if row[0] == line_id:
+                return row
+        return None
+
+    def items(self):
+        if self._items is None and not self.rows:
+            self._items = []
+        if self._items is None:
+            index = get_variant_index()
+            products = Product.objects.in_bulk({row[1] for row in self.rows})
+            self._items = [
+                {
+                    "line_id": line_id,
+                    "product": products[product_id],
+                    "product_id": product_id,
+                    "product_name": products[product_id].name,
+                    "size": size,
+                    "quantity": quantity,
+                    "color_id": color_id,
+                    "color_name": index.color_name(color_id),
+                    "category_id": category_id,
+                    "category_name": index.category_name(category_id),
+                    "price": str(from_cents(cents)),
+                    "back_name": back_name,
+                }
+                for line_id, product_id, size, quantity, category_id, color_id, back_name, cents in self.rows
+                if product_id in products
+            ]
+        return self._items
+
+    def priced(self):
+        """price_cart's (priced_lines, total_cents) for the cart"""
+        if self._priced is None:
+            self._priced = price_cart(self.items())
+        return self._priced
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, product_id, product_name, size, quantity=1, color_id=None, color_name=None,
+            category_id=None, category_name=None, price=None, back_name=""):
+        """
+        Add ``quantity`` of a line, merging into an identical existing line.
+
+        Returns:
+            the line's id
+        """
+        line_id = self._add_row(product_id, size, max(int(quantity or 1), 1), color_id, category_id, price, back_name)
+        if len(self.dumps()) > settings.CART_COOKIE_MAX_BYTES:
+            return self._move_to_server(line_id)
+        return line_id
+
+    def add_many(self, product_id, product_name, quantities, color_id=None, color_name=None,
+                 category_id=None, category_name=None, price=None, back_name=""):
+        """Add several sizes of one product variant at once ({size: quantity})"""
+        for size, quantity in quantities.items():
+            if quantity > 0:
+                self._add_row(product_id, size, quantity, color_id, category_id, price, back_name)
+        self._fit()
+
+    def add_lines(self, lines):
+        """Add many lines at once (dicts of add's arguments)"""
+        for line in lines:
+            if line["quantity"] > 0:
+                self._add_row(line["product_id"], line["size"], line["quantity"], line["color_id"],
+                              line["category_id"], line["price"], line["back_name"])
+        self._fit()
+
+    def _fit(self):
+        if len(self.dumps()) > settings.CART_COOKIE_MAX_BYTES:
+            self._move_to_server(None)
+
+    def _add_row(self, product_id, size, quantity, color_id, category_id, price, back_name):
+        identity = [parse_id(product_id), size or "", parse_id(category_id), parse_id(color_id), back_name or ""]
+        self._changed()
+
+        for row in self.rows:
+            if [row[1], row[2], row[4], row[5], row[6]] == identity:
+                row[3] += quantity
+                return row[0]
+
+        line_id = self.next_id
+        self.next_id += 1
+        self.rows.append([line_id, identity[0], identity[1], quantity, identity[2], identity[3],
+                          identity[4], to_cents(price or "0.00")])
+        return line_id
+
+    def _move_to_server(self, line_id):
+        """Copy the cart into the server-side store and use that from now on"""
+        index = get_variant_index()
+        server = SessionCart(self.request.session)
+        line_ids = {}
+        for row_id, product_id, size, quantity, category_id, color_id, back_name, cents in self.rows:
+            product = index.get_product(product_id)
+            if product is None:
+                continue
+            line_ids[row_id] = server.add(
+                product_id, product["name"], size, quantity,
+                color_id=color_id,
+                color_name=index.color_name(color_id),
+                category_id=category_id,
+                category_name=index.category_name(category_id),
+                price=from_cents(cents),
+                back_name=back_name,
+            )
+        self.rows = []
+        self.request._cart = server
+        return line_ids.get(line_id)
+
+    def set_quantity(self, line_id, quantity):
+        """Set a line's quantity, removing it at zero. Returns False if not in this cart."""
+        if quantity <= 0:
+            return self.remove(line_id)
+        row = self._row(line_id)
+        if row is None:
+            return False
+        row[3] = quantity
+        self._changed()
+        return True
+
+    def remove(self, line_id):
+        """Delete a line. Returns False if it is not in this cart."""
+        row = self._row(line_id)
+        if row is None:
+            return False
+        self.rows.remove(row)
+        self._changed()
+        return True
+
+    def clear(self):
+        self.rows = []
+        self._changed()
+
+
+def _uses_cookies(request):
+    return settings.CART_BACKEND == "cookie" and not request.user.is_authenticated
+
+
+def get_cart(request):
+    """The request's cart, shared by every caller within the request"""
+    if not hasattr(request, "_cart"):
+        token = read_cart_token(request)
+        # A cookie cart that outgrew the cookie carries its server cart's id
+        if _uses_cookies(request) and not (token and token.cart_id):
+            request._cart = CookieCart(request)
+        else:
+            request._cart = SessionCart(request.session)
+    return request._cart
+
+
+def get_selected_collection_id(request):
+    """The collection the shopper picked on the storefront, if any"""
+    if hasattr(request, "_selected_collection_id"):
+        return request._selected_collection_id
+    if _uses_cookies(request):
+        return parse_id(request.COOKIES.get(COLLECTION_COOKIE))
+    return request.session.get(COLLECTION_SESSION_KEY)
+
+
+def select_collection(request, collection_id):
+    """Remember (or with None, forget) the shopper's collection"""
+    if _uses_cookies(request):
+        # Written to the response by CartCookieMiddleware
+        request._selected_collection_id = collection_id
+    elif collection_id is None:
+        request.session.pop(COLLECTION_SESSION_KEY, None)
+    else:
+        request.session[COLLECTION_SESSION_KEY] = collection_id
+
+
+class CartToken(NamedTuple):
+    count: int
+    version: str
+    cart_id: int | None
+
+
+def read_cart_token(request):
+    """The request's cart cookie, or None if it is missing or tampered with"""
+    value = request.COOKIES.get(CART_COOKIE)
+    if not value:
+        return None
+    try:
+        count, version, cart_id = _signer.unsign(value).split(".")
+        return CartToken(int(count), version, parse_id(cart_id) or None)
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+def _set_cookie(response, name, value, httponly=True):
+    response.set_cookie(
+        name, value,
+        max_age=settings.SESSION_COOKIE_AGE,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=httponly,
+        samesite="Lax",
+    )
+
+
+def set_cart_cookies(request, response):
+    """
+    Write the request's changed cart (and, for cookie carts, the selected
+    collection) back to cookies.
+    """
+    cart = getattr(request, "_cart", None)
+    if cart is not None and cart.changed:
+        if isinstance(cart, CookieCart) and len(cart):
+            _set_cookie(response, CART_ITEMS_COOKIE, cart.dumps())
+        elif CART_ITEMS_COOKIE in request.COOKIES:
+            response.delete_cookie(CART_ITEMS_COOKIE, samesite="Lax")
+
+        # Not HttpOnly: cart.js reads the line count for the badge
+        _set_cookie(response, CART_COOKIE, _signer.sign(f"{len(cart)}.{cart.version}.{cart.cart_id or 0}"),
+                    httponly=False)
+
+    if hasattr(request, "_selected_collection_id"):
+        if request._selected_collection_id is None:
+            response.delete_cookie(COLLECTION_COOKIE, samesite="Lax")
+        else:
+            _set_cookie(response, COLLECTION_COOKIE, str(request._selected_collection_id))
+
+
+def render_cart(request):
+    """The cart sidebar fragment for the request's cart"""
+    priced_lines, total_cents = get_cart(request).priced()
+    return render_to_string(CART_TEMPLATE, {
+        "order_items": [{**line, "product_price": from_cents(line["unit_cents"])} for line in priced_lines],
+        "total_cost": from_cents(total_cents),
+    })
+
+
+def cart_oob_response(request, trigger=None):
+    """
+    Response to a cart action carrying the updated sidebar and badge counts as
+    hx-swap-oob content, so the browser needs no follow-up cart request.
+    """
+    cart = get_cart(request)
+    html = render_cart(request)
+    if cart.changed:
+        # Warm the cache for the version the cookie is about to carry
+        cache.set(_cart_cache_key(cart.cart_id, cart.version), html, settings.CART_CACHE_TIMEOUT)
+
+    response = HttpResponse(render_to_string(CART_OOB_TEMPLATE, {"cart_html": html, "count": len(cart)}))
+    if trigger:
+        response.headers["HX-Trigger"] = trigger
+    return response
+
+
+def _cart_cache_key(cart_id, version):
+    return f"cart:{cart_id or 'cookie'}:{version}:{get_catalog_version()}:{PRICING_VERSION}"
+
+
+def _cart_etag(token):
+    return f'"cart-{token.version}-{get_catalog_version()}-{PRICING_VERSION}"'
+
+
+def cart_fragment_response(request):
+    """
+    HttpResponse for the cart sidebar.
+
+    Without a session there is no cart, and a cart cookie says how many lines
+    there are, so empty carts are rendered without reading the session.
+    Non-empty carts are cached and ETagged by the cookie's version; a cookie
+    that no longer matches the session's cart is replaced.
+    """
+    token = read_cart_token(request)
+    has_session = settings.SESSION_COOKIE_NAME in request.COOKIES
+    etag = None
+
+    if (token is None and not has_session) or (token is not None and not token.count):
+        html = render_to_string(CART_TEMPLATE, {"order_items": [], "total_cost": from_cents(0)})
+    elif token is None:
+        # A session from before the cart cookie: render it and issue one
+        html = render_cart(request)
+        get_cart(request).touch()
+    else:
+        etag = _cart_etag(token)
+        if request.method in ("GET", "HEAD"):
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                patch_vary_headers(not_modified, ["Cookie"])
+                return not_modified
+
+        key = _cart_cache_key(token.cart_id, token.version)
+        html = cache.get(key)
+        if html is None:
+            cart = get_cart(request)
+            html = render_cart(request)
+            if cart.cart_id == token.cart_id and len(cart) == token.count:
+                cache.set(key, html, settings.CART_CACHE_TIMEOUT)
+            else:
+                cart.touch()
+                etag = None
+
+    response = HttpResponse(html)
+    if etag:
+        response.headers["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Cookie"])
+    return response
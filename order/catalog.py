@@ -0,0 +1,301 @@
+"""
+Versioned catalog snapshots for the storefront
+
+The product -> category/colors/variants graph for a collection is built once,
+pickled into the cache under the current catalog version and served from
+there until a catalog model changes (see order.signals).
+"""
+import base64
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from .models import Collection, Product, ProductCategory, ProductColor, ProductVariant, Size
+from .pricing import PriceTable, parse_id, to_cents
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_UPDATED_KEY = "catalog:updated-at"
+CATALOG_HITS_KEY = "catalog:hits"
+CATALOG_MISSES_KEY = "catalog:misses"
+
+
+def get_catalog_version():
+    """
+    Current catalog version. A missing key (cold or evicted cache) is seeded
+    from the clock so it never goes backwards onto stale snapshot keys.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def get_catalog_updated_at():
+    """Unix timestamp of the last catalog change seen by this cache"""
+    updated_at = cache.get(CATALOG_UPDATED_KEY)
+    if updated_at is None:
+        cache.add(CATALOG_UPDATED_KEY, int(time.time()), timeout=None)
+        updated_at = cache.get(CATALOG_UPDATED_KEY)
+    return updated_at
+
+
+def bump_catalog_version():
+    """Invalidate every snapshot built under the current version"""
+    cache.set(CATALOG_UPDATED_KEY, int(time.time()), timeout=None)
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+        return cache.incr(CATALOG_VERSION_KEY)
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def catalog_stats():
+    """Snapshot hit/miss counters for this cache"""
+    hits = cache.get(CATALOG_HITS_KEY, 0)
+    misses = cache.get(CATALOG_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "version": get_catalog_version(),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else 0.0,
+    }
+
+
+def _storefront_products(queryset):
+    return list(
+        queryset.filter(active=True)
+        .select_related("collection")
+        .prefetch_related(
+            "category", "colors",
+            Prefetch("variants", queryset=ProductVariant.objects.select_related("category", "color")),
+        )
+        .order_by("name", "pk")
+    )
+
+
+def _get_or_build(name, builder):
+    key = f"catalog:{get_catalog_version()}:{name}"
+    snapshot = cache.get(key)
+    if snapshot is None:
+        _count(CATALOG_MISSES_KEY)
+        snapshot = builder()
+        cache.set(key, snapshot, settings.CATALOG_CACHE_TIMEOUT)
+    else:
+        _count(CATALOG_HITS_KEY)
+    return snapshot
+
+
+def get_collection_snapshot(collection_id):
+    """
+    Snapshot for one collection, or None if it does not exist.
+
+    Returns:
+        dict with "collection" and "products" (active products ordered by
+        name, with categories, colors and variants prefetched)
+    """
+    def build():
+        collection = Collection.objects.filter(pk=collection_id).first()
+        if collection is None:
+            return {"collection": None, "products": []}
+        return {
+            "collection": collection,
+            "products": _storefront_products(Product.objects.filter(collection=collection)),
+        }
+
+    snapshot = _get_or_build(f"collection:{collection_id}", build)
+    if snapshot["collection"] is None:
+        return None
+    return snapshot
+
+
+def get_active_products():
+    """Active products across every active collection (admin storefront view)"""
+    return _get_or_build(
+        "active-products",
+        lambda: _storefront_products(Product.objects.filter(collection__active=True)),
+    )
+
+
+def encode_cursor(product):
+    """Opaque keyset cursor pointing just after ``product`` in snapshot order"""
+    raw = json.dumps([product.name, product.pk], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(name, pk) from a cursor, or None for a missing or malformed one"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        name, pk = json.loads(raw)
+        return str(name), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def page_products(products, cursor=None, page_size=None):
+    """
+    One page of a snapshot's products (ordered by name, pk) after ``cursor``.
+
+    The cursor is a position in the ordering rather than an offset, so a page
+    never repeats or skips products when the catalog changes between requests.
+
+    Returns:
+        (page, next_cursor) where next_cursor is None on the last page
+    """
+    page_size = page_size or settings.STOREFRONT_PAGE_SIZE
+    position = decode_cursor(cursor)
+
+    start = 0
+    if position is not None:
+        name, pk = position
+        start = next(
+            (i + 1 for i, product in enumerate(products) if product.pk == pk),
+            None,
+        )
+        if start is None:
+            # The cursor's product is gone; resume at the next one in order
+            start = next(
+                (i for i, product in enumerate(products) if (product.name, product.pk) > position),
+                len(products),
+            )
+
+    page = products[start:start + page_size]
+    has_more = start + page_size < len(products)
+    return page, encode_cursor(page[-1]) if page and has_more else None
+
+
+def get_collection_availability(collection_id):
+    """
+    Compact variant/size/price matrix for every active product in a
+    collection, built from a single query so the storefront can switch sizes
+    without calling get_variant_sizes per card.
+
+    Returns:
+        dict with
+            v: catalog version
+            labels: size code -> label
+            products: product id -> {"sizes": [codes], "variants":
+                      [[category_id, color_id, price_cents, [codes]], ...]}
+                      with variants in pk order
+    """
+    def build():
+        rows = (
+            Product.objects
+            .filter(collection_id=collection_id, active=True)
+            .order_by("pk", "variants__pk")
+            .values_list(
+                "pk", "available_sizes",
+                "variants__category_id", "variants__color_id",
+                "variants__price", "variants__available_sizes",
+            )
+        )
+
+        products = {}
+        for product_id, sizes, category_id, color_id, price, variant_sizes in rows:
+            entry = products.setdefault(str(product_id), {"sizes": sizes or [], "variants": []})
+            if category_id is not None:
+                entry["variants"].append([category_id, color_id, to_cents(price), variant_sizes or []])
+
+        return {
+            "v": get_catalog_version(),
+            "labels": dict(Size.choices),
+            "products": products,
+        }
+
+    return _get_or_build(f"availability:{collection_id}", build)
+
+
+class VariantIndex:
+    """
+    In-memory lookups for resolving cart and preview selections without
+    queries: products, variants, color names and category names.
+    """
+
+    def __init__(self, products, variants, colors, categories):
+        """
+        Args:
+            products: iterable of (id, name, available_sizes)
+            variants: iterable of (product_id, category_id, color_id, price,
+                      available_sizes) ordered by variant pk
+            colors: iterable of (id, name)
+            categories: iterable of (id, name)
+        """
+        self.products = {
+            pk: {"id": pk, "name": name, "available_sizes": sizes or []}
+            for pk, name, sizes in products
+        }
+        self.colors = dict(colors)
+        self.categories = dict(categories)
+
+        variants = list(variants)
+        self.prices = PriceTable(row[:4] for row in variants)
+        self._variants = {}
+        for product_id, category_id, color_id, price, sizes in variants:
+            self._variants.setdefault(product_id, []).append((category_id, color_id, sizes or []))
+
+    @classmethod
+    def build(cls):
+        return cls(
+            Product.objects.values_list("pk", "name", "available_sizes"),
+            ProductVariant.objects.order_by("pk").values_list(
+                "product_id", "category_id", "color_id", "price", "available_sizes"
+            ),
+            ProductColor.objects.values_list("pk", "name"),
+            ProductCategory.objects.values_list("pk", "name"),
+        )
+
+    def get_product(self, product_id):
+        return self.products.get(parse_id(product_id))
+
+    def color_name(self, color_id):
+        return self.colors.get(parse_id(color_id))
+
+    def category_name(self, category_id):
+        return self.categories.get(parse_id(category_id))
+
+    def available_sizes(self, product_id, category_id=None, color_id=None):
+        """
+        Sizes for the first variant matching the selected category and color
+        (either may be blank), falling back to the product's own sizes.
+        """
+        product = self.get_product(product_id)
+        if product is None:
+            return []
+
+        for variant_category, variant_color, sizes in self._variants.get(product["id"], []):
+            if category_id and variant_category != parse_id(category_id):
+                continue
+            if color_id and variant_color != parse_id(color_id):
+                continue
+            return sizes or product["available_sizes"]
+
+        return product["available_sizes"]
+
+
+_variant_index = None
+
+
+def get_variant_index():
+    """
+    Per-process VariantIndex, rebuilt when the catalog version changes. Checking
+    the version costs one cache read; the database is only hit on rebuild.
+    """
+    global _variant_index
+    version = get_catalog_version()
+    if _variant_index is None or _variant_index[0] != version:
+        _variant_index = (version, VariantIndex.build())
+    return _variant_index[1]
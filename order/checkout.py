@@ -0,0 +1,207 @@
+"""
+Checkout pipeline
+
+Turns a priced cart into Stripe Checkout line items. Lines without a back
+name reference the Stripe Price cached for their variant, size and amount
+(StripePrice, kept in sync by the sync_stripe_prices command) instead of
+sending inline price data, so checkout no longer creates a throwaway Stripe
+Product per line. Lines that end up identical are collapsed into one line
+item. Personalised lines and variants that have not been synced yet fall
+back to inline price data.
+
+The order itself never leaves the database: confirm_order saves an unpaid
+Order holding the cart lines in pending_items and sends only its order_id
+in the session metadata. When Stripe reports the payment, complete_order
+claims it with one conditional UPDATE and creates its items, without
+calling Stripe back.
+"""
+import uuid
+
+from django.db import transaction
+
+from .images import checkout_image_url
+from .models import Order, OrderItem, Product, StripePrice
+from .pricing import from_cents, parse_id
+
+# Stripe Checkout accepts at most this many line items in payment mode
+STRIPE_MAX_LINE_ITEMS = 100
+
+
+class CheckoutError(ValueError):
+    """The cart cannot be sent to Stripe as it is"""
+
+
+def price_key(product_id, category_id, color_id, size, unit_amount):
+    """Identity of a cached Stripe Price"""
+    return ":".join(
+        "" if part is None else str(part)
+        for part in (parse_id(product_id), parse_id(category_id), parse_id(color_id), size or "", unit_amount)
+    )
+
+
+def product_description(size, color_name, category_name, back_name=""):
+    return f"Size: {size}, Color: {color_name or ''}, Category: {category_name or ''}, Custom Name: {back_name or ''}"
+
+
+def product_metadata(product_id, size, color_name, category_name, back_name=""):
+    """Stripe Product metadata, identifying the variant in the Stripe dashboard"""
+    return {
+        "product_id": str(product_id),
+        "size": size,
+        "color": color_name or "",
+        "category": category_name or "",
+        "back_name": back_name or "",
+    }
+
+
+def _inline_price(request, line):
+    return {
+        "currency": "usd",
+        "product_data": {
+            "images": [request.build_absolute_uri(checkout_image_url(line["product"]))],
+            "name": line["product_name"],
+            "description": product_description(
+                line.get("size"), line.get("color_name"), line.get("category_name"), line.get("back_name"),
+            ),
+            "metadata": product_metadata(
+                line["product_id"], line.get("size"), line.get("color_name"), line.get("category_name"),
+                line.get("back_name"),
+            ),
+        },
+        "unit_amount": line["unit_cents"],
+    }
+
+
+def checkout_line_items(request, priced_lines):
+    """
+    Stripe Checkout line items for priced cart lines (with "product"
+    attached), looking up every cached price in one query.
+
+    Raises:
+        CheckoutError: more distinct line items than Stripe accepts
+    """
+    keys = [
+        price_key(line["product_id"], line.get("category_id"), line.get("color_id"), line.get("size"),
+                  line["unit_cents"])
+        for line in priced_lines
+    ]
+    prices = dict(
+        StripePrice.objects.filter(price_key__in=keys).values_list("price_key", "stripe_price_id")
+    )
+
+    line_items = {}
+    for key, line in zip(keys, priced_lines):
+        stripe_price_id = None if line.get("back_name") else prices.get(key)
+        if stripe_price_id:
+            identity = stripe_price_id
+        else:
+            identity = (key, line.get("color_name"), line.get("category_name"), line.get("back_name"))
+
+        if identity in line_items:
+            line_items[identity]["quantity"] += line["quantity"]
+        elif stripe_price_id:
+            line_items[identity] = {"price": stripe_price_id, "quantity": line["quantity"]}
+        else:
+            line_items[identity] = {"price_data": _inline_price(request, line), "quantity": line["quantity"]}
+
+    if len(line_items) > STRIPE_MAX_LINE_ITEMS:
+        raise CheckoutError(
+            f"Checkout is limited to {STRIPE_MAX_LINE_ITEMS} different items. "
+            f"Please split this order ({len(line_items)} items) into smaller ones."
+        )
+    return list(line_items.values())
+
+
+def create_pending_order(customer_name, customer_email, priced_lines):
+    """Unpaid Order holding the priced cart lines until Stripe reports the payment"""
+    return Order.objects.create(
+        order_id=str(uuid.uuid4()),
+        customer_name=customer_name,
+        customer_email=customer_email,
+        pending_items=[
+            {
+                "product_id": line["product_id"],
+                "product_name": line["product_name"],
+                "size": line.get("size") or "",
+                "quantity": line["quantity"],
+                "color_name": line.get("color_name"),
+                "category_id": line.get("category_id"),
+                "category_name": line.get("category_name"),
+                "unit_cents": line["unit_cents"],
+                "back_name": line.get("back_name") or "",
+            }
+            for line in priced_lines
+        ],
+    )
+
+
+def create_order_items(order, lines):
+    """
+    Create an order's items from cart-shaped lines (see create_pending_order)
+    with one product lookup and one bulk insert, whatever the number of
+    lines. Call it inside the transaction that records the order.
+
+    Returns:
+        (items, total_cents)
+    """
+    products = Product.objects.select_related("collection").in_bulk(
+        {parse_id(line["product_id"]) for line in lines} - {None}
+    )
+
+    items = []
+    total_cents = 0
+    for line in lines:
+        product = products.get(parse_id(line["product_id"]))
+        items.append(OrderItem(
+            order=order,
+            product=product,
+            # bulk_create skips OrderItem.save, so fill in what it would
+            product_name=product.name if product else line["product_name"],
+            collection_name=product.collection.name if product and product.collection else None,
+            size=line.get("size") or "",
+            quantity=line["quantity"],
+            product_color=line.get("color_name"),
+            product_category=line.get("category_name"),
+            category_id=parse_id(line.get("category_id")),
+            product_cost=from_cents(line["unit_cents"]),
+            back_name=line.get("back_name") or "",
+        ))
+        total_cents += line["unit_cents"] * line["quantity"]
+
+    return OrderItem.objects.bulk_create(items), total_cents
+
+
+def complete_order(order_id, stripe_session_id):
+    """
+    Mark a pending order paid and create its items from pending_items, in
+    one transaction and a constant number of queries.
+
+    Safe to call more than once (Stripe redelivers webhooks, and the success
+    page may race the webhook): only the call whose UPDATE claims the order
+    creates the items.
+
+    Returns:
+        (order, items, total_cents) when this call completed the order,
+        otherwise None
+    """
+    order = Order.objects.filter(order_id=order_id, pending_items__isnull=False).first()
+    if order is None:
+        return None
+
+    with transaction.atomic():
+        claimed = Order.objects.filter(pk=order.pk, pending_items__isnull=False).update(
+            has_paid=True, stripe_session_id=stripe_session_id, pending_items=None,
+        )
+        if not claimed:
+            return None
+        items, total_cents = create_order_items(order, order.pending_items)
+
+    order.has_paid = True
+    order.stripe_session_id = stripe_session_id
+    order.pending_items = None
+    return order, items, total_cents
+
+
+def discard_pending_order(order_id):
+    """Delete a checkout's order that was never paid (its Stripe session expired)"""
+    return Order.objects.filter(order_id=order_id, pending_items__isnull=False, has_paid=False).delete()[0]
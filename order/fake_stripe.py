@@ -0,0 +1,316 @@
+"""
+Local Stripe stand-in
+
+A small in-memory HTTP service implementing the parts of the Stripe API this
+app uses, for load tests and integration tests (point STRIPE_API_BASE at it):
+
+    POST /v1/checkout/sessions                   create a checkout session
+    GET  /v1/checkout/sessions/<id>              retrieve it
+    GET  /v1/checkout/sessions/<id>/line_items   list its line items
+                                                 (expand[]=data.price.product)
+    POST /v1/products, /v1/prices, /v1/prices/<id>
+                                                 products and prices for
+                                                 sync_stripe_prices
+
+Paying for a session stands in for the hosted checkout page and Stripe's
+webhook delivery:
+
+    POST /pay/<id>   completes the session and returns the signed
+                     checkout.session.completed event as
+                     {"payload": ..., "signature": ..., "success_url": ...},
+                     ready to be posted to the app's webhook with a
+                     Stripe-Signature header, plus the page Stripe would
+                     send the shopper back to
+
+Every /v1 request can be slowed down (latency_ms plus up to jitter_ms) and a
+fraction of them (error_rate) answered with a 500, to see how the app
+behaves when Stripe is slow or degraded. Run it with
+``manage.py fake_stripe``.
+"""
+import hashlib
+import hmac
+import json
+import random
+import re
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+def parse_form(body):
+    """
+    Decode Stripe's form encoding (``line_items[0][price_data][currency]``)
+    into nested dicts and lists.
+    """
+    data = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = re.findall(r"[^\[\]]+", key)
+        node = data
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return _listify(data)
+
+
+def _listify(node):
+    if not isinstance(node, dict):
+        return node
+    node = {key: _listify(value) for key, value in node.items()}
+    if node and all(key.isdigit() for key in node):
+        return [node[key] for key in sorted(node, key=int)]
+    return node
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """Stripe-Signature header for a webhook payload"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def _id(prefix):
+    return f"{prefix}_{secrets.token_hex(12)}"
+
+
+class InvalidRequest(Exception):
+    def __init__(self, message, param=None):
+        super().__init__(message)
+        self.param = param
+
+
+class FakeStripeServer(ThreadingHTTPServer):
+    """In-memory Stripe API state plus the latency/error injection settings"""
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), webhook_secret="whsec_fake", latency_ms=0, jitter_ms=0,
+                 error_rate=0.0):
+        super().__init__(address, FakeStripeHandler)
+        self.webhook_secret = webhook_secret
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.sessions = {}
+        self.products = {}
+        self.prices = {}
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve on a background thread (tests)"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    # --- API objects ---------------------------------------------------
+
+    def create_product(self, params):
+        product = {
+            "id": _id("prod"),
+            "object": "product",
+            "name": params.get("name", ""),
+            "description": params.get("description"),
+            "images": params.get("images", []),
+            "metadata": params.get("metadata", {}),
+            "active": True,
+        }
+        self.products[product["id"]] = product
+        return product
+
+    def create_price(self, params):
+        price = {
+            "id": _id("price"),
+            "object": "price",
+            "currency": params.get("currency", "usd"),
+            "unit_amount": int(params["unit_amount"]),
+            "product": params["product"],
+            "active": True,
+        }
+        self.prices[price["id"]] = price
+        return price
+
+    def create_session(self, params):
+        if not params.get("line_items"):
+            raise InvalidRequest("Missing required param: line_items.", "line_items")
+
+        line_items = []
+        for item in params["line_items"]:
+            if "price" in item:
+                price = self.prices.get(item["price"])
+                if price is None:
+                    raise InvalidRequest(f"No such price: '{item['price']}'", "line_items")
+            else:
+                price_data = item["price_data"]
+                product = self.create_product(price_data["product_data"])
+                price = self.create_price({**price_data, "product": product["id"]})
+            quantity = int(item.get("quantity", 1))
+            line_items.append({
+                "id": _id("li"),
+                "object": "item",
+                "quantity": quantity,
+                "currency": price["currency"],
+                "amount_subtotal": price["unit_amount"] * quantity,
+                "amount_total": price["unit_amount"] * quantity,
+                "description": self.products[price["product"]]["name"],
+                "price": price["id"],
+            })
+
+        session_id = _id("cs_test")
+        session = {
+            "id": session_id,
+            "object": "checkout.session",
+            "mode": params.get("mode"),
+            "status": "open",
+            "payment_status": "unpaid",
+            "customer_email": params.get("customer_email"),
+            "metadata": params.get("metadata", {}),
+            "success_url": params.get("success_url"),
+            "cancel_url": params.get("cancel_url"),
+            "amount_total": sum(item["amount_total"] for item in line_items),
+            "currency": "usd",
+            "url": f"{self.url}/pay/{session_id}",
+        }
+        self.sessions[session_id] = (session, line_items)
+        return session
+
+    def list_line_items(self, session_id, expand):
+        _, line_items = self.sessions[session_id]
+        data = []
+        for item in line_items:
+            price = dict(self.prices[item["price"]])
+            if "data.price.product" in expand:
+                price["product"] = self.products[price["product"]]
+            data.append({**item, "price": price})
+        return {
+            "object": "list",
+            "data": data,
+            "has_more": False,
+            "url": f"/v1/checkout/sessions/{session_id}/line_items",
+        }
+
+    def complete_session(self, session_id):
+        """Mark a session paid and return its signed checkout.session.completed event"""
+        session, _ = self.sessions[session_id]
+        session.update(status="complete", payment_status="paid")
+        payload = json.dumps({
+            "id": _id("evt"),
+            "object": "event",
+            "type": "checkout.session.completed",
+            "created": int(time.time()),
+            "data": {"object": session},
+        })
+        return {
+            "payload": payload,
+            "signature": sign_payload(payload, self.webhook_secret),
+            "success_url": (session["success_url"] or "").replace("{CHECKOUT_SESSION_ID}", session_id),
+        }
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = [
+        ("POST", r"/v1/checkout/sessions", "create_session"),
+        ("GET", r"/v1/checkout/sessions/(?P<id>[\w]+)", "retrieve_session"),
+        ("GET", r"/v1/checkout/sessions/(?P<id>[\w]+)/line_items", "list_line_items"),
+        ("POST", r"/v1/products", "create_product"),
+        ("POST", r"/v1/prices", "create_price"),
+        ("POST", r"/v1/prices/(?P<id>[\w]+)", "update_price"),
+        ("POST", r"/pay/(?P<id>[\w]+)", "pay"),
+    ]
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, *args):
+        pass
+
+    def _dispatch(self, method):
+        server = self.server
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+        params = parse_form(body if method == "POST" else url.query)
+        server.requests.append((method, url.path))
+
+        for route_method, pattern, name in self.ROUTES:
+            match = re.fullmatch(pattern, url.path)
+            if route_method == method and match:
+                break
+        else:
+            return self._error(404, "invalid_request_error", f"Unrecognized request URL ({method}: {url.path})")
+
+        if url.path.startswith("/v1/"):
+            delay = server.latency_ms + random.uniform(0, server.jitter_ms)
+            if delay:
+                time.sleep(delay / 1000)
+            if server.error_rate and random.random() < server.error_rate:
+                return self._error(500, "api_error", "Injected failure from the Stripe stand-in")
+
+        try:
+            with server.lock:
+                status, result = getattr(self, name)(params, **match.groupdict())
+        except InvalidRequest as error:
+            return self._error(400, "invalid_request_error", str(error), error.param)
+        except KeyError:
+            return self._error(404, "invalid_request_error", "No such object", code="resource_missing")
+        self._send(status, result)
+
+    # --- routes ----------------------------------------------------------
+
+    def create_session(self, params):
+        return 200, self.server.create_session(params)
+
+    def retrieve_session(self, params, id):
+        return 200, self.server.sessions[id][0]
+
+    def list_line_items(self, params, id):
+        return 200, self.server.list_line_items(id, params.get("expand", []))
+
+    def create_product(self, params):
+        return 200, self.server.create_product(params)
+
+    def create_price(self, params):
+        if params.get("product") not in self.server.products:
+            raise InvalidRequest(f"No such product: '{params.get('product')}'", "product")
+        return 200, self.server.create_price(params)
+
+    def update_price(self, params, id):
+        price = self.server.prices[id]
+        if "active" in params:
+            price["active"] = params["active"] == "true"
+        return 200, price
+
+    def pay(self, params, id):
+        return 200, self.server.complete_session(id)
+
+    # --- responses -------------------------------------------------------
+
+    def _error(self, status, error_type, message, param=None, code=None):
+        error = {"type": error_type, "message": message}
+        if param:
+            error["param"] = param
+        if code:
+            error["code"] = code
+        self._send(status, {"error": error})
+
+    def _send(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Request-Id", _id("req"))
+        self.end_headers()
+        self.wfile.write(body)
@@ -0,0 +1,115 @@
+"""
+Rendered product grid fragments, cached per collection and catalog version
+
+The grid is identical for every shopper looking at the same collection apart
+from the CSRF token, so it is rendered once with a placeholder token and the
+caller's token is substituted on the way out.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, urlencode
+
+from .catalog import get_catalog_updated_at, get_catalog_version, decode_cursor, page_products
+from .pricing import PRICING_VERSION
+from .search import search_products
+
+CSRF_PLACEHOLDER = "__csrf_token_placeholder__"
+PRODUCTS_TEMPLATE = "order/partials/_products.html"
+CARDS_TEMPLATE = "order/partials/_product-cards.html"
+
+
+def products_page(products, collection=None, cursor=None, page_url=None, params=None, facets=None):
+    """
+    Template and context for one page of the product grid. The first page is
+    the whole grid (with the search form and facets for a collection); later
+    pages (with a cursor) are bare cards that replace the previous page's
+    load-more sentinel.
+
+    Args:
+        page_url: URL later pages are fetched from (defaults to the
+                  collection's grid, or index for the admin view)
+        params: extra query parameters carried onto later pages
+    """
+    cursor = cursor if decode_cursor(cursor) else None
+    page, next_cursor = page_products(products, cursor)
+
+    next_url = None
+    if next_cursor:
+        if page_url is None:
+            page_url = reverse("order:products", args=[collection.id]) if collection else reverse("order:index")
+        next_url = f"{page_url}?{urlencode({**(params or {}), 'cursor': next_cursor}, doseq=True)}"
+
+    if facets is None and collection is not None and not cursor:
+        facets = search_products(products)["facets"]
+
+    return CARDS_TEMPLATE if cursor else PRODUCTS_TEMPLATE, {
+        "products": page,
+        "collection": collection,
+        "cursor": cursor,
+        "next_url": next_url,
+        "facets": facets,
+    }
+
+
+def render_products_fragment(request, name, products, collection=None, cursor=None):
+    """
+    Rendered product grid page for a catalog snapshot with the request's CSRF
+    token filled in (see products_page).
+
+    Args:
+        name: snapshot name the products came from (e.g. "collection:3")
+        cursor: page cursor from the previous page, None for the first page
+    """
+    cursor = cursor if decode_cursor(cursor) else None
+    key = f"catalog:{get_catalog_version()}:fragment:{PRICING_VERSION}:{name}:{cursor or ''}"
+    html = cache.get(key)
+    if html is None:
+        template, context = products_page(products, collection, cursor)
+        html = render_to_string(template, {**context, "csrf_token": CSRF_PLACEHOLDER})
+        cache.set(key, html, settings.CATALOG_CACHE_TIMEOUT)
+    return html.replace(CSRF_PLACEHOLDER, get_token(request))
+
+
+def _products_etag(request, name, cursor=None):
+    # The CSRF secret is part of the validator so a 304 never hands back
+    # tokens minted for a different cookie (e.g. after logging in).
+    csrf_secret = request.META.get("CSRF_COOKIE") or ""
+    csrf_digest = hashlib.sha256(csrf_secret.encode()).hexdigest()[:16]
+    return f'"products-{name}-{cursor or ""}-{get_catalog_version()}-{PRICING_VERSION}-{csrf_digest}"'
+
+
+def products_fragment_response(request, name, products, collection=None, cursor=None):
+    """
+    HttpResponse for an HTMX product grid request. GET requests carry
+    ETag/Last-Modified validators and get a 304 when the grid is unchanged.
+    """
+    conditional = request.method in ("GET", "HEAD")
+    cursor = cursor if decode_cursor(cursor) else None
+
+    if conditional:
+        not_modified = get_conditional_response(
+            request,
+            etag=_products_etag(request, name, cursor),
+            last_modified=get_catalog_updated_at(),
+        )
+        if not_modified is not None:
+            patch_vary_headers(not_modified, ["Cookie", "HX-Request"])
+            return not_modified
+
+    response = HttpResponse(render_products_fragment(request, name, products, collection, cursor))
+
+    if conditional:
+        # Recomputed after rendering: get_token may have just minted the
+        # CSRF cookie this response's tokens belong to.
+        response.headers["ETag"] = _products_etag(request, name, cursor)
+        response.headers["Last-Modified"] = http_date(get_catalog_updated_at())
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Cookie", "HX-Request"])
+    return response
@@ -0,0 +1,163 @@
+"""
+Resized WebP/JPEG (and AVIF where Pillow supports it) derivatives of product
+images for the storefront's <picture> srcsets and for Stripe checkout.
+
+Derivatives are generated off the request thread once the product save has
+committed (see order.signals) and recorded on ``Product.image_derivatives``:
+
+    {"source": "<image name>", "formats": {"webp": [[width, "<name>"], ...], ...}}
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, features
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+
+from .catalog import bump_catalog_version
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_WIDTHS = (172, 344, 688)
+
+# Preferred first; the last format is the <img> fallback
+FORMATS = {
+    "avif": {"format": "AVIF", "mime": "image/avif", "options": {"quality": 55}},
+    "webp": {"format": "WEBP", "mime": "image/webp", "options": {"quality": 80, "method": 6}},
+    "jpeg": {"format": "JPEG", "mime": "image/jpeg", "options": {"quality": 82, "optimize": True, "progressive": True}},
+}
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-derivatives")
+
+
+def available_formats():
+    """Formats this Pillow build can encode, preferred first"""
+    return [name for name in FORMATS if name != "avif" or features.check("avif")]
+
+
+def derivative_widths(source_width):
+    """Target widths, never upscaling past the source image"""
+    widths = [width for width in DERIVATIVE_WIDTHS if width < source_width]
+    widths.append(min(source_width, DERIVATIVE_WIDTHS[-1]))
+    return sorted(set(widths))
+
+
+def _to_rgb(img):
+    if img.mode in ("RGBA", "LA", "P"):
+        if img.mode == "P":
+            img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1] if img.mode in ("RGBA", "LA") else None)
+        return background
+    if img.mode != "RGB":
+        return img.convert("RGB")
+    return img
+
+
+def generate_derivatives(product):
+    """
+    Render every derivative for the product's current image into its storage.
+
+    Returns:
+        (width, height, derivatives) ready to store on the product
+    """
+    storage = product.image.storage
+    with product.image.open("rb") as source:
+        img = Image.open(source)
+        img.load()
+    width, height = img.size
+    img = _to_rgb(img)
+
+    stem = os.path.splitext(os.path.basename(product.image.name))[0]
+    formats = {}
+    for name in available_formats():
+        spec = FORMATS[name]
+        entries = []
+        for target in derivative_widths(width):
+            resized = img if target == width else img.resize(
+                (target, max(1, round(height * target / width))), Image.LANCZOS
+            )
+            output = BytesIO()
+            resized.save(output, format=spec["format"], **spec["options"])
+            ext = "jpg" if name == "jpeg" else name
+            path = storage.save(f"products/derivatives/{stem}-{target}w.{ext}", ContentFile(output.getvalue()))
+            entries.append([target, path])
+        formats[name] = entries
+
+    return width, height, {"source": product.image.name, "formats": formats}
+
+
+def process_product_image(product_id):
+    """Build and record derivatives for one product, skipping up-to-date images"""
+    product = Product.objects.filter(pk=product_id).first()
+    if product is None or not product.image:
+        return False
+    if product.image_derivatives.get("source") == product.image.name:
+        return False
+
+    width, height, derivatives = generate_derivatives(product)
+
+    # .update() keeps this write from re-triggering post_save, so the
+    # catalog version is bumped explicitly for cached grids to pick it up
+    Product.objects.filter(pk=product_id, image=derivatives["source"]).update(
+        image_width=width, image_height=height, image_derivatives=derivatives,
+    )
+    bump_catalog_version()
+    return True
+
+
+def _run(product_id):
+    close_old_connections()
+    try:
+        process_product_image(product_id)
+    except Exception:
+        logger.exception("Failed to build image derivatives for product %s", product_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_derivatives(product_id):
+    """Queue derivative generation for after the current transaction commits"""
+    if settings.IMAGE_DERIVATIVES_ASYNC:
+        transaction.on_commit(lambda: _executor.submit(_run, product_id))
+    else:
+        transaction.on_commit(lambda: process_product_image(product_id))
+
+
+def needs_derivatives(product):
+    return bool(product.image) and product.image_derivatives.get("source") != product.image.name
+
+
+def srcset(product, fmt):
+    """``srcset`` value for one derivative format, or "" if none exist"""
+    storage = product.image.storage
+    entries = product.image_derivatives.get("formats", {}).get(fmt, [])
+    return ", ".join(f"{storage.url(path)} {width}w" for width, path in entries)
+
+
+def picture_sources(product):
+    """
+    <source> entries (preferred formats) and the JPEG fallback for a product
+    card; both are empty until the derivatives have been generated.
+    """
+    if not needs_derivatives(product) and product.image_derivatives.get("formats"):
+        formats = product.image_derivatives["formats"]
+        sources = [
+            {"type": FORMATS[name]["mime"], "srcset": srcset(product, name)}
+            for name in FORMATS if name != "jpeg" and formats.get(name)
+        ]
+        return sources, srcset(product, "jpeg")
+    return [], ""
+
+
+def checkout_image_url(product):
+    """Largest JPEG derivative for Stripe, falling back to the original upload"""
+    if not needs_derivatives(product):
+        entries = product.image_derivatives.get("formats", {}).get("jpeg")
+        if entries:
+            return product.image.storage.url(entries[-1][1])
+    return product.image.url
@@ -0,0 +1,81 @@
+"""
+Stripe event inbox
+
+The webhook only verifies an event and records it as a StripeEvent, so
+Stripe gets its 200 in milliseconds and stops retrying. process_inbox,
+run in a loop by the process_stripe_events worker, handles due events in
+batches:
+
+- each event runs in its own savepoint; a failure rolls back just that
+  event and schedules a retry with exponential backoff
+  (RETRY_BASE_SECONDS doubling up to RETRY_MAX_SECONDS);
+- after MAX_ATTEMPTS the event is parked (next_attempt_at cleared) and
+  logged; replay_stripe_events puts parked or processed events back;
+- batches are locked with SKIP LOCKED where the database supports it, so
+  several workers can drain the inbox side by side.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import StripeEvent
+from .webhooks import handle_event
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the given number of failed attempts"""
+    return min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+
+def process_inbox(batch_size=BATCH_SIZE):
+    """
+    Handle one batch of due events.
+
+    Returns:
+        number of events attempted (0 when nothing is due)
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            StripeEvent.objects
+            .select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "pk")[:batch_size]
+        )
+
+        for event in events:
+            event.attempts += 1
+            try:
+                with transaction.atomic():
+                    handle_event(event.payload)
+            except Exception as error:
+                event.last_error = f"{type(error).__name__}: {error}"
+                if event.attempts >= MAX_ATTEMPTS:
+                    event.next_attempt_at = None
+                    logger.error("Giving up on Stripe event %s after %s attempts: %s",
+                                 event.event_id, event.attempts, event.last_error)
+                else:
+                    event.next_attempt_at = now + timedelta(seconds=retry_delay(event.attempts))
+                    logger.warning("Stripe event %s failed (attempt %s), retrying at %s: %s",
+                                   event.event_id, event.attempts, event.next_attempt_at, event.last_error)
+            else:
+                event.processed_at = timezone.now()
+                event.last_error = ""
+
+        StripeEvent.objects.bulk_update(events, ["attempts", "next_attempt_at", "processed_at", "last_error"])
+
+    return len(events)
+
+
+def replay_events(events):
+    """Queue events (a StripeEvent queryset) to be handled again; returns how many"""
+    return events.update(processed_at=None, attempts=0, next_attempt_at=timezone.now(), last_error="")
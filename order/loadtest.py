@@ -0,0 +1,217 @@
+"""
+Checkout load test
+
+Replays a launch-day traffic profile against a running app whose Stripe
+calls go to the local stand-in (order/fake_stripe.py):
+
+    manage.py fake_stripe --port 12111 --latency-ms 150 &
+    export STRIPE_API_BASE=http://127.0.0.1:12111 STRIPE_WEBHOOK_SECRET=whsec_fake
+    manage.py process_stripe_events &
+    manage.py runserver
+    manage.py loadtest --base-url http://127.0.0.1:8000 --collection 3 --users 200
+
+Every virtual shopper browses the collection (storefront, grid and the
+availability matrix); LAUNCH_DAY says what share of them also add to the
+cart and go on to check out. Checking out covers confirm-order, paying on
+the stand-in, delivering its signed webhook and loading the success page.
+Arrivals are front-loaded over the ramp, like traffic right after a launch
+announcement. Each shopper sends its own X-Forwarded-For, so per-IP rate
+limits apply per shopper as they would in production. Over plain http the
+app must not mark its CSRF and session cookies Secure (e.g. DEBUG=True).
+
+The report gives request count, errors and p50/p95/p99 latency per endpoint.
+"""
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+# Share of all shoppers reaching each stage
+LAUNCH_DAY = {"browse": 1.0, "add": 0.6, "checkout": 0.25}
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers; None when empty"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def _to_checkout(response):
+    # A failed checkout redirects back to the storefront instead
+    return response.is_redirect and urlsplit(response.headers["Location"]).netloc != ""
+
+
+class Recorder:
+    """Thread-safe latency and error samples per endpoint"""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, elapsed_ms, ok):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append(elapsed_ms)
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + (not ok)
+
+    def report(self):
+        """endpoint -> {"count", "errors", "p50", "p95", "p99"} in request order"""
+        with self._lock:
+            return {
+                endpoint: {
+                    "count": len(samples),
+                    "errors": self.errors[endpoint],
+                    **{f"p{pct}": percentile(samples, pct) for pct in PERCENTILES},
+                }
+                for endpoint, samples in self.samples.items()
+            }
+
+
+class Shopper:
+    """One virtual shopper with its own cookies and client IP"""
+
+    def __init__(self, test, number):
+        self.test = test
+        self.http = requests.Session()
+        self.http.headers["X-Forwarded-For"] = f"10.{number // 65536 % 256}.{number // 256 % 256}.{number % 256}"
+        # Django's CSRF check wants a same-origin Referer on HTTPS
+        self.http.headers["Referer"] = f"{test.base_url}/"
+        self.random = random.Random(f"{test.seed}:{number}")
+
+    def request(self, endpoint, method, path, expect=(200,), **kwargs):
+        """
+        Time one request to the app; returns the response, or None on a
+        connection error. ``expect`` is the status codes counted as success,
+        or a callable deciding it from the response.
+        """
+        kwargs.setdefault("allow_redirects", False)
+        kwargs.setdefault("timeout", self.test.timeout)
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.test.base_url + path, **kwargs)
+        except requests.RequestException:
+            response = None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if response is None:
+            ok = False
+        elif callable(expect):
+            ok = expect(response)
+        else:
+            ok = response.status_code in expect
+        self.test.recorder.record(endpoint, elapsed_ms, ok)
+        return response
+
+    def post(self, endpoint, path, data=None, **kwargs):
+        headers = {"X-CSRFToken": self.http.cookies.get("csrftoken", ""), **kwargs.pop("headers", {})}
+        return self.request(endpoint, "POST", path, data=data, headers=headers, **kwargs)
+
+    def think(self):
+        if self.test.think_ms:
+            time.sleep(self.random.uniform(0, self.test.think_ms) / 1000)
+
+    def run(self, stages):
+        collection_id = self.test.collection_id
+        if not self.request("storefront", "GET", "/"):
+            return
+        self.post("select collection", "/", {"collection": collection_id}, expect=(302,))
+        self.request("collection grid", "GET", f"/collection/{collection_id}")
+        response = self.request("availability", "GET", f"/collection/{collection_id}/availability")
+        if "add" not in stages or response is None or response.status_code != 200:
+            return
+
+        products = response.json()["products"]
+        choices = [
+            (product_id, variant, variant[3] or product["sizes"])
+            for product_id, product in products.items()
+            for variant in product["variants"] or [[None, None, None, []]]
+        ]
+        choices = [choice for choice in choices if choice[2]]
+        if not choices:
+            return
+
+        for _ in range(self.random.randint(1, 3)):
+            self.think()
+            product_id, (category_id, color_id, _, _), sizes = self.random.choice(choices)
+            self.post("add item", "/add-item", {
+                "product": product_id,
+                "category": category_id or "",
+                "color": color_id or "",
+                "size": self.random.choice(sizes),
+                "quantity": self.random.randint(1, 4),
+            }, headers={"HX-Request": "true"})
+        self.request("cart", "GET", "/shopping-cart/", headers={"HX-Request": "true"})
+        if "checkout" not in stages:
+            return
+
+        self.think()
+        response = self.post("confirm order", "/confirm-order", {
+            "customer_name": "Load Test",
+            "customer_email": "loadtest@example.com",
+        }, expect=_to_checkout)
+        if response is None or not _to_checkout(response):
+            return
+
+        # The stand-in's checkout page pays at once and hands back the webhook Stripe would send
+        event = requests.post(response.headers["Location"], timeout=self.test.timeout).json()
+        self.request("webhook", "POST", "/webhooks/stripe/", data=event["payload"], headers={
+            "Content-Type": "application/json",
+            "Stripe-Signature": event["signature"],
+        })
+        success_url = urlsplit(event["success_url"])
+        self.request("payment success", "GET", f"{success_url.path}?{success_url.query}")
+
+
+class LoadTest:
+    """
+    Args:
+        base_url: the app, e.g. "http://127.0.0.1:8000"
+        collection_id: active collection the shoppers browse
+        users: number of virtual shoppers
+        concurrency: shoppers in flight at once
+        ramp_seconds: arrivals are spread (front-loaded) over this long
+        think_ms: maximum pause between a shopper's steps
+        profile: share of shoppers reaching each stage, like LAUNCH_DAY
+        seed: makes who adds, checks out and picks what repeatable
+    """
+
+    def __init__(self, base_url, collection_id, users=50, concurrency=10, ramp_seconds=0.0, think_ms=0,
+                 profile=None, seed=0, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.collection_id = collection_id
+        self.users = users
+        self.concurrency = concurrency
+        self.ramp_seconds = ramp_seconds
+        self.think_ms = think_ms
+        self.profile = profile or LAUNCH_DAY
+        self.seed = seed
+        self.timeout = timeout
+        self.recorder = Recorder()
+
+    def stages(self, number):
+        """Stages this shopper reaches; shares are cumulative, so checkout implies add"""
+        roll = random.Random(f"{self.seed}:stages:{number}").random()
+        return {stage for stage, share in self.profile.items() if roll < share}
+
+    def _shopper(self, number, started):
+        # Quadratic arrival curve: half the shoppers arrive in the first ~30% of the ramp
+        arrival = self.ramp_seconds * (number / self.users) ** 2
+        delay = started + arrival - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        Shopper(self, number).run(self.stages(number))
+
+    def run(self):
+        """Run every shopper and return the per-endpoint report"""
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for future in [pool.submit(self._shopper, number, started) for number in range(self.users)]:
+                future.result()
+        return self.recorder.report()
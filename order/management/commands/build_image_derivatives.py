@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from order.images import process_product_image
+from order.models import Product
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/JPEG product image derivatives for the storefront"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Rebuild derivatives that are already up to date")
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image="")
+        if options["force"]:
+            products.update(image_derivatives={})
+
+        built = 0
+        for product_id in products.values_list("pk", flat=True):
+            if process_product_image(product_id):
+                built += 1
+
+        self.stdout.write(f"Built derivatives for {built} product(s)")
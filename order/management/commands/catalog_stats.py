@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from order.catalog import catalog_stats
+
+
+class Command(BaseCommand):
+    help = "Show the storefront catalog snapshot version and hit/miss counters"
+
+    def handle(self, *args, **options):
+        stats = catalog_stats()
+        self.stdout.write(f"Catalog version: {stats['version']}")
+        self.stdout.write(f"Hits: {stats['hits']}")
+        self.stdout.write(f"Misses: {stats['misses']}")
+        self.stdout.write(f"Hit rate: {stats['hit_rate']:.1%}")
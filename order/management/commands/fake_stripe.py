@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from order.fake_stripe import FakeStripeServer
+
+
+class Command(BaseCommand):
+    help = "Run a local Stripe stand-in for load and integration tests (point STRIPE_API_BASE at it)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=12111)
+        parser.add_argument("--latency-ms", type=float, default=0, help="Added to every API response")
+        parser.add_argument("--jitter-ms", type=float, default=0, help="Random extra latency, up to this much")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Share of API calls answered with a 500")
+        parser.add_argument(
+            "--webhook-secret", default=None,
+            help="Secret the webhook events are signed with (default: STRIPE_WEBHOOK_SECRET)",
+        )
+
+    def handle(self, *args, **options):
+        server = FakeStripeServer(
+            (options["host"], options["port"]),
+            webhook_secret=options["webhook_secret"] or settings.STRIPE_WEBHOOK_SECRET or "whsec_fake",
+            latency_ms=options["latency_ms"],
+            jitter_ms=options["jitter_ms"],
+            error_rate=options["error_rate"],
+        )
+        self.stdout.write(f"Stripe stand-in listening on {server.url} (webhook secret {server.webhook_secret})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from order.loadtest import LAUNCH_DAY, LoadTest
+
+
+def _ms(value):
+    return "-" if value is None else f"{value:.0f}ms"
+
+
+class Command(BaseCommand):
+    help = "Replay a launch-day browse/add/checkout/webhook profile against the app and report latency per endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--collection", type=int, required=True, help="Active collection id to shop")
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument("--ramp-seconds", type=float, default=0.0)
+        parser.add_argument("--think-ms", type=float, default=0)
+        parser.add_argument("--add-share", type=float, default=LAUNCH_DAY["add"])
+        parser.add_argument("--checkout-share", type=float, default=LAUNCH_DAY["checkout"])
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        report = LoadTest(
+            options["base_url"],
+            options["collection"],
+            users=options["users"],
+            concurrency=options["concurrency"],
+            ramp_seconds=options["ramp_seconds"],
+            think_ms=options["think_ms"],
+            profile={"browse": 1.0, "add": options["add_share"], "checkout": options["checkout_share"]},
+            seed=options["seed"],
+        ).run()
+
+        self.stdout.write(f"{'endpoint':<18}{'requests':>10}{'errors':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for endpoint, row in report.items():
+            self.stdout.write(
+                f"{endpoint:<18}{row['count']:>10}{row['errors']:>8}"
+                f"{_ms(row['p50']):>10}{_ms(row['p95']):>10}{_ms(row['p99']):>10}"
+            )
@@ -0,0 +1,37 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from order.inbox import BATCH_SIZE, process_inbox
+
+
+class Command(BaseCommand):
+    help = "Worker: handle Stripe webhook events from the inbox in batches, retrying failures with backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to sleep when nothing is due")
+        parser.add_argument("--once", action="store_true", help="Drain what is due now, then exit")
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        # Finish the current batch before exiting on a dyno restart
+        signal.signal(signal.SIGTERM, self.stop)
+
+        processed = 0
+        while not self.stopping:
+            close_old_connections()
+            count = process_inbox(options["batch_size"])
+            processed += count
+            if count:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(f"{processed} event(s) handled")
+
+    def stop(self, signum, frame):
+        self.stopping = True
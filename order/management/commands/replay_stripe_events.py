@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from order.inbox import process_inbox, replay_events
+from order.models import StripeEvent
+
+
+class Command(BaseCommand):
+    help = "Queue Stripe webhook events from the inbox to be handled again"
+
+    def add_arguments(self, parser):
+        parser.add_argument("event_ids", nargs="*", help="Stripe event ids (evt_...)")
+        parser.add_argument("--failed", action="store_true", help="Every event that used up its retries")
+        parser.add_argument("--process", action="store_true", help="Handle them now instead of leaving them to the worker")
+
+    def handle(self, *args, **options):
+        if not options["event_ids"] and not options["failed"]:
+            raise CommandError("Give event ids or --failed")
+
+        events = StripeEvent.objects.none()
+        if options["event_ids"]:
+            events |= StripeEvent.objects.filter(event_id__in=options["event_ids"])
+        if options["failed"]:
+            events |= StripeEvent.objects.filter(processed_at__isnull=True, next_attempt_at__isnull=True)
+
+        count = replay_events(events)
+        self.stdout.write(f"{count} event(s) queued")
+
+        if options["process"]:
+            handled = 0
+            while batch := process_inbox():
+                handled += batch
+            self.stdout.write(f"{handled} event(s) handled")
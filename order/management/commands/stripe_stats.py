@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from order.stripe_client import LATENCY_BUCKETS_MS, stripe_stats
+
+
+def _ms(bound, calls):
+    if not calls:
+        return "-"
+    return f">{LATENCY_BUCKETS_MS[-1]}ms" if bound is None else f"<={bound}ms"
+
+
+class Command(BaseCommand):
+    help = "Show Stripe API call counts, errors, fast-failed calls and latency percentiles per operation"
+
+    def handle(self, *args, **options):
+        stats = stripe_stats()
+        self.stdout.write(f"Circuit breaker opened: {stats['breaker_opened']} time(s)")
+        if not stats["operations"]:
+            self.stdout.write("No Stripe calls recorded")
+        for operation, op in stats["operations"].items():
+            self.stdout.write(
+                f"{operation}: {op['calls']} call(s), {op['errors']} error(s), {op['rejected']} failed fast, "
+                f"p50 {_ms(op['p50'], op['calls'])}, p95 {_ms(op['p95'], op['calls'])}, "
+                f"p99 {_ms(op['p99'], op['calls'])}"
+            )
@@ -0,0 +1,89 @@
+from urllib.parse import urljoin
+
+import stripe
+from django.core.management.base import BaseCommand
+
+from order.checkout import price_key, product_description, product_metadata
+from order.images import checkout_image_url
+from order.models import ProductVariant, StripePrice
+from order.pricing import to_cents, upcharge_cents
+from order.stripe_client import stripe_call
+
+
+class Command(BaseCommand):
+    help = "Create Stripe Products/Prices for every active variant and size so checkout can reuse them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--site-url", default="", help="Base URL for product images stored with relative URLs")
+        parser.add_argument("--dry-run", action="store_true", help="Report what would change without calling Stripe")
+
+    def handle(self, *args, **options):
+        cached = {row.price_key: row for row in StripePrice.objects.all()}
+        # A variant+size keeps its Stripe Product when only its amount changes
+        stripe_products = {
+            (row.product_id, row.category_id, row.color_id, row.size): row.stripe_product_id
+            for row in cached.values()
+        }
+
+        variants = (
+            ProductVariant.objects
+            .filter(product__active=True)
+            .select_related("product", "category", "color")
+            .order_by("pk")
+        )
+
+        wanted = set()
+        created = 0
+        for variant in variants:
+            product = variant.product
+            for size in variant.available_sizes or product.available_sizes:
+                unit_amount = to_cents(variant.price) + upcharge_cents(size, "")
+                key = price_key(product.pk, variant.category_id, variant.color_id, size, unit_amount)
+                wanted.add(key)
+                if key in cached:
+                    continue
+
+                created += 1
+                if options["dry_run"]:
+                    self.stdout.write(f"Would create {key}")
+                    continue
+
+                color_name = variant.color.name if variant.color else None
+                identity = (product.pk, variant.category_id, variant.color_id, size)
+                if identity not in stripe_products:
+                    image_url = urljoin(options["site_url"], checkout_image_url(product)) if product.image else ""
+                    stripe_products[identity] = stripe_call(
+                        "product.create",
+                        stripe.Product.create,
+                        name=product.name,
+                        description=product_description(size, color_name, variant.category.name),
+                        images=[image_url] if image_url.startswith("http") else [],
+                        metadata=product_metadata(product.pk, size, color_name, variant.category.name),
+                    ).id
+
+                stripe_price = stripe_call(
+                    "price.create",
+                    stripe.Price.create,
+                    product=stripe_products[identity],
+                    currency="usd",
+                    unit_amount=unit_amount,
+                )
+                StripePrice.objects.create(
+                    price_key=key,
+                    product=product,
+                    category_id=variant.category_id,
+                    color_id=variant.color_id,
+                    size=size,
+                    unit_amount=unit_amount,
+                    stripe_product_id=stripe_products[identity],
+                    stripe_price_id=stripe_price.id,
+                )
+
+        stale = [row for key, row in cached.items() if key not in wanted]
+        if not options["dry_run"]:
+            for row in stale:
+                stripe_call("price.modify", stripe.Price.modify, row.stripe_price_id, active=False)
+            StripePrice.objects.filter(pk__in=[row.pk for row in stale]).delete()
+
+        prefix = "Dry run: " if options["dry_run"] else ""
+        self.stdout.write(f"{prefix}{created} price(s) created, {len(stale)} stale price(s) retired")
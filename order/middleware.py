@@ -0,0 +1,15 @@
+from django.http import HttpRequest, HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from .cart import set_cart_cookies
+
+
+class CartCookieMiddleware(MiddlewareMixin):
+    """
+    Middleware that reissues the cart cookies when the request changed the cart
+    or, for cookie carts, the selected collection
+    """
+
+    def process_response(self, request: HttpRequest, response: HttpResponse) -> HttpResponse:
+        set_cart_cookies(request, response)
+        return response
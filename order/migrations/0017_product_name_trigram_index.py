@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    """Trigram GIN index for the storefront's name__icontains search (Postgres only)"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS order_product_name_trgm "
+        "ON order_product USING gin ((UPPER(name::text)) gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS order_product_name_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0016_product_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, reverse_code=drop_trigram_index),
+    ]
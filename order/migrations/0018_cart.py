@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:15
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0017_product_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CartLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line_key', models.CharField(max_length=64)),
+                ('product_name', models.CharField(max_length=200)),
+                ('size', models.CharField(blank=True, choices=[('XS', 'Youth XS'), ('YS', 'Youth Small'), ('YM', 'Youth Medium'), ('YL', 'Youth Large'), ('YXL', 'Youth XL'), ('AS', 'Adult Small'), ('AM', 'Adult Medium'), ('AL', 'Adult Large'), ('AXL', 'Adult XL'), ('2X', 'Adult 2X'), ('3X', 'Adult 3X'), ('4X', 'Adult 4X'), ('5X', 'Adult 5X'), ('OS', 'One Size')])),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('color_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('color_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('category_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('category_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('price', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=6)),
+                ('back_name', models.CharField(blank=True, max_length=200)),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='order.cart')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='order.product')),
+            ],
+            options={
+                'ordering': ['pk'],
+                'constraints': [models.UniqueConstraint(fields=('cart', 'line_key'), name='unique_cart_line')],
+            },
+        ),
+    ]
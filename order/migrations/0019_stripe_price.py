@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0018_cart'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripePrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_key', models.CharField(max_length=100, unique=True)),
+                ('category_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('color_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('size', models.CharField(blank=True, choices=[('XS', 'Youth XS'), ('YS', 'Youth Small'), ('YM', 'Youth Medium'), ('YL', 'Youth Large'), ('YXL', 'Youth XL'), ('AS', 'Adult Small'), ('AM', 'Adult Medium'), ('AL', 'Adult Large'), ('AXL', 'Adult XL'), ('2X', 'Adult 2X'), ('3X', 'Adult 3X'), ('4X', 'Adult 4X'), ('5X', 'Adult 5X'), ('OS', 'One Size')])),
+                ('unit_amount', models.PositiveIntegerField()),
+                ('stripe_product_id', models.CharField(max_length=255)),
+                ('stripe_price_id', models.CharField(max_length=255)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='order.product')),
+            ],
+        ),
+    ]
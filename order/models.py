@@ -1 +1 @@
-import sysfrom decimal import Decimalfrom io import BytesIOfrom PIL import Imagefrom django.core.files.uploadedfile import InMemoryUploadedFilefrom django.db import modelsclass ProductCategory(models.Model):    name = models.CharField(max_length=100, unique=True)    active = models.BooleanField(default=True)    def __str__(self):        return self.nameclass ProductColor(models.Model):    name = models.CharField(max_length=100, unique=True)    def __str__(self):        return self.nameclass Size(models.TextChoices):    YOUTH_XS = 'XS', 'Youth XS'    YOUTH_S = 'YS', 'Youth Small'    YOUTH_M = 'YM', 'Youth Medium'    YOUTH_L = 'YL', 'Youth Large'    YOUTH_XL = 'YXL', 'Youth XL'    ADULT_S = 'AS', 'Adult Small'    ADULT_M = 'AM', 'Adult Medium'    ADULT_L = 'AL', 'Adult Large'    ADULT_XL = 'AXL', 'Adult XL'    ADULT_2X = '2X', 'Adult 2X'    ADULT_3X = '3X', 'Adult 3X'    ADULT_4X = '4X', 'Adult 4X'    ADULT_5X = '5X', 'Adult 5X'    ONE_SIZE = 'OS', 'One Size'class Collection(models.Model):    name = models.CharField(max_length=200, unique=True)    active = models.BooleanField(default=True)    def __str__(self):        return self.nameclass Product(models.Model):    category = models.ManyToManyField(ProductCategory, related_name="products", blank=True)    collection = models.ForeignKey(        Collection,        on_delete=models.CASCADE,        related_name="products",        null=True,        blank=True    )    colors = models.ManyToManyField(        ProductColor,        related_name="products",        blank=True    )    name = models.CharField(max_length=200)    image = models.ImageField(upload_to="products/")    available_sizes = models.JSONField(default=list)    has_back_name = models.BooleanField(default=False)    active = models.BooleanField(default=True)    def __str__(self):        return f"{self.colors} {self.name}"    @property    def get_available_sizes(self):        return [            (size, Size(size).label if size in Size.values else size)            for size in self.available_sizes        ]    def save(self, *args, **kwargs):        if self.image:            try:                img = Image.open(self.image)                width, height = img.size                if width != 344 or height != 250:                    self.image.seek(0)  # Reset file pointer                    self.image = self.resize_image(self.image)            except Exception:                pass        super().save(*args, **kwargs)    def resize_image(self, image_field):        """Resize image to 344x250 pixels with optimal quality"""        TARGET_WIDTH = 344        TARGET_HEIGHT = 250        try:            img = Image.open(image_field)        except Exception:            return image_field        original_format = img.format        if img.mode in ('RGBA', 'LA', 'P'):            background = Image.new('RGB', img.size, (255, 255, 255))            if img.mode == 'P':                img = img.convert('RGBA')            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)            img = background        elif img.mode != 'RGB':            img = img.convert('RGB')        img = img.resize((TARGET_WIDTH, TARGET_HEIGHT), Image.LANCZOS)        output = BytesIO()        save_format = 'JPEG' if original_format in ['JPEG', 'JPG', None] else original_format        if save_format == 'JPEG':            img.save(                output,                format='JPEG',                quality=95,                optimize=True,                subsampling=0            )            extension = 'jpg'        else:            img.save(output, format=save_format, quality=95)            extension = save_format.lower()        output.seek(0)        file_size = output.getbuffer().nbytes        original_name = image_field.name.split('/')[-1]  # Get just filename        name_without_ext = original_name.rsplit('.', 1)[0]  # Remove extension        return InMemoryUploadedFile(            output,            'ImageField',            f"{name_without_ext}.{extension}",            f'image/{save_format.lower()}',            file_size,            None        )class Order(models.Model):    customer_name = models.CharField(max_length=100, blank=True, verbose_name='Name')    customer_email = models.CharField(max_length=100, blank=True, verbose_name='Email')    customer_venmo = models.CharField(max_length=100, blank=True, verbose_name='Venmo')    created_at = models.DateTimeField(auto_now_add=True)    has_paid = models.BooleanField(default=False)    stripe_session_id = models.CharField(max_length=255, blank=True, null=True)    archived = models.BooleanField(default=False)    order_id = models.CharField(max_length=100, unique=True, blank=True, null=True)    pending_items = models.JSONField(null=True, blank=True)    def __str__(self):        return f"Order #{self.id} by {self.customer_name}"class OrderItem(models.Model):    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)    back_name = models.CharField(max_length=200, null=True, blank=True)    product_name = models.CharField(max_length=200, blank=True, null=True)    product_color = models.CharField(max_length=50, blank=True, null=True)    product_cost = models.DecimalField(max_digits=6, decimal_places=2, blank=True, null=True)    product_category = models.CharField(max_length=100, blank=True, null=True)    collection_name = models.CharField(max_length=200, blank=True, null=True)    size = models.CharField(choices=Size.choices, blank=True)    quantity = models.PositiveIntegerField(default=1)    category_id = models.PositiveIntegerField(blank=True, null=True)    def save(self, *args, **kwargs):        if self.product:            self.product_name = self.product.name            variant = None            if self.product_category:                try:                    cat_id = int(self.product_category)                    from .models import ProductCategory                    category = ProductCategory.objects.filter(id=cat_id).first()                except (ValueError, TypeError):                    category = None                if not category:                    from .models import ProductCategory                    category = ProductCategory.objects.filter(name=self.product_category).first()                if category:                    variant = self.product.variants.filter(category=category).first()                    self.product_category = category.name            if not variant:                first_variant = self.product.variants.first()                if first_variant:                    variant = first_variant                    if not self.product_category:                        self.product_category = first_variant.category.name            if variant:                if not self.product_cost:                    self.product_cost = variant.price            else:                if not self.product_cost:                    self.product_cost = Decimal("0.00")            self.collection_name = self.product.collection.name if self.product.collection else None        super().save(*args, **kwargs)class ProductVariant(models.Model):    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="variants")    category = models.ForeignKey(ProductCategory, on_delete=models.CASCADE)    price = models.DecimalField(max_digits=6, decimal_places=2)    color = models.ForeignKey(ProductColor, on_delete=models.SET_NULL, null=True, blank=True)    available_sizes = models.JSONField(default=list, blank=True)    class Meta:        constraints = [            models.UniqueConstraint(                fields=['product', 'category', 'color'],                name='unique_product_variant'            )        ]    def __str__(self):        return f"{self.product.name} - {self.category.name} (${self.price})"
\ No newline at end of file
+import sysfrom decimal import Decimalfrom io import BytesIOfrom PIL import Imagefrom django.core.files.uploadedfile import InMemoryUploadedFilefrom django.db import modelsfrom django.utils import timezoneclass ProductCategory(models.Model):    name = models.CharField(max_length=100, unique=True)    active = models.BooleanField(default=True)    def __str__(self):        return self.nameclass ProductColor(models.Model):    name = models.CharField(max_length=100, unique=True)    def __str__(self):        return self.nameclass Size(models.TextChoices):    YOUTH_XS = 'XS', 'Youth XS'    YOUTH_S = 'YS', 'Youth Small'    YOUTH_M = 'YM', 'Youth Medium'    YOUTH_L = 'YL', 'Youth Large'    YOUTH_XL = 'YXL', 'Youth XL'    ADULT_S = 'AS', 'Adult Small'    ADULT_M = 'AM', 'Adult Medium'    ADULT_L = 'AL', 'Adult Large'    ADULT_XL = 'AXL', 'Adult XL'    ADULT_2X = '2X', 'Adult 2X'    ADULT_3X = '3X', 'Adult 3X'    ADULT_4X = '4X', 'Adult 4X'    ADULT_5X = '5X', 'Adult 5X'    ONE_SIZE = 'OS', 'One Size'class Collection(models.Model):    name = models.CharField(max_length=200, unique=True)    active = models.BooleanField(default=True)    def __str__(self):        return self.nameclass Product(models.Model):    category = models.ManyToManyField(ProductCategory, related_name="products", blank=True)    collection = models.ForeignKey(        Collection,        on_delete=models.CASCADE,        related_name="products",        null=True,        blank=True    )    colors = models.ManyToManyField(        ProductColor,        related_name="products",        blank=True    )    name = models.CharField(max_length=200)    image = models.ImageField(upload_to="products/", width_field="image_width", height_field="image_height")    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)    available_sizes = models.JSONField(default=list)    has_back_name = models.BooleanField(default=False)    active = models.BooleanField(default=True)    def __str__(self):        return f"{self.colors} {self.name}"    @property    def get_available_sizes(self):        return [            (size, Size(size).label if size in Size.values else size)            for size in self.available_sizes        ]    def save(self, *args, **kwargs):        if self.image:            try:                img = Image.open(self.image)                width, height = img.size                if width != 344 or height != 250:                    self.image.seek(0)  # Reset file pointer                    self.image = self.resize_image(self.image)            except Exception:                pass        super().save(*args, **kwargs)    def resize_image(self, image_field):        """Resize image to 344x250 pixels with optimal quality"""        TARGET_WIDTH = 344        TARGET_HEIGHT = 250        try:            img = Image.open(image_field)        except Exception:            return image_field        original_format = img.format        if img.mode in ('RGBA', 'LA', 'P'):            background = Image.new('RGB', img.size, (255, 255, 255))            if img.mode == 'P':                img = img.convert('RGBA')            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)            img = background        elif img.mode != 'RGB':            img = img.convert('RGB')        img = img.resize((TARGET_WIDTH, TARGET_HEIGHT), Image.LANCZOS)        output = BytesIO()        save_format = 'JPEG' if original_format in ['JPEG', 'JPG', None] else original_format        if save_format == 'JPEG':            img.save(                output,                format='JPEG',                quality=95,                optimize=True,                subsampling=0            )            extension = 'jpg'        else:            img.save(output, format=save_format, quality=95)            extension = save_format.lower()        output.seek(0)        file_size = output.getbuffer().nbytes        original_name = image_field.name.split('/')[-1]  # Get just filename        name_without_ext = original_name.rsplit('.', 1)[0]  # Remove extension        return InMemoryUploadedFile(            output,            'ImageField',            f"{name_without_ext}.{extension}",            f'image/{save_format.lower()}',            file_size,            None        )class Order(models.Model):    customer_name = models.CharField(max_length=100, blank=True, verbose_name='Name')    customer_email = models.CharField(max_length=100, blank=True, verbose_name='Email')    customer_venmo = models.CharField(max_length=100, blank=True, verbose_name='Venmo')    created_at = models.DateTimeField(auto_now_add=True)    has_paid = models.BooleanField(default=False)    stripe_session_id = models.CharField(max_length=255, blank=True, null=True)    archived = models.BooleanField(default=False)    order_id = models.CharField(max_length=100, unique=True, blank=True, null=True)    pending_items = models.JSONField(null=True, blank=True)    def __str__(self):        return f"Order #{self.id} by {self.customer_name}"class OrderItem(models.Model):    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)    back_name = models.CharField(max_length=200, null=True, blank=True)    product_name = models.CharField(max_length=200, blank=True, null=True)    product_color = models.CharField(max_length=50, blank=True, null=True)    product_cost = models.DecimalField(max_digits=6, decimal_places=2, blank=True, null=True)    product_category = models.CharField(max_length=100, blank=True, null=True)    collection_name = models.CharField(max_length=200, blank=True, null=True)    size = models.CharField(choices=Size.choices, blank=True)    quantity = models.PositiveIntegerField(default=1)    category_id = models.PositiveIntegerField(blank=True, null=True)    def save(self, *args, **kwargs):        if self.product:            self.product_name = self.product.name            variant = None            if self.product_category:                try:                    cat_id = int(self.product_category)                    from .models import ProductCategory                    category = ProductCategory.objects.filter(id=cat_id).first()                except (ValueError, TypeError):                    category = None                if not category:                    from .models import ProductCategory                    category = ProductCategory.objects.filter(name=self.product_category).first()                if category:                    variant = self.product.variants.filter(category=category).first()                    self.product_category = category.name            if not variant:                first_variant = self.product.variants.first()                if first_variant:                    variant = first_variant                    if not self.product_category:                        self.product_category = first_variant.category.name            if variant:                if not self.product_cost:                    self.product_cost = variant.price            else:                if not self.product_cost:                    self.product_cost = Decimal("0.00")            self.collection_name = self.product.collection.name if self.product.collection else None        super().save(*args, **kwargs)class ProductVariant(models.Model):    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="variants")    category = models.ForeignKey(ProductCategory, on_delete=models.CASCADE)    price = models.DecimalField(max_digits=6, decimal_places=2)    color = models.ForeignKey(ProductColor, on_delete=models.SET_NULL, null=True, blank=True)    available_sizes = models.JSONField(default=list, blank=True)    class Meta:        constraints = [            models.UniqueConstraint(                fields=['product', 'category', 'color'],                name='unique_product_variant'            )        ]    def __str__(self):        return f"{self.product.name} - {self.category.name} (${self.price})"class Cart(models.Model):    """A shopper's cart; the session only holds its id (see order.cart)"""    created_at = models.DateTimeField(auto_now_add=True)    def __str__(self):        return f"Cart #{self.id}"class CartLine(models.Model):    """    One line of a cart. Identical adds (same product, size, category, color    and back name) share a line_key and are merged into a single line.    """    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="lines")    line_key = models.CharField(max_length=64)    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")    product_name = models.CharField(max_length=200)    size = models.CharField(choices=Size.choices, blank=True)    quantity = models.PositiveIntegerField(default=1)    color_id = models.PositiveIntegerField(blank=True, null=True)    color_name = models.CharField(max_length=100, blank=True, null=True)    category_id = models.PositiveIntegerField(blank=True, null=True)    category_name = models.CharField(max_length=100, blank=True, null=True)    price = models.DecimalField(max_digits=6, decimal_places=2, default=Decimal("0.00"))    back_name = models.CharField(max_length=200, blank=True)    class Meta:        ordering = ["pk"]        constraints = [            models.UniqueConstraint(                fields=['cart', 'line_key'],                name='unique_cart_line'            )        ]    def __str__(self):        return f"{self.quantity} x {self.product_name} ({self.size})"class StripePrice(models.Model):    """    Stripe Product/Price ids for one variant, size and unit amount, so    checkout can reference a price instead of sending inline price data    (see order.checkout and the sync_stripe_prices command).    """    price_key = models.CharField(max_length=100, unique=True)    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")    category_id = models.PositiveIntegerField(blank=True, null=True)    color_id = models.PositiveIntegerField(blank=True, null=True)    size = models.CharField(choices=Size.choices, blank=True)    unit_amount = models.PositiveIntegerField()    stripe_product_id = models.CharField(max_length=255)    stripe_price_id = models.CharField(max_length=255)    updated_at = models.DateTimeField(auto_now=True)    def __str__(self):        return f"{self.stripe_price_id} ({self.price_key})"class StripeEvent(models.Model):    """    Inbox of verified Stripe webhook events. The webhook only records the    event (once per event id, however often Stripe redelivers it); the    process_stripe_events worker handles it, retrying failures with backoff    until MAX_ATTEMPTS (see order.inbox).    """    event_id = models.CharField(max_length=255, unique=True)    event_type = models.CharField(max_length=100)    payload = models.JSONField()    received_at = models.DateTimeField(auto_now_add=True)    attempts = models.PositiveIntegerField(default=0)    # Null once the event has used up its attempts    next_attempt_at = models.DateTimeField(null=True, blank=True, default=timezone.now)    processed_at = models.DateTimeField(null=True, blank=True)    last_error = models.TextField(blank=True)    class Meta:        indexes = [models.Index(fields=["processed_at", "next_attempt_at"], name="stripe_event_due")]    def __str__(self):        return f"{self.event_type} {self.event_id}"
\ No newline at end of file
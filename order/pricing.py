@@ -0,0 +1,173 @@
+"""
+Pricing rules shared by the storefront, the cart and checkout
+"""
+from decimal import Decimal
+
+from .models import ProductVariant, Size
+
+# Bump whenever the shape of the price matrix or the upcharge rules change so
+# cached product cards fall back to the server instead of mispricing.
+PRICING_VERSION = 1
+
+SIZE_UPCHARGE_CENTS = {
+    Size.ADULT_2X: 200,
+    Size.ADULT_3X: 200,
+    Size.ADULT_4X: 300,
+}
+
+BACK_NAME_UPCHARGE_CENTS = 200
+
+
+def to_cents(amount):
+    """Convert a Decimal/str dollar amount into integer cents"""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1")))
+
+
+def from_cents(cents):
+    """Convert integer cents back into a two-place Decimal"""
+    return (Decimal(cents) / 100).quantize(Decimal("0.01"))
+
+
+def upcharge_cents(size, back_name):
+    """Total upcharge in cents for a size and optional back name"""
+    cents = SIZE_UPCHARGE_CENTS.get(size, 0)
+    if back_name:
+        cents += BACK_NAME_UPCHARGE_CENTS
+    return cents
+
+
+def product_price_matrix(product):
+    """
+    Compact price table for a single product, embedded in the product card so
+    the browser can price selections without calling get_variant_price.
+
+    Keys:
+        v: pricing version
+        p: "<category_id>:<color_id>" -> variant price in cents
+        c: "<category_id>" -> price of the first variant in that category
+        u: size code -> upcharge in cents
+        b: back name upcharge in cents
+
+    Uses ``product.variants.all()`` so prefetched variants are not re-queried.
+    """
+    by_variant = {}
+    by_category = {}
+    for variant in sorted(product.variants.all(), key=lambda v: v.pk):
+        cents = to_cents(variant.price)
+        by_variant[f"{variant.category_id}:{variant.color_id or ''}"] = cents
+        by_category.setdefault(str(variant.category_id), cents)
+
+    return {
+        "v": PRICING_VERSION,
+        "p": by_variant,
+        "c": by_category,
+        "u": {str(size): cents for size, cents in SIZE_UPCHARGE_CENTS.items()},
+        "b": BACK_NAME_UPCHARGE_CENTS,
+    }
+
+
+def parse_id(value):
+    """Normalize ids coming from POST data or session JSON ("3", 3, "", None)"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class PriceTable:
+    """
+    Variant base prices in cents, keyed for the lookups the storefront makes.
+
+    Build it with ``PriceTable.for_products`` to load every variant a cart
+    needs in a single query, then price any number of lines from memory.
+    """
+
+    def __init__(self, rows):
+        """
+        Args:
+            rows: iterable of (product_id, category_id, color_id, price)
+                  ordered by variant pk
+        """
+        self._exact = {}
+        self._by_category = {}
+        self._by_product = {}
+        for product_id, category_id, color_id, price in rows:
+            cents = to_cents(price)
+            self._exact.setdefault((product_id, category_id, color_id), cents)
+            self._by_category.setdefault((product_id, category_id), cents)
+            self._by_product.setdefault(product_id, cents)
+
+    @classmethod
+    def for_products(cls, product_ids):
+        rows = (
+            ProductVariant.objects
+            .filter(product_id__in=set(product_ids))
+            .order_by("pk")
+            .values_list("product_id", "category_id", "color_id", "price")
+        )
+        return cls(rows)
+
+    def base_cents(self, product_id, category_id=None, color_id=None, product_fallback=True):
+        """
+        Resolve a variant price: exact category/color match, then the first
+        variant in the category, then (for cart lines) the product's first
+        variant. Returns None when nothing matches.
+        """
+        product_id = parse_id(product_id)
+        category_id = parse_id(category_id)
+        color_id = parse_id(color_id)
+
+        if category_id is not None:
+            if color_id is not None:
+                cents = self._exact.get((product_id, category_id, color_id))
+                if cents is not None:
+                    return cents
+            cents = self._by_category.get((product_id, category_id))
+            if cents is not None:
+                return cents
+
+        if product_fallback:
+            return self._by_product.get(product_id)
+        return None
+
+
+def price_cart(items, table=None):
+    """
+    Price a whole cart in one pass.
+
+    Each line's base price comes from the variant table; the price stored on
+    the line at add time is only used when its variant no longer exists.
+    Upcharges are always applied here and never stored on the line.
+
+    Args:
+        items: cart line dicts (product_id, category_id, color_id, size,
+               back_name, quantity, price)
+        table: optional preloaded PriceTable
+
+    Returns:
+        (priced_lines, total_cents) where each priced line is the original
+        dict plus ``unit_cents`` and ``line_cents``
+    """
+    if table is None:
+        table = PriceTable.for_products(item["product_id"] for item in items)
+
+    priced_lines = []
+    total_cents = 0
+    for item in items:
+        base = table.base_cents(item["product_id"], item.get("category_id"), item.get("color_id"))
+        if base is None:
+            base = to_cents(item.get("price") or "0.00")
+
+        unit_cents = base + upcharge_cents(item.get("size"), item.get("back_name"))
+        quantity = int(item.get("quantity", 1))
+        line_cents = unit_cents * quantity
+
+        priced_lines.append({
+            **item,
+            "quantity": quantity,
+            "unit_cents": unit_cents,
+            "line_cents": line_cents,
+        })
+        total_cents += line_cents
+
+    return priced_lines, total_cents
@@ -0,0 +1,183 @@
+"""
+Team roster uploads
+
+Team managers keep player names, sizes and back names in a spreadsheet. A
+CSV/XLSX roster is parsed with polars, every row is resolved against the
+catalog snapshot and variant index (no per-row queries), and the resulting
+lines are added to the cart in one transaction. A roster with any bad row
+adds nothing, so it can be fixed and uploaded again without duplicating
+the rows that were fine.
+
+Columns (case-insensitive, in any order):
+    product (required), type, color, size (required), quantity, back name,
+    player (ignored; for the manager's reference)
+"""
+from io import BytesIO
+
+import polars as pl
+
+from .cart import MAX_LINE_QUANTITY
+from .catalog import get_variant_index
+from .models import Size
+from .pricing import from_cents
+
+ROSTER_MAX_ROWS = 500
+
+COLUMNS = ("product", "type", "color", "size", "quantity", "back_name", "player")
+COLUMN_ALIASES = {
+    "product": "product",
+    "item": "product",
+    "type": "type",
+    "category": "type",
+    "color": "color",
+    "colour": "color",
+    "size": "size",
+    "quantity": "quantity",
+    "qty": "quantity",
+    "back name": "back_name",
+    "back_name": "back_name",
+    "name on back": "back_name",
+    "player": "player",
+}
+REQUIRED_COLUMNS = ("product", "size")
+
+SIZE_LOOKUP = {
+    **{label.lower(): code for code, label in Size.choices},
+    **{code.lower(): code for code in Size.values},
+}
+
+
+class RosterError(ValueError):
+    """The upload could not be read as a roster at all"""
+
+
+def read_roster_frame(upload):
+    """
+    Roster rows as an all-string polars DataFrame with canonical column
+    names, stripped values, blank rows dropped and a "row" column holding
+    each row's spreadsheet row number.
+    """
+    data = upload.read()
+    name = (getattr(upload, "name", "") or "").lower()
+    try:
+        if name.endswith((".xlsx", ".xls")):
+            df = pl.read_excel(BytesIO(data), infer_schema_length=0)
+        else:
+            df = pl.read_csv(BytesIO(data), infer_schema=False, truncate_ragged_lines=True)
+    except ImportError:
+        raise RosterError("Excel rosters are not supported on this server; upload a CSV instead.")
+    except Exception:
+        raise RosterError("The roster could not be read; upload a CSV or XLSX file.")
+
+    columns = {}
+    for column in df.columns:
+        canonical = COLUMN_ALIASES.get(column.strip().lower())
+        if canonical and canonical not in columns.values():
+            columns[column] = canonical
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns.values()]
+    if missing:
+        raise RosterError(f"The roster needs a {' and a '.join(missing)} column.")
+
+    df = (
+        df.select([pl.col(column).cast(pl.String).alias(canonical) for column, canonical in columns.items()])
+        .with_row_index("row", offset=2)
+        .with_columns(pl.exclude("row").str.strip_chars().fill_null(""))
+        .with_columns([pl.lit("").alias(column) for column in COLUMNS if column not in columns.values()])
+        .filter(pl.any_horizontal(pl.exclude("row", "player") != ""))
+    )
+    if df.height > ROSTER_MAX_ROWS:
+        raise RosterError(f"Rosters are limited to {ROSTER_MAX_ROWS} rows.")
+    if df.is_empty():
+        raise RosterError("The roster has no rows.")
+    return df
+
+
+def _quantity(value):
+    """Whole-number quantity from a cell ("3", or "3.0" from a spreadsheet)"""
+    if not value:
+        return 1
+    try:
+        quantity = float(value)
+    except ValueError:
+        return None
+    return int(quantity) if quantity.is_integer() else None
+
+
+def _by_name(objects):
+    return {obj.name.lower(): obj for obj in objects}
+
+
+def _choose(options, value, label):
+    """Resolve a type/color cell against a product's options"""
+    if value:
+        option = _by_name(options).get(value.lower())
+        if option is None:
+            choices = ", ".join(option.name for option in options) or "none"
+            return None, f"{label} '{value}' is not offered (choose from {choices})"
+        return option, None
+    if len(options) > 1:
+        return None, f"Choose a {label.lower()} ({', '.join(option.name for option in options)})"
+    return (options[0] if options else None), None
+
+
+def resolve_roster(df, products):
+    """
+    Resolve roster rows against catalog products.
+
+    Args:
+        df: frame from read_roster_frame
+        products: snapshot products (categories and colors prefetched) the
+                  roster may order from
+
+    Returns:
+        (lines, errors) where lines are dicts of SessionCart.add's arguments
+        and errors are (row number, message) pairs
+    """
+    index = get_variant_index()
+    products = _by_name(products)
+    lines, errors = [], []
+
+    for row in df.iter_rows(named=True):
+        product = products.get(row["product"].lower())
+        if product is None:
+            errors.append((row["row"], f"Unknown product '{row['product']}'"))
+            continue
+
+        category, error = _choose(list(product.category.all()), row["type"], "Type")
+        if error is None:
+            color, error = _choose(list(product.colors.all()), row["color"], "Color")
+        if error:
+            errors.append((row["row"], error))
+            continue
+
+        category_id = category.pk if category else None
+        color_id = color.pk if color else None
+        size = SIZE_LOOKUP.get(row["size"].lower())
+        if size is None or size not in index.available_sizes(product.pk, category_id, color_id):
+            errors.append((row["row"], f"Size '{row['size']}' is not available for {product.name}"))
+            continue
+
+        quantity = _quantity(row["quantity"])
+        if quantity is None or not 1 <= quantity <= MAX_LINE_QUANTITY:
+            errors.append((row["row"], f"Quantity must be a whole number from 1 to {MAX_LINE_QUANTITY}"))
+            continue
+
+        if row["back_name"] and not product.has_back_name:
+            errors.append((row["row"], f"{product.name} cannot have a name on the back"))
+            continue
+
+        lines.append({
+            "product_id": product.pk,
+            "product_name": product.name,
+            "size": size,
+            "quantity": quantity,
+            "color_id": color_id,
+            "color_name": color.name if color else None,
+            "category_id": category_id,
+            "category_name": category.name if category else None,
+            # Base variant price only; upcharges are applied by price_cart
+            "price": from_cents(index.prices.base_cents(product.pk, category_id, color_id) or 0),
+            "back_name": row["back_name"],
+        })
+
+    return lines, errors
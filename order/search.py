@@ -0,0 +1,124 @@
+"""
+Faceted product search within a collection
+
+Text matching runs against Product.name: on Postgres as ILIKE filters served
+by the trigram GIN index (migration 0017), elsewhere against the cached
+catalog snapshot in memory. Either way the matches come back as
+(product id, category ids, color ids) rows and facet counts are tallied from
+those rows, so a search costs at most one query.
+"""
+from django.db import connection
+
+from .catalog import get_collection_snapshot
+from .models import Product
+from .pricing import parse_id
+
+
+def _terms(query):
+    return [term.casefold() for term in (query or "").split()]
+
+
+def _database_rows(collection_id, terms):
+    products = Product.objects.filter(collection_id=collection_id, active=True)
+    for term in terms:
+        products = products.filter(name__icontains=term)
+
+    rows = {}
+    for pk, category_id, color_id in products.values_list("pk", "category__id", "colors__id"):
+        _, categories, colors = rows.setdefault(pk, (pk, set(), set()))
+        if category_id is not None:
+            categories.add(category_id)
+        if color_id is not None:
+            colors.add(color_id)
+    return list(rows.values())
+
+
+def _memory_rows(products, terms):
+    rows = []
+    for product in products:
+        name = product.name.casefold()
+        if all(term in name for term in terms):
+            rows.append((
+                product.pk,
+                {category.pk for category in product.category.all()},
+                {color.pk for color in product.colors.all()},
+            ))
+    return rows
+
+
+def _facet(rows, attribute, names, selected):
+    counts = {}
+    for row in rows:
+        for pk in row[attribute]:
+            counts[pk] = counts.get(pk, 0) + 1
+    return [
+        {"id": pk, "name": names[pk], "count": counts.get(pk, 0), "selected": pk in selected}
+        for pk in sorted(names, key=lambda pk: names[pk])
+    ]
+
+
+def search_collection(collection_id, query="", category_ids=(), color_ids=()):
+    """
+    Search a collection's active products (see search_products).
+
+    Returns:
+        None if the collection does not exist, otherwise search_products'
+        results
+    """
+    snapshot = get_collection_snapshot(collection_id)
+    if snapshot is None:
+        return None
+    return search_products(snapshot["products"], query, category_ids, color_ids, collection_id)
+
+
+def search_products(products, query="", category_ids=(), color_ids=(), collection_id=None):
+    """
+    Filter snapshot products by name, category and color.
+
+    Categories and colors are each OR-ed within the facet and AND-ed across
+    facets. Each facet's counts apply the text query and the other facet's
+    selection, so shoppers see how many products a click would leave.
+
+    Args:
+        products: a collection snapshot's products
+        collection_id: the snapshot's collection, required to run text
+                       queries against the database index on Postgres
+
+    Returns:
+        dict with
+            products: matching products in snapshot order
+            facets: {"categories": [...], "colors": [...]} of
+                    {"id", "name", "count", "selected"}
+    """
+    terms = _terms(query)
+    # Without a text query every product matches, which the snapshot answers
+    # without touching the database
+    if connection.vendor == "postgresql" and terms and collection_id is not None:
+        rows = _database_rows(collection_id, terms)
+    else:
+        rows = _memory_rows(products, terms)
+
+    categories = {parse_id(pk) for pk in category_ids} - {None}
+    colors = {parse_id(pk) for pk in color_ids} - {None}
+
+    def in_categories(row):
+        return not categories or bool(categories & row[1])
+
+    def in_colors(row):
+        return not colors or bool(colors & row[2])
+
+    category_names = {}
+    color_names = {}
+    for product in products:
+        category_names.update((category.pk, category.name) for category in product.category.all())
+        color_names.update((color.pk, color.name) for color in product.colors.all())
+
+    matches = {row[0] for row in rows if in_categories(row) and in_colors(row)}
+
+    return {
+        "products": [product for product in products if product.pk in matches],
+        "facets": {
+            "categories": _facet([row for row in rows if in_colors(row)], 1, category_names, categories),
+            "colors": _facet([row for row in rows if in_categories(row)], 2, color_names, colors),
+        },
+    }
@@ -0,0 +1,27 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from .catalog import bump_catalog_version
+from .images import needs_derivatives, schedule_derivatives
+from .models import Collection, Product, ProductCategory, ProductColor, ProductVariant
+
+CATALOG_MODELS = [Collection, Product, ProductCategory, ProductColor, ProductVariant]
+
+
+def invalidate_catalog(sender, **kwargs):
+    bump_catalog_version()
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(invalidate_catalog, sender=model, dispatch_uid=f"catalog-save-{model.__name__}")
+    post_delete.connect(invalidate_catalog, sender=model, dispatch_uid=f"catalog-delete-{model.__name__}")
+
+for through in [Product.category.through, Product.colors.through]:
+    m2m_changed.connect(invalidate_catalog, sender=through, dispatch_uid=f"catalog-m2m-{through.__name__}")
+
+
+def queue_image_derivatives(sender, instance, raw=False, **kwargs):
+    if not raw and needs_derivatives(instance):
+        schedule_derivatives(instance.pk)
+
+
+post_save.connect(queue_image_derivatives, sender=Product, dispatch_uid="product-image-derivatives")
@@ -0,0 +1,241 @@
+"""
+Shared Stripe client
+
+Every Stripe API call goes through stripe_call, which:
+
+- sends it over one pooled keep-alive requests session per process, with
+  bounded connect/read timeouts (STRIPE_CONNECT_TIMEOUT, STRIPE_READ_TIMEOUT)
+  so a slow Stripe cannot hold a worker indefinitely;
+- lets the SDK retry connection errors, 409/429s and 5xx responses with
+  jittered exponential backoff (STRIPE_MAX_NETWORK_RETRIES; the SDK adds
+  idempotency keys, so retried POSTs are safe);
+- fails fast with StripeUnavailable while the circuit breaker is open, i.e.
+  for STRIPE_BREAKER_RESET_SECONDS after STRIPE_BREAKER_THRESHOLD consecutive
+  connection or 5xx failures, before letting one trial call through;
+- counts calls, errors, fast-failed calls and a latency histogram per
+  operation in the cache (see stripe_stats and the stripe_stats command).
+
+STRIPE_API_BASE points the client at a local Stripe stand-in.
+"""
+import logging
+import threading
+import time
+
+import requests
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = (
+    "checkout.session.create",
+    "checkout.session.retrieve",
+    "checkout.session.list_line_items",
+    "product.create",
+    "price.create",
+    "price.modify",
+)
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+BREAKER_OPENED_KEY = "stripe:breaker:opened"
+
+# Failures that mean Stripe (or the network to it) is degraded. Card and
+# invalid request errors are answers from a healthy API and never trip it.
+BREAKER_ERRORS = (stripe.APIConnectionError, stripe.APIError)
+
+
+class StripeUnavailable(stripe.APIConnectionError):
+    """Raised without calling Stripe while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker: closed until ``threshold`` failures
+    in a row, then open for ``reset_seconds``, then half-open, letting a
+    single trial call decide whether it closes again.
+    """
+
+    def __init__(self, threshold, reset_seconds, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "half-open":
+                # Other calls keep failing fast until the trial reports back
+                self.opened_at = self.clock()
+                return True
+            return state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        """Returns True when this failure opened the breaker"""
+        with self._lock:
+            self.failures += 1
+            if self.failures < self.threshold:
+                return False
+            was_closed = self.opened_at is None
+            self.opened_at = self.clock()
+            return was_closed
+
+
+_client_config = None
+_breaker = None
+
+
+def _settings_key():
+    return (
+        settings.STRIPE_SECRET_KEY,
+        settings.STRIPE_API_BASE,
+        settings.STRIPE_CONNECT_TIMEOUT,
+        settings.STRIPE_READ_TIMEOUT,
+        settings.STRIPE_MAX_NETWORK_RETRIES,
+        settings.STRIPE_POOL_SIZE,
+        settings.STRIPE_BREAKER_THRESHOLD,
+        settings.STRIPE_BREAKER_RESET_SECONDS,
+    )
+
+
+def get_breaker():
+    """
+    The process's circuit breaker, with the SDK pointed at the pooled client.
+    Rebuilt only when the Stripe settings change.
+    """
+    global _client_config, _breaker
+    config = _settings_key()
+    if config == _client_config:
+        return _breaker
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.STRIPE_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.api_base = settings.STRIPE_API_BASE
+    stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+    stripe.default_http_client = stripe.RequestsClient(
+        timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+        session=session,
+    )
+
+    _breaker = CircuitBreaker(settings.STRIPE_BREAKER_THRESHOLD, settings.STRIPE_BREAKER_RESET_SECONDS)
+    _client_config = config
+    return _breaker
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def _bucket(elapsed_ms):
+    return next((bucket for bucket in LATENCY_BUCKETS_MS if elapsed_ms <= bucket), "inf")
+
+
+def stripe_call(operation, method, *args, **kwargs):
+    """
+    Call a Stripe SDK method through the shared client, breaker and metrics:
+
+        stripe_call("checkout.session.create", stripe.checkout.Session.create, mode="payment", ...)
+
+    Raises:
+        StripeUnavailable: the breaker is open; Stripe was not called
+        stripe.StripeError: whatever the call raised after retries
+    """
+    breaker = get_breaker()
+    prefix = f"stripe:{operation}"
+    if not breaker.allow():
+        _count(f"{prefix}:rejected")
+        raise StripeUnavailable(f"Stripe is unavailable; {operation} was not attempted")
+
+    started = time.perf_counter()
+    error = None
+    try:
+        result = method(*args, **kwargs)
+        breaker.record_success()
+        return result
+    except BREAKER_ERRORS as e:
+        error = e
+        if breaker.record_failure():
+            _count(BREAKER_OPENED_KEY)
+            logger.error("Stripe circuit breaker opened after %s failures", breaker.failures)
+        raise
+    except stripe.StripeError as e:
+        error = e
+        breaker.record_success()
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _count(f"{prefix}:calls")
+        _count(f"{prefix}:ms:{_bucket(elapsed_ms)}")
+        if error is not None:
+            _count(f"{prefix}:errors")
+            logger.warning("Stripe %s failed after %.0fms: %s", operation, elapsed_ms, error)
+
+
+def _percentile(histogram, calls, fraction):
+    """Upper bound (ms) of the bucket holding the given fraction of calls; None past the last bucket"""
+    if not calls:
+        return None
+    target = calls * fraction
+    seen = 0
+    for bucket, count in histogram:
+        seen += count
+        if seen >= target:
+            return None if bucket == "inf" else bucket
+    return None
+
+
+def stripe_stats():
+    """
+    Per-operation Stripe call metrics across processes sharing this cache.
+
+    Returns:
+        dict with "breaker_opened" (times any breaker opened) and
+        "operations": operation -> calls, errors, rejected (failed fast)
+        and p50/p95/p99 latency bucket bounds in ms
+    """
+    buckets = (*LATENCY_BUCKETS_MS, "inf")
+    operations = {}
+    for operation in OPERATIONS:
+        prefix = f"stripe:{operation}"
+        keys = [f"{prefix}:calls", f"{prefix}:errors", f"{prefix}:rejected"]
+        keys += [f"{prefix}:ms:{bucket}" for bucket in buckets]
+        values = cache.get_many(keys)
+
+        calls = values.get(f"{prefix}:calls", 0)
+        rejected = values.get(f"{prefix}:rejected", 0)
+        if not calls and not rejected:
+            continue
+        histogram = [(bucket, values.get(f"{prefix}:ms:{bucket}", 0)) for bucket in buckets]
+        operations[operation] = {
+            "calls": calls,
+            "errors": values.get(f"{prefix}:errors", 0),
+            "rejected": rejected,
+            "p50": _percentile(histogram, calls, 0.50),
+            "p95": _percentile(histogram, calls, 0.95),
+            "p99": _percentile(histogram, calls, 0.99),
+        }
+
+    return {"breaker_opened": cache.get(BREAKER_OPENED_KEY, 0), "operations": operations}
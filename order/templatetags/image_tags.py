@@ -0,0 +1,16 @@
+from django import template
+
+from order.images import picture_sources
+
+register = template.Library()
+
+
+@register.inclusion_tag("order/partials/_product-picture.html")
+def product_picture(product):
+    """Responsive <picture> for a product card"""
+    sources, fallback_srcset = picture_sources(product)
+    return {
+        "product": product,
+        "sources": sources,
+        "fallback_srcset": fallback_srcset,
+    }
@@ -0,0 +1,13 @@
+import json
+
+from django import template
+
+from order.pricing import product_price_matrix
+
+register = template.Library()
+
+
+@register.filter
+def price_matrix(product):
+    """Serialize a product's price matrix for a data-price-matrix attribute"""
+    return json.dumps(product_price_matrix(product), separators=(",", ":"))
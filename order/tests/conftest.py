@@ -2,9 +2,12 @@
 Shared pytest fixtures for Django testing
 """
 import pytest
+from contextlib import contextmanager
 from decimal import Decimal
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
 
 from order.models import (
     Product, ProductCategory, ProductColor, Collection,
@@ -13,6 +16,16 @@ from order.models import (
 
 User = get_user_model()
 
+# Maximum queries per request for the storefront views, independent of how
+# many products or cart lines are involved. Session reads/writes count.
+QUERY_BUDGETS = {
+    'index': 7,
+    'products': 5,
+    'shopping_cart': 4,
+    'view_summary': 3,
+    'confirm_order': 11,
+}
+
 
 @pytest.fixture
 def request_factory():
@@ -212,4 +225,24 @@ def session_with_items(db, product):
             }
         ],
         'selected_collection_id': product.collection.id
-    }
\ No newline at end of file
+    }
+
+@pytest.fixture
+def query_budget():
+    """
+    Asserts a block stays within a storefront view's query budget:
+
+        with query_budget('index'):
+            client.get(reverse('order:index'))
+    """
+    @contextmanager
+    def within(view_name):
+        budget = QUERY_BUDGETS[view_name]
+        with CaptureQueriesContext(connection) as queries:
+            yield queries
+        executed = [query['sql'] for query in queries.captured_queries]
+        assert len(executed) <= budget, (
+            f"{view_name} ran {len(executed)} queries (budget {budget}):\n" + "\n".join(executed)
+        )
+
+    return within
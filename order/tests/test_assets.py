@@ -0,0 +1,39 @@
+"""
+Tests for the built static asset bundles
+"""
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from order.management.commands.build_assets import JS_BUNDLES
+
+
+class TestBuildAssets:
+    """Tests for the build_assets management command"""
+
+    def test_js_bundles_minified(self, tmp_path):
+        """Test each bundle concatenates its sources and comes out smaller"""
+        call_command('build_assets', '--skip-css', '--out-dir', str(tmp_path))
+
+        for bundle in JS_BUNDLES:
+            built = (tmp_path / bundle).read_text()
+            assert built
+            assert '// static/js/' not in built
+
+        assert 'updateCardPrice' in (tmp_path / 'storefront.js').read_text()
+        assert 'toggleCart' in (tmp_path / 'app.js').read_text()
+
+
+@pytest.mark.django_db
+class TestTemplatesUseBuiltAssets:
+    """Tests that pages load the built bundles instead of runtime CDNs"""
+
+    def test_storefront_assets(self, client):
+        """Test the storefront loads the built CSS/JS and no runtime Tailwind or ECharts"""
+        content = client.get(reverse('order:index')).content.decode()
+
+        assert 'build/app.css' in content
+        assert 'build/app.js' in content
+        assert 'build/storefront.js' in content
+        assert 'cdn.tailwindcss.com' not in content
+        assert 'echarts' not in content
@@ -0,0 +1,92 @@
+"""
+Tests for Cache-Control, Vary and conditional GET on storefront pages
+"""
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+
+
+@pytest.fixture(autouse=True)
+def clear_cache_for_tests():
+    """Start every test from a cold catalog cache"""
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.mark.django_db
+class TestCachePolicy:
+    """Tests for the cache_policy decorator"""
+
+    @pytest.mark.parametrize('url_name', ['order:index', 'order:about', 'order:contact'])
+    def test_anonymous_headers(self, client, url_name):
+        """Test anonymous pages are private, revalidated and vary on cookie and HTMX"""
+        response = client.get(reverse(url_name))
+
+        assert response.status_code == 200
+        assert response['ETag']
+        assert 'private' in response['Cache-Control']
+        assert 'no-cache' in response['Cache-Control']
+        assert 'Cookie' in response['Vary']
+        assert 'HX-Request' in response['Vary']
+
+    @pytest.mark.parametrize('url_name', ['order:index', 'order:about', 'order:contact'])
+    def test_repeat_request_gets_304(self, client, url_name):
+        """Test a revalidation with the same cookies is answered with 304"""
+        url = reverse(url_name)
+        first = client.get(url)
+        second = client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        assert second.status_code == 304
+        assert second.content == b''
+
+    def test_etag_ignores_csrf_masking(self, client):
+        """Test re-masked CSRF tokens do not change the validator"""
+        url = reverse('order:contact')
+        assert client.get(url)['ETag'] == client.get(url)['ETag']
+
+    def test_new_csrf_cookie_changes_etag(self, client):
+        """Test a page rendered for another CSRF secret is not revalidated"""
+        url = reverse('order:contact')
+        first = client.get(url)
+
+        client.cookies.clear()
+        second = client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        assert second.status_code == 200
+
+    def test_htmx_and_full_page_do_not_collide(self, client):
+        """Test an HTMX request never revalidates against the full page"""
+        url = reverse('order:about')
+        page = client.get(url)
+        partial = client.get(url, HTTP_HX_REQUEST='true', HTTP_IF_NONE_MATCH=page['ETag'])
+
+        assert partial.status_code == 200
+        assert partial['ETag'] != page['ETag']
+
+    def test_authenticated_no_validators(self, client, regular_user):
+        """Test signed-in pages are private and get no ETag"""
+        client.force_login(regular_user)
+        response = client.get(reverse('order:about'))
+
+        assert 'private' in response['Cache-Control']
+        assert not response.has_header('ETag')
+
+    def test_post_untouched(self, client):
+        """Test form posts are never given validators"""
+        response = client.post(reverse('order:contact'), {'email': 'bad'})
+        assert not response.has_header('ETag')
+
+    def test_grid_keeps_its_own_policy(self, client, collection, product):
+        """Test cached product grids keep their catalog-version validators"""
+        response = client.get(reverse('order:products', args=[collection.id]))
+        assert response['ETag'].startswith('"products-')
+
+    def test_enforced_nonce_disables_304(self, client, settings):
+        """Test pages are not revalidated when the CSP header pins a per-request nonce"""
+        from csp.constants import NONCE
+        settings.CONTENT_SECURITY_POLICY = {'DIRECTIVES': {'script-src': ["'self'", NONCE]}}
+
+        url = reverse('order:about')
+        first = client.get(url)
+        second = client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        assert second.status_code == 200
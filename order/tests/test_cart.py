@@ -0,0 +1,381 @@
+"""
+Tests for the server-side cart store
+"""
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from unittest.mock import Mock, patch
+
+from order.cart import (
+    CART_COOKIE, CART_ITEMS_COOKIE, CART_SESSION_KEY, COLLECTION_COOKIE, LEGACY_SESSION_KEY,
+    CookieCart, SessionCart, read_cart_token,
+)
+from order.models import Cart, CartLine, Size
+
+
+def add_shirt(client, product, **fields):
+    return client.post(reverse('order:add_item'), {
+        'product': product.id,
+        'size': Size.ADULT_L,
+        'quantity': 1,
+        **fields,
+    })
+
+
+@pytest.mark.django_db
+class TestSessionCart:
+    """Tests for adding, merging and removing cart lines"""
+
+    def test_identical_adds_merge(self, client, product, product_category):
+        """Test adding the same item twice increments one line"""
+        add_shirt(client, product, category=product_category.id, quantity=2)
+        add_shirt(client, product, category=product_category.id, quantity=3)
+
+        items = SessionCart(client.session).items()
+        assert len(items) == 1
+        assert items[0]['quantity'] == 5
+
+    def test_different_options_stay_separate(self, client, product, product_category):
+        """Test lines differing only by back name or category are not merged"""
+        add_shirt(client, product, category=product_category.id)
+        add_shirt(client, product, category=product_category.id, back_name='SMITH')
+        add_shirt(client, product)
+
+        assert len(SessionCart(client.session).items()) == 3
+
+    def test_session_written_once(self, client, product):
+        """Test later adds leave the session untouched"""
+        add_shirt(client, product)
+        session_data = client.session.load()
+
+        with CaptureQueriesContext(connection) as queries:
+            add_shirt(client, product, size=Size.ADULT_M)
+
+        assert not [q for q in queries if 'django_session' in q['sql'] and 'UPDATE' in q['sql']]
+        assert client.session.load() == session_data
+
+    def test_delete_by_line_id(self, client, product, product_category):
+        """Test deleting removes exactly the addressed line"""
+        add_shirt(client, product, category=product_category.id)
+        add_shirt(client, product, category=product_category.id, back_name='SMITH')
+        keep, remove = SessionCart(client.session).items()
+
+        response = client.post(reverse('order:delete-item', args=[remove['line_id']]))
+
+        assert response.status_code == 200
+        assert [item['line_id'] for item in SessionCart(client.session).items()] == [keep['line_id']]
+
+    def test_delete_ignores_other_carts(self, client, product):
+        """Test a line id from another cart cannot be deleted"""
+        other = SessionCart({})
+        line_id = other.add(product.id, product.name, Size.ADULT_L)
+        add_shirt(client, product)
+
+        client.post(reverse('order:delete-item', args=[line_id]))
+
+        assert CartLine.objects.filter(pk=line_id).exists()
+
+    def test_set_quantity(self, product):
+        """Test updating a line's quantity, with zero removing it"""
+        cart = SessionCart({})
+        line_id = cart.add(product.id, product.name, Size.ADULT_L)
+
+        assert cart.set_quantity(line_id, 4)
+        assert cart.items()[0]['quantity'] == 4
+        assert cart.set_quantity(line_id, 0)
+        assert len(cart) == 0
+
+    def test_imports_legacy_session_items(self, client, product, session_with_items):
+        """Test carts stored in the session before the cart store carry over"""
+        session = client.session
+        session.update(session_with_items)
+        session.save()
+
+        response = client.get(reverse('order:shopping_cart'))
+
+        assert len(response.context['order_items']) == 1
+        assert LEGACY_SESSION_KEY not in client.session
+        assert SessionCart(client.session).items()[0]['category_name'] == 'T-Shirt'
+
+    def test_clear_deletes_cart(self, product):
+        """Test clearing deletes the cart and its lines"""
+        session = {}
+        cart = SessionCart(session)
+        cart.add(product.id, product.name, Size.ADULT_L)
+
+        cart.clear()
+
+        assert CART_SESSION_KEY not in session
+        assert not Cart.objects.exists()
+        assert not CartLine.objects.exists()
+
+    def test_priced_cart_is_memoized(self, product, product_variant):
+        """Test pricing a cart twice reuses the first result until it changes"""
+        cart = SessionCart({})
+        cart.add(product.id, product.name, Size.ADULT_L)
+        cart.priced()
+
+        with CaptureQueriesContext(connection) as queries:
+            lines, total = cart.priced()
+        assert len(queries) == 0
+        assert total == 2500
+
+        cart.add(product.id, product.name, Size.ADULT_L)
+        assert cart.priced()[1] == 5000
+
+
+@pytest.mark.django_db
+class TestBulkAdd:
+    """Tests for adding a size grid of one product in a single request"""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        cache.clear()
+        yield
+        cache.clear()
+
+    def add_sizes(self, client, product, **fields):
+        return client.post(reverse('order:add_items'), {'product': product.id, **fields})
+
+    def test_grid_merges_with_existing_lines(self, client, product, product_variant):
+        """Test each size becomes one line, merging with lines already in the cart"""
+        add_shirt(client, product, quantity=2)
+
+        response = self.add_sizes(client, product, **{
+            f'qty-{Size.ADULT_L}': '3', f'qty-{Size.ADULT_M}': '5', f'qty-{Size.ADULT_S}': '',
+        })
+
+        assert response.status_code == 200
+        assert 'data-count="2"' in response.content.decode()
+        quantities = {item['size']: item['quantity'] for item in SessionCart(client.session).items()}
+        assert quantities == {Size.ADULT_L: 5, Size.ADULT_M: 5}
+
+    def test_grid_writes_in_bulk(self, client, product, product_variant):
+        """Test a grid costs one insert however many sizes it has"""
+        add_shirt(client, product)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.add_sizes(client, product, **{f'qty-{size}': '2' for size in product.available_sizes})
+
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "order_cartline"')]
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "order_cartline"')]
+        assert (len(inserts), len(updates)) == (1, 1)
+        assert len(SessionCart(client.session).items()) == len(product.available_sizes)
+
+    def test_counts_once_for_rate_limit(self, client, product, product_variant):
+        """Test a grid of many sizes uses one add from the rate limit"""
+        self.add_sizes(client, product, **{f'qty-{size}': '1' for size in product.available_sizes})
+
+        assert cache.get('rate_limit_add_item_127.0.0.1') == 1
+
+    @pytest.mark.parametrize('fields', [
+        {f'qty-{Size.ADULT_L}': '0'},
+        {'qty-NOPE': '2'},
+        {f'qty-{Size.ADULT_L}': '-1'},
+        {f'qty-{Size.ADULT_L}': 'lots'},
+    ])
+    def test_invalid_grid_rejected(self, client, product, fields):
+        """Test empty grids, unavailable sizes and bad quantities add nothing"""
+        response = self.add_sizes(client, product, **fields)
+
+        assert response.status_code == 400
+        assert not CartLine.objects.exists()
+
+    def test_cookie_cart(self, client, product, product_variant, settings):
+        """Test the grid is added to the cookie cart without database writes"""
+        settings.CART_BACKEND = 'cookie'
+
+        self.add_sizes(client, product, **{f'qty-{Size.ADULT_L}': '4', f'qty-{Size.ADULT_M}': '1'})
+
+        assert not CartLine.objects.exists()
+        assert [(item['size'], item['quantity']) for item in cookie_cart_items(client)] == [
+            (Size.ADULT_L, 4), (Size.ADULT_M, 1),
+        ]
+
+
+@pytest.mark.django_db
+class TestCartFragment:
+    """Tests for the cart cookie and the cached cart sidebar"""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        cache.clear()
+        yield
+        cache.clear()
+
+    def token(self, client):
+        return read_cart_token(Mock(COOKIES={CART_COOKIE: client.cookies[CART_COOKIE].value}))
+
+    def test_empty_cart_without_queries(self, client):
+        """Test a visitor without a cart is answered without the database"""
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('order:shopping_cart'))
+
+        assert response.status_code == 200
+        assert len(queries) == 0
+        assert 'Your cart is empty' in response.content.decode()
+
+    def test_cookie_tracks_line_count(self, client, product, product_category):
+        """Test adding and deleting lines reissues the cookie with a new version"""
+        add_shirt(client, product)
+        first = self.token(client)
+        add_shirt(client, product, category=product_category.id)
+        second = self.token(client)
+
+        assert (first.count, second.count) == (1, 2)
+        assert first.version != second.version
+
+        line_id = SessionCart(client.session).items()[0]['line_id']
+        client.post(reverse('order:delete-item', args=[line_id]))
+        assert self.token(client).count == 1
+
+    def test_unchanged_cart_is_cached(self, client, product, product_variant):
+        """Test repeat cart loads come from cache or as a 304"""
+        add_shirt(client, product)
+        first = client.get(reverse('order:shopping_cart'))
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = client.get(reverse('order:shopping_cart'))
+            not_modified = client.get(reverse('order:shopping_cart'), HTTP_IF_NONE_MATCH=first['ETag'])
+
+        assert len(queries) == 0
+        assert cached.content == first.content
+        assert not_modified.status_code == 304
+
+    def test_emptied_cart_skips_database(self, client, product):
+        """Test a cart emptied by deleting its last line is served from the cookie"""
+        add_shirt(client, product)
+        line_id = SessionCart(client.session).items()[0]['line_id']
+        client.post(reverse('order:delete-item', args=[line_id]))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('order:shopping_cart'))
+
+        assert len(queries) == 0
+        assert 'Your cart is empty' in response.content.decode()
+
+    def test_add_returns_cart_out_of_band(self, client, product, product_variant):
+        """Test adding an item answers with the updated sidebar and badges in one response"""
+        response = add_shirt(client, product, quantity=2, back_name='SMITH')
+        content = response.content.decode()
+
+        assert response.status_code == 200
+        assert '<div id="cart-items-container" hx-swap-oob="innerHTML">' in content
+        assert 'data-count="1" data-total="54.00"' in content
+        assert content.count('hx-swap-oob="true"') == 2
+
+    def test_add_warms_cart_cache(self, client, product, product_variant):
+        """Test the sidebar load after adding an item is served from cache"""
+        add_shirt(client, product)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('order:shopping_cart'))
+
+        assert len(queries) == 0
+        assert 'data-count="1"' in response.content.decode()
+
+    def test_delete_returns_cart_out_of_band(self, client, product):
+        """Test deleting the last line answers with the empty sidebar and hidden badges"""
+        add_shirt(client, product)
+        line_id = SessionCart(client.session).items()[0]['line_id']
+
+        content = client.post(reverse('order:delete-item', args=[line_id])).content.decode()
+
+        assert 'Your cart is empty' in content
+        assert content.count('display: none;') == 2
+
+    def test_tampered_cookie_is_ignored(self, client, product):
+        """Test an unsigned cookie cannot claim an empty cart"""
+        add_shirt(client, product)
+        client.cookies[CART_COOKIE] = '0.forged.0'
+
+        response = client.get(reverse('order:shopping_cart'))
+
+        assert len(response.context['order_items']) == 1
+        assert self.token(client).count == 1
+
+
+@pytest.mark.django_db
+class TestCookieCart:
+    """Tests for the signed-cookie cart backend"""
+
+    @pytest.fixture(autouse=True)
+    def cookie_backend(self, settings):
+        settings.CART_BACKEND = 'cookie'
+        cache.clear()
+        yield
+        cache.clear()
+
+    def writes(self, queries):
+        return [q['sql'] for q in queries if q['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+
+    def test_browsing_and_carting_write_nothing(self, client, product, product_category, collection):
+        """Test choosing a collection and adding and deleting lines never writes to the database"""
+        with CaptureQueriesContext(connection) as queries:
+            client.post(reverse('order:index'), {'collection': collection.id})
+            add_shirt(client, product, category=product_category.id, quantity=2)
+            add_shirt(client, product, category=product_category.id)
+            add_shirt(client, product, back_name='SMITH')
+            response = client.get(reverse('order:shopping_cart'))
+
+        assert self.writes(queries) == []
+        assert client.cookies[COLLECTION_COOKIE].value == str(collection.id)
+        assert 'data-count="2"' in response.content.decode()
+        assert [item['quantity'] for item in cookie_cart_items(client)] == [3, 1]
+
+        line_id = cookie_cart_items(client)[1]['line_id']
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(reverse('order:delete-item', args=[line_id]))
+        assert self.writes(queries) == []
+        assert 'data-count="1"' in response.content.decode()
+
+    def test_collection_from_cookie(self, client, product, collection):
+        """Test the storefront shows the collection remembered in the cookie"""
+        client.post(reverse('order:index'), {'collection': collection.id})
+
+        response = client.get(reverse('order:index'))
+
+        assert response.context['collection'] == collection
+        assert 'selected_collection_id' not in client.session
+
+    def test_tampered_items_cookie_is_ignored(self, client, product):
+        """Test an unsigned items cookie reads as an empty cart"""
+        add_shirt(client, product)
+        client.cookies[CART_ITEMS_COOKIE] = client.cookies[CART_ITEMS_COOKIE].value + 'x'
+
+        add_shirt(client, product, size=Size.ADULT_M)
+
+        assert [item['size'] for item in cookie_cart_items(client)] == [Size.ADULT_M]
+
+    def test_large_cart_moves_to_server(self, client, product, settings):
+        """Test a cart outgrowing the cookie budget moves into the cart tables"""
+        settings.CART_COOKIE_MAX_BYTES = 150
+        for name in ['SMITH', 'JONES', 'GARCIA', 'NGUYEN', 'WILLIAMS', 'JOHNSON']:
+            add_shirt(client, product, back_name=name)
+
+        assert CartLine.objects.count() == 6
+        assert client.cookies[CART_ITEMS_COOKIE].value == ''
+        response = client.get(reverse('order:shopping_cart'))
+        assert 'data-count="6"' in response.content.decode()
+
+    def test_checkout_clears_cookie_cart(self, client, product, product_variant):
+        """Test checkout prices the cookie cart and empties it"""
+        add_shirt(client, product, quantity=2)
+
+        with patch('stripe.checkout.Session.create') as mock_stripe:
+            mock_stripe.return_value = Mock(url='https://checkout.stripe.com/test')
+            client.post(reverse('order:confirm_order'), {
+                'customer_name': 'Coach',
+                'customer_email': 'coach@test.com',
+            })
+
+        line_item = mock_stripe.call_args.kwargs['line_items'][0]
+        assert (line_item['quantity'], line_item['price_data']['unit_amount']) == (2, 2500)
+        assert client.cookies[CART_ITEMS_COOKIE].value == ''
+        assert read_cart_token(Mock(COOKIES={CART_COOKIE: client.cookies[CART_COOKIE].value})).count == 0
+
+
+def cookie_cart_items(client):
+    return CookieCart(Mock(COOKIES={name: morsel.value for name, morsel in client.cookies.items()})).items()
@@ -0,0 +1,491 @@
+"""
+Tests for the versioned catalog snapshot
+"""
+import pytest
+from decimal import Decimal
+from unittest.mock import patch
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from order.cart import SessionCart
+from order.catalog import (
+    bump_catalog_version, catalog_stats, get_active_products,
+    get_catalog_version, get_collection_availability, get_collection_snapshot, get_variant_index,
+    page_products
+)
+from order.fragments import CSRF_PLACEHOLDER
+from order.models import ProductCategory, ProductColor, ProductVariant, Size
+from order.search import search_collection
+
+
+@pytest.fixture(autouse=True)
+def clear_cache_for_tests():
+    """Start every test from a cold catalog cache"""
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.mark.django_db
+class TestCatalogSnapshot:
+    """Tests for building and serving collection snapshots"""
+
+    def test_snapshot_contents(self, collection, product, product_variant):
+        """Test a snapshot carries the collection and its active products"""
+        snapshot = get_collection_snapshot(collection.id)
+        assert snapshot['collection'] == collection
+        assert snapshot['products'] == [product]
+
+    def test_missing_collection(self, db):
+        """Test unknown collections return None"""
+        assert get_collection_snapshot(99999) is None
+
+    def test_cached_snapshot_needs_no_queries(self, collection, product, product_variant):
+        """Test a warm snapshot renders categories, colors and variants without the database"""
+        get_collection_snapshot(collection.id)
+
+        with CaptureQueriesContext(connection) as queries:
+            snapshot = get_collection_snapshot(collection.id)
+            cached = snapshot['products'][0]
+            list(cached.category.all())
+            list(cached.colors.all())
+            [v.category.name for v in cached.variants.all()]
+
+        assert len(queries) == 0
+
+    def test_hit_miss_counters(self, collection, product):
+        """Test the first lookup misses and later lookups hit"""
+        get_collection_snapshot(collection.id)
+        get_collection_snapshot(collection.id)
+        get_collection_snapshot(collection.id)
+
+        stats = catalog_stats()
+        assert stats['misses'] == 1
+        assert stats['hits'] == 2
+
+    def test_active_products_across_collections(self, product, inactive_collection):
+        """Test the admin snapshot only includes active collections"""
+        assert get_active_products() == [product]
+
+
+@pytest.mark.django_db
+class TestCatalogInvalidation:
+    """Tests for bumping the catalog version on catalog changes"""
+
+    def test_bump_increments(self, db):
+        """Test bumping moves to a new version"""
+        version = get_catalog_version()
+        assert bump_catalog_version() == version + 1
+
+    def test_product_save_invalidates(self, collection, product):
+        """Test renaming a product is visible on the next lookup"""
+        get_collection_snapshot(collection.id)
+
+        product.name = 'Renamed Shirt'
+        product.save()
+
+        assert get_collection_snapshot(collection.id)['products'][0].name == 'Renamed Shirt'
+
+    def test_variant_change_invalidates(self, collection, product, product_variant):
+        """Test variant price changes bump the version"""
+        version = get_catalog_version()
+        product_variant.price = Decimal('30.00')
+        product_variant.save()
+        assert get_catalog_version() > version
+
+        version = get_catalog_version()
+        product_variant.delete()
+        assert get_catalog_version() > version
+
+    def test_m2m_change_invalidates(self, collection, product, product_color_blue):
+        """Test adding a color to a product bumps the version"""
+        version = get_catalog_version()
+        product.colors.add(product_color_blue)
+        assert get_catalog_version() > version
+
+    def test_color_category_collection_changes_invalidate(self, collection):
+        """Test colors, categories and collections bump the version"""
+        version = get_catalog_version()
+        ProductColor.objects.create(name='Green')
+        ProductCategory.objects.create(name='Tank')
+        collection.name = 'Fall 2024'
+        collection.save()
+        assert get_catalog_version() == version + 3
+
+
+@pytest.mark.django_db
+class TestStorefrontViewsUseSnapshot:
+    """Tests for serving index and products from the snapshot"""
+
+    def test_products_view_renders_collection(self, client, collection, product):
+        """Test the collection partial renders the snapshot's products"""
+        response = client.get(reverse('order:products', args=[collection.id]))
+        assert response.status_code == 200
+        assert product.name in response.content.decode()
+
+    def test_products_view_missing_collection(self, client, db):
+        """Test unknown collections 404"""
+        response = client.get(reverse('order:products', args=[99999]))
+        assert response.status_code == 404
+
+    def test_index_served_from_snapshot(self, client, collection, product, product_variant):
+        """Test a repeat index view hits the snapshot"""
+        session = client.session
+        session['selected_collection_id'] = collection.id
+        session.save()
+
+        client.get(reverse('order:index'))
+        client.get(reverse('order:index'))
+
+        stats = catalog_stats()
+        assert stats['misses'] == 1
+        assert stats['hits'] == 1
+
+
+@pytest.mark.django_db
+class TestProductsFragmentCache:
+    """Tests for the cached product grid and its conditional GET support"""
+
+    def test_csrf_token_injected(self, client, collection, product):
+        """Test the cached grid never leaks the placeholder token"""
+        response = client.get(reverse('order:products', args=[collection.id]))
+        content = response.content.decode()
+
+        assert CSRF_PLACEHOLDER not in content
+        assert 'name="csrfmiddlewaretoken"' in content
+
+    def test_fragment_rendered_once(self, client, collection, product):
+        """Test repeat requests reuse the rendered fragment without queries"""
+        client.get(reverse('order:products', args=[collection.id]))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('order:products', args=[collection.id]))
+
+        assert response.status_code == 200
+        assert len(queries) == 0
+
+    def test_repeat_request_gets_304(self, client, collection, product):
+        """Test a repeat HTMX request with the ETag is answered with 304"""
+        url = reverse('order:products', args=[collection.id])
+        first = client.get(url, HTTP_HX_REQUEST='true')
+        assert first['ETag']
+        assert first['Last-Modified']
+        assert 'HX-Request' in first['Vary']
+
+        second = client.get(url, HTTP_HX_REQUEST='true', HTTP_IF_NONE_MATCH=first['ETag'])
+        assert second.status_code == 304
+
+    def test_catalog_change_changes_etag(self, client, collection, product):
+        """Test editing the catalog invalidates the validator"""
+        url = reverse('order:products', args=[collection.id])
+        first = client.get(url)
+
+        product.name = 'Renamed Shirt'
+        product.save()
+
+        second = client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        assert second.status_code == 200
+        assert 'Renamed Shirt' in second.content.decode()
+
+    def test_collection_post_uses_fragment(self, client, collection, product):
+        """Test the HTMX collection switch returns the cached grid"""
+        response = client.post(
+            reverse('order:index'),
+            {'collection': collection.id},
+            HTTP_HX_REQUEST='true',
+        )
+        assert response.status_code == 200
+        assert product.name in response.content.decode()
+        assert CSRF_PLACEHOLDER not in response.content.decode()
+
+
+@pytest.mark.django_db
+class TestCollectionAvailability:
+    """Tests for the batch variant availability matrix"""
+
+    def test_matrix_contents(self, collection, product, product_variant, product_category, product_color):
+        """Test each product lists its sizes and variants with cents and sizes"""
+        availability = get_collection_availability(collection.id)
+        entry = availability['products'][str(product.id)]
+
+        assert availability['v'] == get_catalog_version()
+        assert availability['labels'][Size.ADULT_L] == 'Adult Large'
+        assert entry['sizes'] == [Size.ADULT_M, Size.ADULT_L, Size.ADULT_XL]
+        assert entry['variants'] == [[
+            product_category.id, product_color.id, 2500,
+            [Size.ADULT_M, Size.ADULT_L, Size.ADULT_XL],
+        ]]
+
+    def test_products_without_variants(self, collection, multiple_products):
+        """Test products without variants still report their sizes"""
+        availability = get_collection_availability(collection.id)
+        assert len(availability['products']) == 5
+        assert all(entry['variants'] == [] for entry in availability['products'].values())
+
+    def test_single_query_then_cached(self, collection, product, product_variant, multiple_products):
+        """Test the matrix is built with one query and then served from cache"""
+        with CaptureQueriesContext(connection) as queries:
+            get_collection_availability(collection.id)
+        assert len(queries) == 1
+
+        with CaptureQueriesContext(connection) as queries:
+            get_collection_availability(collection.id)
+        assert len(queries) == 0
+
+    def test_endpoint_json_and_304(self, client, collection, product, product_variant):
+        """Test the endpoint returns JSON with an ETag and honours If-None-Match"""
+        url = reverse('order:collection_availability', args=[collection.id])
+        response = client.get(url)
+
+        assert response.status_code == 200
+        assert str(product.id) in response.json()['products']
+
+        repeat = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert repeat.status_code == 304
+
+    def test_grid_advertises_endpoint(self, client, collection, product):
+        """Test the collection grid points the storefront at the matrix"""
+        response = client.get(reverse('order:products', args=[collection.id]))
+        url = reverse('order:collection_availability', args=[collection.id])
+        assert f'data-availability-url="{url}"' in response.content.decode()
+
+
+@pytest.mark.django_db
+class TestVariantIndex:
+    """Tests for resolving products, variants, colors and categories in memory"""
+
+    def test_lookups(self, product, product_variant, product_category, product_color):
+        """Test products, names and prices resolve from string ids"""
+        index = get_variant_index()
+
+        assert index.get_product(str(product.id))['name'] == product.name
+        assert index.get_product('99999') is None
+        assert index.color_name(str(product_color.id)) == product_color.name
+        assert index.category_name(product_category.id) == product_category.name
+        assert index.prices.base_cents(product.id, product_category.id, product_color.id) == 2500
+
+    def test_warm_index_needs_no_queries(self, product, product_variant):
+        """Test a warm index is reused without touching the database"""
+        get_variant_index()
+
+        with CaptureQueriesContext(connection) as queries:
+            index = get_variant_index()
+            index.available_sizes(product.id)
+
+        assert len(queries) == 0
+
+    def test_rebuilt_after_catalog_change(self, product, product_variant, product_color):
+        """Test edits are visible once the catalog version moves"""
+        get_variant_index()
+
+        product_color.name = 'Navy'
+        product_color.save()
+
+        assert get_variant_index().color_name(product_color.id) == 'Navy'
+
+    def test_available_sizes_match_variant_then_product(self, product, product_variant,
+                                                        product_category, product_color_blue):
+        """Test sizes come from the first matching variant, else the product"""
+        ProductVariant.objects.create(
+            product=product,
+            category=product_category,
+            color=product_color_blue,
+            price=Decimal('30.00'),
+            available_sizes=[Size.ADULT_2X],
+        )
+        index = get_variant_index()
+
+        assert index.available_sizes(product.id, product_category.id, product_color_blue.id) == [Size.ADULT_2X]
+        assert index.available_sizes(product.id, product_category.id, '') == product_variant.available_sizes
+        assert index.available_sizes(product.id, '99999', '') == product.available_sizes
+
+    def test_add_item_resolves_from_index(self, client, product, product_variant,
+                                          product_category, product_color):
+        """Test adding to the cart needs no catalog queries once the index is warm"""
+        get_variant_index()
+        client.get(reverse('order:index'))
+
+        # The updated cart rendered into the response is out of scope here
+        with CaptureQueriesContext(connection) as queries, \
+                patch('order.views.cart_oob_response', return_value=HttpResponse()):
+            client.post(reverse('order:add_item'), {
+                'product': product.id,
+                'size': Size.ADULT_L,
+                'quantity': 1,
+                'color': product_color.id,
+                'category': product_category.id,
+            })
+
+        catalog_tables = ('order_product', 'order_productcolor', 'order_productcategory', 'order_productvariant')
+        assert not [q for q in queries if any(t in q['sql'] for t in catalog_tables)]
+
+        item = SessionCart(client.session).items()[0]
+        assert item['color_name'] == product_color.name
+        assert item['category_name'] == product_category.name
+
+    def test_variant_sizes_endpoint(self, client, product, product_variant, product_category):
+        """Test the size picker renders from the index and 404s unknown products"""
+        response = client.get(
+            reverse('order:get_variant_sizes', args=[product.id]),
+            {'category': product_category.id},
+        )
+        assert response.status_code == 200
+        assert 'Adult Large' in response.content.decode()
+
+        missing = client.get(reverse('order:get_variant_sizes', args=[99999]))
+        assert missing.status_code == 404
+
+
+@pytest.mark.django_db
+class TestStorefrontPagination:
+    """Tests for cursor pagination of the product grid"""
+
+    @pytest.fixture(autouse=True)
+    def small_pages(self, settings):
+        settings.STOREFRONT_PAGE_SIZE = 2
+
+    def test_pages_cover_collection_once(self, collection, multiple_products):
+        """Test following cursors visits every product exactly once in order"""
+        products = get_collection_snapshot(collection.id)['products']
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = page_products(products, cursor)
+            seen.extend(page)
+            if cursor is None:
+                break
+
+        assert seen == products
+
+    def test_cursor_survives_deleted_product(self, collection, multiple_products):
+        """Test a cursor whose product was removed resumes at the next product"""
+        products = get_collection_snapshot(collection.id)['products']
+        page, cursor = page_products(products)
+
+        remaining = [p for p in products if p.pk != page[-1].pk]
+        next_page, _ = page_products(remaining, cursor)
+        assert next_page == products[2:4]
+
+    def test_first_page_has_sentinel(self, client, collection, multiple_products):
+        """Test the grid renders one page and a revealed-triggered load-more"""
+        content = client.get(reverse('order:products', args=[collection.id])).content.decode()
+
+        assert content.count('data-product-id=') == 2
+        assert 'hx-trigger="revealed, click"' in content
+        assert 'data-availability-url' in content
+
+    def test_next_page_is_bare_cards(self, client, collection, multiple_products):
+        """Test later pages return only cards and the next sentinel"""
+        products = get_collection_snapshot(collection.id)['products']
+        _, cursor = page_products(products)
+
+        response = client.get(reverse('order:products', args=[collection.id]), {'cursor': cursor})
+        content = response.content.decode()
+
+        assert products[2].name in content
+        assert products[0].name not in content
+        assert 'data-availability-url' not in content
+        assert CSRF_PLACEHOLDER not in content
+
+    def test_last_page_has_no_sentinel(self, client, collection, multiple_products):
+        """Test the final page stops loading"""
+        products = get_collection_snapshot(collection.id)['products']
+        _, cursor = page_products(products, page_size=4)
+
+        content = client.get(reverse('order:products', args=[collection.id]), {'cursor': cursor}).content.decode()
+        assert content.count('data-product-id=') == 1
+        assert 'hx-trigger="revealed' not in content
+
+    def test_pages_have_distinct_etags(self, client, collection, multiple_products):
+        """Test a page's validator never answers for another page"""
+        url = reverse('order:products', args=[collection.id])
+        products = get_collection_snapshot(collection.id)['products']
+        _, cursor = page_products(products)
+
+        first = client.get(url, HTTP_HX_REQUEST='true')
+        second = client.get(url, {'cursor': cursor}, HTTP_HX_REQUEST='true', HTTP_IF_NONE_MATCH=first['ETag'])
+        assert second.status_code == 200
+
+    def test_malformed_cursor_serves_first_page(self, client, collection, multiple_products):
+        """Test garbage cursors fall back to the full first page"""
+        content = client.get(reverse('order:products', args=[collection.id]), {'cursor': '!!'}).content.decode()
+        assert 'data-availability-url' in content
+
+
+@pytest.mark.django_db
+class TestProductSearch:
+    """Tests for faceted search within a collection"""
+
+    @pytest.fixture
+    def catalog(self, collection, product, product_category, product_color, product_color_blue):
+        hoodie = product.__class__.objects.create(
+            name='Team Hoodie', collection=collection, image=product.image.name,
+            available_sizes=[Size.ADULT_L],
+        )
+        hoodie.category.add(product_category)
+        hoodie.colors.add(product_color_blue)
+        product.colors.add(product_color_blue)
+        return product, hoodie
+
+    def test_text_match(self, collection, catalog):
+        """Test every search term must appear in the product name"""
+        product, hoodie = catalog
+        assert search_collection(collection.id, 'team hood')['products'] == [hoodie]
+        assert search_collection(collection.id, 'SHIRT')['products'] == [product]
+        assert search_collection(collection.id, 'shirt hoodie')['products'] == []
+
+    def test_facet_counts(self, collection, catalog, product_color, product_color_blue):
+        """Test each facet counts with the other facet's selection applied"""
+        product, hoodie = catalog
+        results = search_collection(collection.id, color_ids=[str(product_color.id)])
+        colors = {facet['name']: facet for facet in results['facets']['colors']}
+        categories = results['facets']['categories']
+
+        assert results['products'] == [product]
+        assert colors[product_color.name]['count'] == 1
+        assert colors[product_color.name]['selected']
+        assert colors[product_color_blue.name]['count'] == 2
+        assert categories[0]['count'] == 1
+
+    def test_unknown_collection(self, db):
+        """Test searching a missing collection returns None"""
+        assert search_collection(99999, 'shirt') is None
+
+    def test_warm_search_needs_no_queries(self, collection, catalog):
+        """Test the cached snapshot answers repeat searches without the database"""
+        search_collection(collection.id, 'team')
+
+        with CaptureQueriesContext(connection) as queries:
+            search_collection(collection.id, 'shirt')
+        assert len(queries) == 0
+
+    def test_endpoint_renders_products_partial(self, client, collection, catalog):
+        """Test the endpoint renders results and facets through _products.html"""
+        product, hoodie = catalog
+        response = client.get(reverse('order:product_search', args=[collection.id]), {'q': 'hoodie'})
+        content = response.content.decode()
+
+        assert response.status_code == 200
+        assert 'id="product-results"' in content
+        assert 'id="product-facets"' in content
+        assert hoodie.name in content
+        assert f'name="product" value="{product.id}"' not in content
+
+    def test_endpoint_no_matches(self, client, collection, catalog):
+        """Test an empty result explains the search found nothing"""
+        response = client.get(reverse('order:product_search', args=[collection.id]), {'q': 'zzz'})
+        assert 'No Matching Products' in response.content.decode()
+
+    def test_endpoint_missing_collection(self, client, db):
+        """Test unknown collections 404"""
+        response = client.get(reverse('order:product_search', args=[99999]))
+        assert response.status_code == 404
+
+    def test_grid_has_search_form(self, client, collection, catalog):
+        """Test the collection grid offers search and facet filters"""
+        content = client.get(reverse('order:products', args=[collection.id])).content.decode()
+        assert 'id="product-search"' in content
+        assert 'name="color"' in content
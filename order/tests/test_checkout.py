@@ -0,0 +1,328 @@
+"""
+Tests for the checkout pipeline and the Stripe price cache
+"""
+import json
+from io import StringIO
+
+import pytest
+import stripe
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+
+from order.cart import SessionCart
+from order.checkout import CheckoutError, checkout_line_items, complete_order, create_pending_order, price_key
+from order.fake_stripe import sign_payload
+from order.inbox import process_inbox
+from order.models import Order, Size, StripeEvent, StripePrice
+
+
+def cache_price(product, category, color, size, unit_amount, stripe_price_id='price_cached'):
+    return StripePrice.objects.create(
+        price_key=price_key(product.id, category.id, color.id, size, unit_amount),
+        product=product,
+        category_id=category.id,
+        color_id=color.id,
+        size=size,
+        unit_amount=unit_amount,
+        stripe_product_id='prod_cached',
+        stripe_price_id=stripe_price_id,
+    )
+
+
+def checkout(client):
+    with patch('stripe.checkout.Session.create') as mock_stripe:
+        mock_stripe.return_value = Mock(url='https://checkout.stripe.com/test')
+        response = client.post(reverse('order:confirm_order'), {
+            'customer_name': 'Coach',
+            'customer_email': 'coach@test.com',
+        })
+    return response, mock_stripe
+
+
+@pytest.mark.django_db
+class TestCheckoutLineItems:
+    """Tests for turning a priced cart into Stripe line items"""
+
+    def add(self, client, product, category, color, **fields):
+        session = client.session
+        SessionCart(session).add(
+            product.id, product.name, fields.pop('size', Size.ADULT_L), fields.pop('quantity', 1),
+            color_id=color.id, color_name=color.name, category_id=category.id, category_name=category.name,
+            price='25.00', **fields,
+        )
+        session.save()
+
+    def test_cached_price_is_referenced(self, client, product, product_variant, product_category, product_color):
+        """Test a synced variant and size is sent as a Stripe price id"""
+        cache_price(product, product_category, product_color, Size.ADULT_L, 2500)
+        self.add(client, product, product_category, product_color, quantity=3)
+
+        response, mock_stripe = checkout(client)
+
+        assert response.url == 'https://checkout.stripe.com/test'
+        assert mock_stripe.call_args.kwargs['line_items'] == [{'price': 'price_cached', 'quantity': 3}]
+
+    def test_personalised_and_unsynced_lines_inline(self, client, product, product_variant,
+                                                    product_category, product_color):
+        """Test back-named lines and sizes without a cached price send inline price data"""
+        cache_price(product, product_category, product_color, Size.ADULT_L, 2500)
+        self.add(client, product, product_category, product_color, back_name='SMITH')
+        self.add(client, product, product_category, product_color, size=Size.ADULT_M)
+
+        _, mock_stripe = checkout(client)
+
+        named, unsynced = mock_stripe.call_args.kwargs['line_items']
+        assert named['price_data']['unit_amount'] == 2700
+        assert named['price_data']['product_data']['metadata']['back_name'] == 'SMITH'
+        assert unsynced['price_data']['product_data']['metadata']['size'] == Size.ADULT_M
+
+    def test_identical_lines_collapse(self, product, product_category, product_color):
+        """Test lines resolving to the same price become one line item"""
+        cache_price(product, product_category, product_color, Size.ADULT_L, 2500)
+        line = {
+            'product': product, 'product_id': product.id, 'product_name': product.name, 'size': Size.ADULT_L,
+            'category_id': product_category.id, 'color_id': product_color.id, 'back_name': '',
+            'unit_cents': 2500,
+        }
+
+        line_items = checkout_line_items(RequestFactory().get('/'), [
+            {**line, 'quantity': 2}, {**line, 'quantity': 5},
+        ])
+
+        assert line_items == [{'price': 'price_cached', 'quantity': 7}]
+
+    def test_line_item_limit(self, product):
+        """Test carts with more line items than Stripe accepts are rejected"""
+        lines = [
+            {'product': product, 'product_id': product.id, 'product_name': product.name, 'size': Size.ADULT_L,
+             'back_name': f'N{i}', 'unit_cents': 2700, 'quantity': 1}
+            for i in range(101)
+        ]
+
+        with pytest.raises(CheckoutError):
+            checkout_line_items(RequestFactory().get('/'), lines)
+
+    def test_oversized_cart_not_sent(self, client, product, product_variant, product_category, product_color):
+        """Test checkout reports the limit instead of calling Stripe"""
+        for i in range(101):
+            self.add(client, product, product_category, product_color, back_name=f'N{i}')
+
+        response, mock_stripe = checkout(client)
+
+        assert response.url == reverse('order:index')
+        assert not mock_stripe.called
+        assert len(SessionCart(client.session).items()) == 101
+
+
+def post_event(client, event_type, session):
+    payload = json.dumps({'id': 'evt_1', 'object': 'event', 'type': event_type, 'data': {'object': session}})
+    return client.post(
+        reverse('stripe-webhook'), payload, content_type='application/json',
+        HTTP_STRIPE_SIGNATURE=sign_payload(payload, 'whsec_test'),
+    )
+
+
+@pytest.mark.django_db
+class TestPendingOrder:
+    """Tests for orders saved at checkout and completed from the webhook"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.STRIPE_WEBHOOK_SECRET = 'whsec_test'
+        settings.CONTACT_EMAIL = 'orders@test.com'
+        cache.clear()
+
+    @pytest.fixture
+    def pending_order(self, client, product, product_variant, product_category, product_color):
+        session = client.session
+        SessionCart(session).add(
+            product.id, product.name, Size.ADULT_L, 2, color_id=product_color.id, color_name=product_color.name,
+            category_id=product_category.id, category_name=product_category.name, price='25.00', back_name='SMITH',
+        )
+        session.save()
+        response, mock_stripe = checkout(client)
+        return Order.objects.get(), mock_stripe
+
+    def test_checkout_saves_pending_order(self, client, pending_order, admin_client):
+        """Test checkout stores the cart on an unpaid order and sends Stripe only its id"""
+        order, mock_stripe = pending_order
+        kwargs = mock_stripe.call_args.kwargs
+
+        assert not order.has_paid
+        assert order.pending_items[0]['back_name'] == 'SMITH'
+        assert order.pending_items[0]['unit_cents'] == 2700
+        assert kwargs['metadata']['order_id'] == order.order_id
+        assert kwargs['success_url'].endswith(f'&order={order.order_id}')
+        assert 'pending_order_data' not in client.session
+        assert order not in admin_client.get(reverse('order:order_list')).context['orders']
+
+    def test_webhook_completes_without_stripe(self, client, pending_order, product, mailoutbox,
+                                              django_capture_on_commit_callbacks):
+        """Test the completed event marks the order paid and creates its items without calling Stripe"""
+        order, _ = pending_order
+        session = {'id': 'cs_test_1', 'metadata': {'order_id': order.order_id}}
+
+        with patch('stripe.checkout.Session.list_line_items') as list_line_items, \
+                django_capture_on_commit_callbacks(execute=True):
+            response = post_event(client, 'checkout.session.completed', session)
+            redelivered = post_event(client, 'checkout.session.completed', session)
+            process_inbox()
+
+        assert (response.status_code, redelivered.status_code) == (200, 200)
+        assert not list_line_items.called
+        order.refresh_from_db()
+        assert order.has_paid and order.pending_items is None
+        assert order.stripe_session_id == 'cs_test_1'
+        item = order.items.get()
+        assert (item.product_id, item.quantity, item.back_name, item.product_cost) == (
+            product.id, 2, 'SMITH', Decimal('27.00'),
+        )
+        assert len(mailoutbox) == 1
+        assert 'Total: $54.00' in mailoutbox[0].body
+
+    def test_expired_session_discards_order(self, client, pending_order):
+        """Test an expired checkout deletes its never-paid order"""
+        order, _ = pending_order
+
+        post_event(client, 'checkout.session.expired', {'id': 'cs_test_1', 'metadata': {'order_id': order.order_id}})
+        process_inbox()
+
+        assert not Order.objects.exists()
+
+    def test_failed_checkout_discards_order(self, client, product, product_variant):
+        """Test an order is not left behind when the Stripe session cannot be created"""
+        session = client.session
+        SessionCart(session).add(product.id, product.name, Size.ADULT_L, 1, price='25.00')
+        session.save()
+
+        with patch('stripe.checkout.Session.create', side_effect=stripe.APIConnectionError("down")):
+            client.post(reverse('order:confirm_order'), {'customer_name': 'Coach'})
+
+        assert not Order.objects.exists()
+
+
+@pytest.mark.django_db
+class TestOrderMaterialization:
+    """Tests for writing a paid order's items in bulk"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.STRIPE_WEBHOOK_SECRET = 'whsec_test'
+
+    def team_order(self, products, lines_per_product=10):
+        return create_pending_order('Coach', 'coach@test.com', [
+            {'product_id': p.id, 'product_name': p.name, 'size': Size.ADULT_L, 'quantity': 1,
+             'unit_cents': 2500 + i, 'back_name': f'PLAYER {i}'}
+            for p in products for i in range(lines_per_product)
+        ])
+
+    def test_constant_queries(self, product, multiple_products, django_assert_num_queries):
+        """Test completing a large team order costs the same handful of queries as a small one"""
+        order = self.team_order([product, *multiple_products])
+
+        # select, savepoint, claim, products + collections, bulk insert, release
+        with django_assert_num_queries(6):
+            _, items, total_cents = complete_order(order.order_id, 'cs_test_1')
+
+        assert len(items) == 60
+        assert order.items.count() == 60
+        assert total_cents == sum(2500 + i for i in range(10)) * 6
+        item = order.items.filter(product=product).first()
+        assert (item.product_name, item.collection_name) == (product.name, product.collection.name)
+
+    def test_failure_leaves_order_pending(self, client, product):
+        """Test a failed insert rolls the claim back and the event is retried later"""
+        order = self.team_order([product], lines_per_product=3)
+        session = {'id': 'cs_test_1', 'metadata': {'order_id': order.order_id}}
+        post_event(client, 'checkout.session.completed', session)
+
+        with patch('order.models.OrderItem.objects.bulk_create', side_effect=RuntimeError('db down')):
+            assert process_inbox() == 1
+
+        order.refresh_from_db()
+        assert not order.has_paid and len(order.pending_items) == 3
+        assert not order.items.exists()
+        event = StripeEvent.objects.get()
+        assert (event.attempts, event.processed_at, event.last_error) == (1, None, 'RuntimeError: db down')
+        assert event.next_attempt_at > timezone.now()
+        assert process_inbox() == 0
+
+        call_command('replay_stripe_events', event.event_id, '--process', stdout=StringIO())
+
+        assert order.items.count() == 3
+
+    def test_legacy_session_rebuilt_in_bulk(self, client, product, multiple_products):
+        """Test sessions without an order_id are rebuilt from Stripe line items in one insert"""
+        def line_item(p):
+            stripe_product = stripe.Product.construct_from(
+                {'id': f'prod_{p.id}', 'name': p.name, 'metadata': {'product_id': str(p.id), 'size': Size.ADULT_L}},
+                'sk_test',
+            )
+            return Mock(quantity=2, amount_total=5000, price=Mock(product=stripe_product))
+
+        products = [product, *multiple_products]
+        session = {'id': 'cs_legacy', 'metadata': {'customer_name': 'Coach'}}
+        with patch('stripe.checkout.Session.list_line_items') as list_line_items:
+            list_line_items.return_value = Mock(data=[line_item(p) for p in products])
+            response = post_event(client, 'checkout.session.completed', session)
+            process_inbox()
+
+        assert response.status_code == 200
+        order = Order.objects.get(stripe_session_id='cs_legacy')
+        assert order.has_paid
+        assert sorted(order.items.values_list('product_id', flat=True)) == sorted(p.id for p in products)
+        assert {item.product_cost for item in order.items.all()} == {Decimal('25.00')}
+
+
+@pytest.mark.django_db
+class TestSyncStripePrices:
+    """Tests for the sync_stripe_prices management command"""
+
+    @pytest.fixture
+    def mock_stripe(self):
+        with patch('stripe.Product.create') as product_create, \
+                patch('stripe.Price.create') as price_create, \
+                patch('stripe.Price.modify') as price_modify:
+            product_create.side_effect = lambda **kwargs: Mock(id=f"prod_{kwargs['metadata']['size']}")
+            price_create.side_effect = lambda **kwargs: Mock(id=f"price_{kwargs['unit_amount']}_{kwargs['product']}")
+            yield Mock(product_create=product_create, price_create=price_create, price_modify=price_modify)
+
+    def test_creates_price_per_size(self, product_variant, mock_stripe):
+        """Test each variant size gets one Stripe product and price, once"""
+        call_command('sync_stripe_prices')
+        call_command('sync_stripe_prices')
+
+        assert mock_stripe.product_create.call_count == 3
+        assert sorted(StripePrice.objects.values_list('size', 'unit_amount')) == [
+            (Size.ADULT_L, 2500), (Size.ADULT_M, 2500), (Size.ADULT_XL, 2500),
+        ]
+        metadata = mock_stripe.product_create.call_args.kwargs['metadata']
+        assert (metadata['product_id'], metadata['category'], metadata['color']) == (
+            str(product_variant.product_id), 'T-Shirt', 'Red',
+        )
+
+    def test_price_change_reuses_product(self, product_variant, mock_stripe):
+        """Test a new amount creates new prices on the same products and retires the old ones"""
+        call_command('sync_stripe_prices')
+        product_variant.price = Decimal('30.00')
+        product_variant.save()
+
+        call_command('sync_stripe_prices')
+
+        assert mock_stripe.product_create.call_count == 3
+        assert mock_stripe.price_modify.call_count == 3
+        assert set(StripePrice.objects.values_list('unit_amount', flat=True)) == {3000}
+        assert StripePrice.objects.get(size=Size.ADULT_L).stripe_price_id == f'price_3000_prod_{Size.ADULT_L}'
+
+    def test_dry_run(self, product_variant, mock_stripe):
+        """Test a dry run calls Stripe for nothing"""
+        call_command('sync_stripe_prices', '--dry-run')
+
+        assert not mock_stripe.product_create.called
+        assert not StripePrice.objects.exists()
@@ -0,0 +1,127 @@
+"""
+Tests for the local Stripe stand-in and the checkout load test
+"""
+import pytest
+import stripe
+from django.core.cache import cache
+
+from order.fake_stripe import FakeStripeServer, parse_form, sign_payload
+from order.inbox import process_inbox
+from order.loadtest import LoadTest, percentile
+from order.models import Order
+from order.stripe_client import stripe_call
+
+
+@pytest.fixture
+def fake_stripe(settings):
+    """The Stripe stand-in with the client pointed at it"""
+    server = FakeStripeServer(webhook_secret="whsec_test").start()
+    settings.STRIPE_SECRET_KEY = "sk_test_fake"
+    settings.STRIPE_WEBHOOK_SECRET = "whsec_test"
+    settings.STRIPE_API_BASE = server.url
+    settings.STRIPE_MAX_NETWORK_RETRIES = 0
+    cache.clear()
+    yield server
+    server.stop()
+    cache.clear()
+
+
+def create_session(**kwargs):
+    return stripe_call("checkout.session.create", stripe.checkout.Session.create, mode="payment", **kwargs)
+
+
+INLINE_ITEM = {
+    "price_data": {
+        "currency": "usd",
+        "unit_amount": 2700,
+        "product_data": {"name": "Team Tee", "metadata": {"size": "AL", "back_name": "SMITH"}},
+    },
+    "quantity": 2,
+}
+
+
+class TestFakeStripe:
+    """Tests for the Stripe stand-in driven through the real SDK"""
+
+    def test_parse_form(self):
+        """Test Stripe's bracketed form keys decode into nested dicts and lists"""
+        body = "line_items[0][price]=price_1&line_items[0][quantity]=2&metadata[a]=1&expand[0]=data.price.product"
+
+        assert parse_form(body) == {
+            "line_items": [{"price": "price_1", "quantity": "2"}],
+            "metadata": {"a": "1"},
+            "expand": ["data.price.product"],
+        }
+
+    def test_signature_verifies(self):
+        """Test signed payloads pass the SDK's webhook verification"""
+        payload = '{"id": "evt_1", "object": "event", "type": "checkout.session.completed"}'
+
+        event = stripe.Webhook.construct_event(payload, sign_payload(payload, "whsec_test"), "whsec_test")
+
+        assert event["id"] == "evt_1"
+
+    def test_session_and_line_items(self, fake_stripe):
+        """Test a session created with inline price data lists its line items with expanded products"""
+        product = stripe_call("product.create", stripe.Product.create, name="Team Tee", metadata={"size": "AM"})
+        price = stripe_call("price.create", stripe.Price.create, product=product.id, currency="usd", unit_amount=2500)
+
+        session = create_session(line_items=[INLINE_ITEM, {"price": price.id, "quantity": 1}],
+                                 metadata={"customer_name": "Coach"})
+        line_items = stripe_call(
+            "checkout.session.list_line_items", stripe.checkout.Session.list_line_items,
+            session.id, limit=100, expand=["data.price.product"],
+        )
+
+        assert session.url == f"{fake_stripe.url}/pay/{session.id}"
+        assert session.metadata["customer_name"] == "Coach"
+        named, cached = line_items.data
+        assert isinstance(named.price.product, stripe.Product)
+        assert (named.amount_total, named.price.product.metadata["back_name"]) == (5400, "SMITH")
+        assert (cached.price.id, cached.price.product.metadata["size"]) == (price.id, "AM")
+
+    def test_unknown_price_rejected(self, fake_stripe):
+        """Test referencing a price that was never created is an invalid request"""
+        with pytest.raises(stripe.InvalidRequestError):
+            create_session(line_items=[{"price": "price_missing", "quantity": 1}])
+
+    def test_error_injection(self, fake_stripe):
+        """Test injected failures surface as Stripe API errors"""
+        fake_stripe.error_rate = 1.0
+
+        with pytest.raises(stripe.APIError):
+            create_session(line_items=[INLINE_ITEM])
+
+
+class TestLoadTest:
+    """Tests for the load test driver"""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        samples = list(range(1, 101))
+
+        assert [percentile(samples, pct) for pct in (50, 95, 99)] == [50, 95, 99]
+        assert percentile([7], 99) == 7
+        assert percentile([], 50) is None
+
+    @pytest.mark.integration
+    @pytest.mark.django_db(transaction=True)
+    def test_launch_day_run(self, live_server, fake_stripe, collection, product_variant, settings):
+        """Test a small run browses, adds and checks out end to end without errors"""
+        settings.CSRF_COOKIE_SECURE = settings.SESSION_COOKIE_SECURE = False
+        profile = {"browse": 1.0, "add": 1.0, "checkout": 0.5}
+
+        # One shopper at a time: the in-memory SQLite test database locks tables under concurrent writes
+        load_test = LoadTest(live_server.url, collection.id, users=6, concurrency=1, profile=profile)
+
+        report = load_test.run()
+        process_inbox()
+
+        checkouts = sum("checkout" in load_test.stages(number) for number in range(6))
+        assert checkouts
+        assert {endpoint: row["errors"] for endpoint, row in report.items() if row["errors"]} == {}
+        assert report["storefront"]["count"] == 6
+        assert report["webhook"]["count"] == report["payment success"]["count"] == checkouts
+        assert report["webhook"]["p99"] >= report["webhook"]["p50"]
+        assert Order.objects.filter(has_paid=True).count() == checkouts
+        assert not Order.objects.filter(pending_items__isnull=False).exists()
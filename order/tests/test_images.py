@@ -0,0 +1,113 @@
+"""
+Tests for the product image derivative pipeline
+"""
+import pytest
+from io import BytesIO, StringIO
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from PIL import Image
+
+from order.images import checkout_image_url, derivative_widths, needs_derivatives
+from order.models import Product
+
+
+def make_image(name='shirt.jpg', size=(344, 250)):
+    img_io = BytesIO()
+    Image.new('RGB', size, color='blue').save(img_io, format='JPEG')
+    return SimpleUploadedFile(name, img_io.getvalue(), content_type='image/jpeg')
+
+
+@pytest.fixture(autouse=True)
+def build_inline(settings):
+    """Build derivatives on commit without the background thread"""
+    settings.IMAGE_DERIVATIVES_ASYNC = False
+    cache.clear()
+    yield
+    cache.clear()
+
+
+class TestDerivativeWidths:
+    """Tests for choosing derivative widths"""
+
+    def test_never_upscales(self):
+        """Test widths stop at the source image width"""
+        assert derivative_widths(344) == [172, 344]
+        assert derivative_widths(100) == [100]
+
+    def test_caps_large_sources(self):
+        """Test large uploads are capped at the largest card width"""
+        assert derivative_widths(4000) == [172, 344, 688]
+
+
+@pytest.mark.django_db
+class TestImagePipeline:
+    """Tests for generating and serving derivatives"""
+
+    def test_built_after_commit(self, collection, django_capture_on_commit_callbacks):
+        """Test saving a product builds WebP and JPEG derivatives once committed"""
+        with django_capture_on_commit_callbacks(execute=True):
+            product = Product.objects.create(name='Hoodie', collection=collection, image=make_image())
+
+        product.refresh_from_db()
+        formats = product.image_derivatives['formats']
+        assert product.image_width == 344
+        assert product.image_height == 250
+        assert [width for width, _ in formats['webp']] == [172, 344]
+        assert [width for width, _ in formats['jpeg']] == [172, 344]
+        assert not needs_derivatives(product)
+
+    def test_not_built_inside_request_transaction(self, collection, django_capture_on_commit_callbacks):
+        """Test nothing is generated until the transaction commits"""
+        with django_capture_on_commit_callbacks() as callbacks:
+            product = Product.objects.create(name='Hoodie', collection=collection, image=make_image())
+            product.refresh_from_db()
+            assert product.image_derivatives == {}
+        assert len(callbacks) == 1
+
+    def test_new_image_rebuilds(self, collection, django_capture_on_commit_callbacks):
+        """Test replacing the image regenerates its derivatives"""
+        with django_capture_on_commit_callbacks(execute=True):
+            product = Product.objects.create(name='Hoodie', collection=collection, image=make_image())
+        product.refresh_from_db()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            product.image = make_image('other.jpg')
+            product.save()
+
+        product.refresh_from_db()
+        assert product.image_derivatives['source'] == product.image.name
+
+    def test_grid_renders_picture(self, client, collection, django_capture_on_commit_callbacks):
+        """Test the product card serves a srcset with dimensions and lazy loading"""
+        with django_capture_on_commit_callbacks(execute=True):
+            Product.objects.create(name='Hoodie', collection=collection, image=make_image())
+
+        content = client.get(reverse('order:products', args=[collection.id])).content.decode()
+
+        assert '<picture>' in content
+        assert 'type="image/webp"' in content
+        assert '344w' in content
+        assert 'width="344" height="250"' in content
+        assert 'loading="lazy"' in content
+
+    def test_checkout_image(self, collection, product, django_capture_on_commit_callbacks):
+        """Test Stripe gets the JPEG derivative, or the original before it exists"""
+        assert checkout_image_url(product) == product.image.url
+
+        with django_capture_on_commit_callbacks(execute=True):
+            product.image = make_image('other.jpg')
+            product.save()
+
+        product.refresh_from_db()
+        assert checkout_image_url(product).endswith('-344w.jpg')
+
+    def test_backfill_command(self, product):
+        """Test the management command builds missing derivatives"""
+        out = StringIO()
+        call_command('build_image_derivatives', stdout=out)
+
+        product.refresh_from_db()
+        assert 'Built derivatives for 1 product(s)' in out.getvalue()
+        assert product.image_derivatives['formats']['jpeg']
@@ -0,0 +1,118 @@
+"""
+Tests for the Stripe webhook inbox and its worker
+"""
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from order.fake_stripe import sign_payload
+from order.inbox import MAX_ATTEMPTS, process_inbox, retry_delay
+from order.models import StripeEvent
+
+
+def post_event(client, event_id='evt_1', event_type='checkout.session.completed', secret='whsec_test'):
+    payload = json.dumps({
+        'id': event_id, 'object': 'event', 'type': event_type,
+        'data': {'object': {'id': 'cs_test_1', 'metadata': {'order_id': 'unknown'}}},
+    })
+    return client.post(
+        reverse('stripe-webhook'), payload, content_type='application/json',
+        HTTP_STRIPE_SIGNATURE=sign_payload(payload, secret),
+    )
+
+
+@pytest.fixture(autouse=True)
+def webhook_secret(settings):
+    settings.STRIPE_WEBHOOK_SECRET = 'whsec_test'
+
+
+def park(event):
+    StripeEvent.objects.filter(pk=event.pk).update(attempts=MAX_ATTEMPTS, next_attempt_at=None, last_error='boom')
+
+
+@pytest.mark.django_db
+class TestWebhookInbox:
+    """Tests for recording webhook events"""
+
+    def test_records_event_once(self, client, django_assert_num_queries):
+        """Test the webhook stores a verified event in one query and ignores redeliveries"""
+        with django_assert_num_queries(1):
+            response = post_event(client)
+        post_event(client)
+
+        assert response.status_code == 200
+        event = StripeEvent.objects.get()
+        assert (event.event_id, event.event_type) == ('evt_1', 'checkout.session.completed')
+        assert event.payload['data']['object']['id'] == 'cs_test_1'
+        assert event.processed_at is None
+
+    def test_bad_signature_rejected(self, client):
+        """Test events that fail verification are not stored"""
+        response = post_event(client, secret='whsec_wrong')
+
+        assert response.status_code == 400
+        assert not StripeEvent.objects.exists()
+
+
+@pytest.mark.django_db
+class TestProcessInbox:
+    """Tests for the inbox worker"""
+
+    def test_marks_processed(self, client):
+        """Test handled events are marked processed and not picked up again"""
+        post_event(client, 'evt_1')
+        post_event(client, 'evt_2', event_type='customer.created')
+
+        assert process_inbox() == 2
+        assert process_inbox() == 0
+        assert not StripeEvent.objects.filter(processed_at__isnull=True).exists()
+
+    def test_backoff_then_park(self, client):
+        """Test failures are retried with growing delays and parked after the last attempt"""
+        post_event(client)
+        event = StripeEvent.objects.get()
+
+        with patch('order.inbox.handle_event', side_effect=RuntimeError('boom')):
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                StripeEvent.objects.filter(pk=event.pk).update(next_attempt_at=timezone.now())
+                started = timezone.now()
+                process_inbox()
+                event.refresh_from_db()
+                if attempt < MAX_ATTEMPTS:
+                    assert event.next_attempt_at >= started + timedelta(seconds=retry_delay(attempt))
+
+        assert event.attempts == MAX_ATTEMPTS
+        assert event.next_attempt_at is None
+        assert event.last_error == 'RuntimeError: boom'
+        assert retry_delay(1) < retry_delay(2) <= retry_delay(MAX_ATTEMPTS)
+
+    def test_replay_failed(self, client):
+        """Test replay_stripe_events --failed requeues parked events only"""
+        post_event(client, 'evt_1')
+        post_event(client, 'evt_2')
+        park(StripeEvent.objects.get(event_id='evt_1'))
+        out = StringIO()
+
+        call_command('replay_stripe_events', '--failed', stdout=out)
+
+        assert '1 event(s) queued' in out.getvalue()
+        event = StripeEvent.objects.get(event_id='evt_1')
+        assert (event.attempts, event.last_error) == (0, '')
+        assert event.next_attempt_at <= timezone.now()
+
+    def test_worker_once(self, client):
+        """Test the worker drains what is due and exits with --once"""
+        for i in range(3):
+            post_event(client, f'evt_{i}')
+        out = StringIO()
+
+        call_command('process_stripe_events', '--once', '--batch-size', '2', stdout=out)
+
+        assert '3 event(s) handled' in out.getvalue()
+        assert not StripeEvent.objects.filter(processed_at__isnull=True).exists()
@@ -0,0 +1,226 @@
+"""
+Tests for the shared pricing rules
+"""
+import time
+
+import pytest
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from order.cart import SessionCart
+from order.models import Size, ProductVariant
+from order.pricing import (
+    PRICING_VERSION, PriceTable, price_cart, product_price_matrix, to_cents, from_cents, upcharge_cents
+)
+
+
+class TestUpcharges:
+    """Tests for the upcharge table"""
+
+    def test_to_and_from_cents(self):
+        """Test converting between dollars and cents"""
+        assert to_cents(Decimal('25.00')) == 2500
+        assert to_cents('19.99') == 1999
+        assert from_cents(2999) == Decimal('29.99')
+
+    def test_size_upcharges(self):
+        """Test 2X/3X add $2 and 4X adds $3"""
+        assert upcharge_cents(Size.ADULT_L, '') == 0
+        assert upcharge_cents(Size.ADULT_2X, '') == 200
+        assert upcharge_cents(Size.ADULT_3X, '') == 200
+        assert upcharge_cents(Size.ADULT_4X, '') == 300
+
+    def test_back_name_upcharge(self):
+        """Test back name adds $2 on top of the size upcharge"""
+        assert upcharge_cents(Size.ADULT_L, 'SMITH') == 200
+        assert upcharge_cents(Size.ADULT_4X, 'SMITH') == 500
+
+
+@pytest.mark.django_db
+class TestProductPriceMatrix:
+    """Tests for the per-product price matrix embedded in product cards"""
+
+    def test_matrix_contents(self, product, product_variant, product_category, product_color):
+        """Test matrix exposes variant, category fallback and upcharge tables"""
+        matrix = product_price_matrix(product)
+
+        assert matrix['v'] == PRICING_VERSION
+        assert matrix['p'] == {f'{product_category.id}:{product_color.id}': 2500}
+        assert matrix['c'] == {str(product_category.id): 2500}
+        assert matrix['u'][Size.ADULT_4X] == 300
+        assert matrix['b'] == 200
+
+    def test_category_fallback_uses_first_variant(self, product, product_variant,
+                                                  product_category, product_color_blue):
+        """Test category fallback matches get_variant_price's first() lookup"""
+        ProductVariant.objects.create(
+            product=product,
+            category=product_category,
+            color=product_color_blue,
+            price=Decimal('30.00'),
+        )
+
+        matrix = product_price_matrix(product)
+        assert len(matrix['p']) == 2
+        assert matrix['c'][str(product_category.id)] == 2500
+
+    def test_product_card_embeds_matrix(self, client, collection, product, product_variant):
+        """Test the product grid carries the matrix instead of per-keystroke requests"""
+        response = client.post(
+            reverse('order:index'),
+            {'collection': collection.id},
+            HTTP_HX_REQUEST='true',
+        )
+        content = response.content.decode()
+
+        assert response.status_code == 200
+        assert 'data-price-matrix=' in content
+        assert 'price-fallback' in content
+        assert 'input from:#back-name' not in content
+
+    def test_fallback_endpoint_matches_matrix(self, client, product, product_variant,
+                                              product_category, product_color):
+        """Test the server endpoint prices the same selection identically"""
+        response = client.get(
+            reverse('order:get_variant_price', args=[product.id]),
+            {
+                'category': product_category.id,
+                'color': product_color.id,
+                'size': Size.ADULT_4X,
+                'back_name': 'SMITH',
+            }
+        )
+        matrix = product_price_matrix(product)
+        cents = matrix['p'][f'{product_category.id}:{product_color.id}'] + matrix['u'][Size.ADULT_4X] + matrix['b']
+
+        assert response.content.decode().endswith(f'{from_cents(cents):.2f}')
+
+
+class TestPriceTable:
+    """Tests for variant resolution from a preloaded table"""
+
+    def setup_method(self):
+        # (product_id, category_id, color_id, price) ordered by variant pk
+        self.table = PriceTable([
+            (1, 10, 100, Decimal('25.00')),
+            (1, 10, 101, Decimal('27.00')),
+            (1, 11, None, Decimal('40.00')),
+        ])
+
+    def test_exact_match(self):
+        """Test category + color resolves the matching variant"""
+        assert self.table.base_cents(1, 10, 101) == 2700
+
+    def test_category_fallback(self):
+        """Test unknown color falls back to the first variant in the category"""
+        assert self.table.base_cents(1, 10, 999) == 2500
+        assert self.table.base_cents('1', '11', '') == 4000
+
+    def test_product_fallback(self):
+        """Test cart lines without a category use the product's first variant"""
+        assert self.table.base_cents(1) == 2500
+        assert self.table.base_cents(1, product_fallback=False) is None
+
+    def test_unknown_product(self):
+        """Test products without variants resolve to None"""
+        assert self.table.base_cents(2, 10, 100) is None
+
+
+@pytest.mark.django_db
+class TestPriceCart:
+    """Tests for pricing a whole cart in one call"""
+
+    def test_applies_upcharges_once(self, product, product_variant, product_category, product_color):
+        """Test a variant-priced line gets size and back name upcharges"""
+        lines, total = price_cart([{
+            'product_id': product.id,
+            'category_id': str(product_category.id),
+            'color_id': str(product_color.id),
+            'size': Size.ADULT_2X,
+            'back_name': 'SMITH',
+            'quantity': 2,
+            'price': '25.00',
+        }])
+
+        assert lines[0]['unit_cents'] == 2900
+        assert lines[0]['line_cents'] == 5800
+        assert total == 5800
+
+    def test_stored_price_fallback(self, product):
+        """Test lines whose variant is gone keep the price stored at add time"""
+        lines, total = price_cart([{
+            'product_id': product.id,
+            'size': Size.ADULT_4X,
+            'quantity': 1,
+            'price': '25.00',
+        }])
+        assert total == 2800
+
+    def test_single_query(self, product, product_variant, multiple_products):
+        """Test a multi-product cart loads all variants in one query"""
+        items = [
+            {'product_id': p.id, 'size': Size.ADULT_L, 'quantity': 1, 'price': '10.00'}
+            for p in [product, *multiple_products]
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            lines, total = price_cart(items)
+
+        assert len(queries) == 1
+        assert total == 2500 + 5 * 1000
+
+    def test_empty_cart(self):
+        """Test an empty cart costs nothing and runs no query"""
+        with CaptureQueriesContext(connection) as queries:
+            assert price_cart([]) == ([], 0)
+        assert len(queries) == 0
+
+    def test_add_item_stores_base_price(self, client, product, product_variant):
+        """Test add_item never stores upcharges, even without a category match"""
+        client.post(reverse('order:add_item'), {
+            'product': product.id,
+            'size': Size.ADULT_4X,
+            'quantity': 1,
+            'back_name': 'SMITH',
+        })
+
+        order_items = SessionCart(client.session).items()
+        assert Decimal(order_items[0]['price']) == product_variant.price
+
+
+@pytest.mark.slow
+class TestPriceCartBenchmark:
+    """Micro-benchmark for cart pricing from a preloaded table"""
+
+    def test_price_large_cart(self):
+        """Test pricing a 10,000 line cart from memory stays well under a second"""
+        sizes = [Size.ADULT_M, Size.ADULT_2X, Size.ADULT_4X]
+        table = PriceTable(
+            (product_id, category_id, color_id, Decimal('20.00') + product_id)
+            for product_id in range(50)
+            for category_id in range(4)
+            for color_id in range(5)
+        )
+        items = [
+            {
+                'product_id': i % 50,
+                'category_id': str(i % 4),
+                'color_id': str(i % 5),
+                'size': sizes[i % 3],
+                'back_name': 'SMITH' if i % 2 else '',
+                'quantity': 1 + i % 3,
+            }
+            for i in range(10_000)
+        ]
+
+        start = time.perf_counter()
+        lines, total = price_cart(items, table)
+        elapsed = time.perf_counter() - start
+
+        print(f"price_cart: {len(items)} lines in {elapsed * 1000:.1f}ms "
+              f"({elapsed / len(items) * 1e6:.2f}us/line)")
+        assert len(lines) == len(items)
+        assert total > 0
+        assert elapsed < 1.0
@@ -0,0 +1,75 @@
+"""
+Query budgets for the storefront views
+
+Each view is exercised with several products and cart lines so per-product
+or per-line queries blow the budget (see QUERY_BUDGETS in conftest).
+"""
+import pytest
+from unittest.mock import Mock, patch
+from django.core.cache import cache
+from django.urls import reverse
+
+from order.cart import SessionCart
+from order.models import Size
+
+
+@pytest.fixture(autouse=True)
+def clear_cache_for_tests():
+    """Start every test from a cold catalog cache"""
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def storefront_session(client, collection, product, product_variant, multiple_products):
+    """A shopper with a collection selected and one cart line per product"""
+    session = client.session
+    session['selected_collection_id'] = collection.id
+    cart = SessionCart(session)
+    for p in [product, *multiple_products]:
+        cart.add(p.id, p.name, Size.ADULT_L, 1, price='25.00')
+    session.save()
+    return session
+
+
+@pytest.mark.django_db
+class TestStorefrontQueryBudgets:
+    """Tests that storefront views stay within their query budgets"""
+
+    def test_index_cold(self, client, storefront_session, query_budget):
+        """Test the first index render builds the snapshot within budget"""
+        with query_budget('index'):
+            client.get(reverse('order:index'))
+
+    def test_index_warm(self, client, storefront_session, query_budget):
+        """Test repeat index renders stay within budget"""
+        client.get(reverse('order:index'))
+        with query_budget('index'):
+            client.get(reverse('order:index'))
+
+    def test_products_cold(self, client, storefront_session, collection, query_budget):
+        """Test a cold collection grid is built with a fixed number of queries"""
+        with query_budget('products'):
+            client.get(reverse('order:products', args=[collection.id]))
+
+    def test_shopping_cart(self, client, storefront_session, query_budget):
+        """Test the cart does not query per line"""
+        with query_budget('shopping_cart'):
+            client.get(reverse('order:shopping_cart'))
+
+    def test_view_summary(self, client, storefront_session, query_budget):
+        """Test the order summary does not query per line"""
+        with query_budget('view_summary'):
+            client.get(reverse('order:order_summary'))
+
+    @patch('stripe.checkout.Session.create')
+    def test_confirm_order(self, mock_stripe, client, storefront_session, query_budget):
+        """Test checkout prices and describes the cart without per-line queries"""
+        mock_stripe.return_value = Mock(url='https://checkout.stripe.com/test')
+        with query_budget('confirm_order'):
+            client.post(reverse('order:confirm_order'), {
+                'customer_name': 'Coach',
+                'customer_email': 'coach@test.com',
+            })
+        assert len(mock_stripe.call_args.kwargs['line_items']) == 6
@@ -0,0 +1,131 @@
+"""
+Tests for team roster uploads
+"""
+import pytest
+from io import BytesIO
+
+import polars as pl
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from order.cart import SessionCart
+from order.models import CartLine, Size
+from order.roster import RosterError, read_roster_frame
+
+
+def roster_csv(text, name='roster.csv'):
+    return SimpleUploadedFile(name, text.encode(), content_type='text/csv')
+
+
+def upload(client, roster):
+    return client.post(reverse('order:upload_roster'), {'roster': roster})
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+class TestReadRoster:
+    """Tests for parsing roster spreadsheets"""
+
+    def test_headers_and_blank_rows_normalized(self):
+        """Test header aliases map to canonical columns and blank rows are dropped"""
+        df = read_roster_frame(roster_csv(
+            'Player,Item,Size,Qty,Name on Back\n'
+            'Sam, Test Shirt ,al,2,SMITH\n'
+            ',,,,\n'
+            'Alex,Test Shirt,Adult Medium,,\n'
+        ))
+
+        assert df['row'].to_list() == [2, 4]
+        assert df['product'].to_list() == ['Test Shirt', 'Test Shirt']
+        assert df['back_name'].to_list() == ['SMITH', '']
+        assert df['color'].to_list() == ['', '']
+
+    @pytest.mark.parametrize('text', ['Player,Size\nSam,AL\n', 'Product,Size\n'])
+    def test_unusable_roster_rejected(self, text):
+        """Test rosters missing a required column or any rows are rejected"""
+        with pytest.raises(RosterError):
+            read_roster_frame(roster_csv(text))
+
+    def test_xlsx_roster(self):
+        """Test Excel rosters are read like CSV ones"""
+        pytest.importorskip('fastexcel')
+        buffer = BytesIO()
+        pl.DataFrame({'Product': ['Test Shirt'], 'Size': ['AL'], 'Quantity': [3]}).write_excel(buffer)
+
+        df = read_roster_frame(SimpleUploadedFile('roster.xlsx', buffer.getvalue()))
+
+        assert df.select('product', 'size', 'quantity').rows() == [('Test Shirt', 'AL', '3')]
+
+
+@pytest.mark.django_db
+class TestUploadRoster:
+    """Tests for building a cart from an uploaded roster"""
+
+    def test_roster_builds_cart(self, client, product, product_variant):
+        """Test every row is resolved, priced and merged into the cart"""
+        roster = '\n'.join(
+            ['Player,Product,Type,Color,Size,Back Name']
+            + [f'Player {i},Test Shirt,T-Shirt,Red,AL,' for i in range(20)]
+            + [f'Player {i},test shirt,,,Adult Medium,NAME{i}' for i in range(20)]
+        )
+
+        response = upload(client, roster_csv(roster))
+
+        assert response.status_code == 200
+        assert 'data-count="21"' in response.content.decode()
+        items = SessionCart(client.session).items()
+        assert (items[0]['size'], items[0]['quantity'], items[0]['price']) == (Size.ADULT_L, 20, '25.00')
+        assert {item['category_name'] for item in items} == {'T-Shirt'}
+        assert items[1]['back_name'] == 'NAME0'
+
+    def test_queries_independent_of_rows(self, product, product_variant):
+        """Test a 40-row roster costs no more queries than a 2-row one"""
+        def upload_rows(rows):
+            roster = 'Product,Size,Back Name\n' + ''.join(f'Test Shirt,AL,N{i}\n' for i in range(rows))
+            with CaptureQueriesContext(connection) as queries:
+                upload(Client(), roster_csv(roster))
+            return len(queries)
+
+        upload_rows(1)
+        assert upload_rows(40) == upload_rows(2)
+
+    def test_bad_rows_add_nothing(self, client, product, product_variant):
+        """Test a roster with invalid rows reports each one and adds nothing"""
+        response = upload(client, roster_csv(
+            'Product,Size,Quantity\n'
+            'Test Shirt,AL,1\n'
+            'Missing Shirt,AL,1\n'
+            'Test Shirt,YS,1\n'
+            'Test Shirt,AL,lots\n'
+        ))
+        content = response.content.decode()
+
+        assert 'Row 3:' in content and 'Unknown product &#x27;Missing Shirt&#x27;' in content
+        assert 'Row 4:' in content and "Size &#x27;YS&#x27; is not available" in content
+        assert 'Row 5:' in content
+        assert 'Row 2:' not in content
+        assert not CartLine.objects.exists()
+
+    def test_ambiguous_type_reported(self, client, product, product_variant, product_category_hoodie):
+        """Test a blank type is only defaulted when the product has one"""
+        product.category.add(product_category_hoodie)
+
+        content = upload(client, roster_csv('Product,Size\nTest Shirt,AL\n')).content.decode()
+
+        assert 'Choose a type (Hoodie, T-Shirt)' in content or 'Choose a type (T-Shirt, Hoodie)' in content
+        assert not CartLine.objects.exists()
+
+    def test_unreadable_upload_reported(self, client):
+        """Test a file that is not a roster gets a single error"""
+        content = upload(client, roster_csv('Name,Number\nSam,4\n')).content.decode()
+
+        assert 'The roster needs a product and a size column.' in content
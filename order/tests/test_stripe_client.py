@@ -0,0 +1,156 @@
+"""
+Tests for the shared Stripe client, run against a local Stripe stand-in
+"""
+import json
+import threading
+from io import StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import stripe
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from unittest.mock import patch
+
+from order.cart import SessionCart
+from order.models import Size
+from order.stripe_client import CircuitBreaker, StripeUnavailable, stripe_call, stripe_stats
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.requests.append((self.path, self.client_address[1]))
+        status = self.server.status
+        body = json.dumps(
+            {"id": "cs_test_1", "object": "checkout.session", "url": "https://checkout.test/cs_test_1"}
+            if status == 200 else
+            {"error": {"type": "api_error", "message": "Stand-in failure"}}
+        ).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in(settings):
+    """A local HTTP server answering checkout session creation like Stripe"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.requests = []
+    server.status = 200
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    settings.STRIPE_SECRET_KEY = "sk_test_stand_in"
+    settings.STRIPE_API_BASE = f"http://127.0.0.1:{server.server_port}"
+    settings.STRIPE_MAX_NETWORK_RETRIES = 0
+    settings.STRIPE_BREAKER_THRESHOLD = 3
+    cache.clear()
+    yield server
+    server.shutdown()
+    server.server_close()
+    cache.clear()
+
+
+def create_session():
+    return stripe_call("checkout.session.create", stripe.checkout.Session.create, mode="payment")
+
+
+class TestCircuitBreaker:
+    """Tests for the consecutive-failure circuit breaker"""
+
+    def test_opens_then_half_opens(self):
+        """Test the breaker opens at the threshold and lets one trial through after the reset"""
+        now = [0.0]
+        breaker = CircuitBreaker(threshold=2, reset_seconds=30, clock=lambda: now[0])
+
+        assert breaker.record_failure() is False
+        assert breaker.record_failure() is True
+        assert not breaker.allow()
+
+        now[0] = 31
+        assert breaker.allow()
+        assert not breaker.allow()
+
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+
+class TestStripeClient:
+    """Tests for calls through the pooled client"""
+
+    def test_calls_reuse_one_connection(self, stand_in):
+        """Test consecutive calls go to the stand-in over a single keep-alive connection"""
+        first = create_session()
+        create_session()
+
+        assert first.url == "https://checkout.test/cs_test_1"
+        assert [path for path, _ in stand_in.requests] == ["/v1/checkout/sessions"] * 2
+        assert len({port for _, port in stand_in.requests}) == 1
+
+    def test_breaker_fails_fast(self, stand_in):
+        """Test repeated 5xx responses open the breaker and later calls skip Stripe"""
+        stand_in.status = 500
+        for _ in range(3):
+            with pytest.raises(stripe.APIError):
+                create_session()
+
+        with pytest.raises(StripeUnavailable):
+            create_session()
+
+        assert len(stand_in.requests) == 3
+        stats = stripe_stats()
+        create = stats["operations"]["checkout.session.create"]
+        assert stats["breaker_opened"] == 1
+        assert (create["calls"], create["errors"], create["rejected"]) == (3, 3, 1)
+
+    def test_client_errors_keep_breaker_closed(self, stand_in):
+        """Test 4xx answers from a healthy API never open the breaker"""
+        stand_in.status = 400
+        for _ in range(4):
+            with pytest.raises(stripe.InvalidRequestError):
+                create_session()
+
+        stand_in.status = 200
+        assert create_session().id == "cs_test_1"
+
+    def test_latency_metrics(self, stand_in):
+        """Test calls are counted into latency buckets and reported by stripe_stats"""
+        create_session()
+        create_session()
+
+        stats = stripe_stats()["operations"]["checkout.session.create"]
+        assert (stats["calls"], stats["errors"], stats["rejected"]) == (2, 0, 0)
+        assert stats["p50"] is not None
+
+        out = StringIO()
+        call_command("stripe_stats", stdout=out)
+        assert "checkout.session.create: 2 call(s), 0 error(s), 0 failed fast" in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestCheckoutWhenStripeIsDown:
+    """Tests for checkout while Stripe fails fast"""
+
+    def test_cart_kept(self, client, product, product_variant, settings):
+        """Test an unavailable Stripe sends the shopper back with their cart intact"""
+        session = client.session
+        SessionCart(session).add(product.id, product.name, Size.ADULT_L, 1, price='25.00')
+        session.save()
+
+        with patch('stripe.checkout.Session.create', side_effect=StripeUnavailable("down")):
+            response = client.post(reverse('order:confirm_order'), {
+                'customer_name': 'Coach',
+                'customer_email': 'coach@test.com',
+            })
+
+        assert response.url == reverse('order:index')
+        assert len(SessionCart(client.session).items()) == 1
@@ -10,6 +10,7 @@ from django.test import Client
 from django.contrib.sessions.middleware import SessionMiddleware
 from django.contrib.auth.models import AnonymousUser
 
+from order.cart import SessionCart
 from order.models import (
     Product, Order, OrderItem, Collection, Size,
     ProductCategory, ProductColor, ProductVariant
@@ -113,8 +114,8 @@ class TestAddItemView:
             'back_name': 'SMITH'
         })
 
-        # Check item was added to session
-        order_items = client.session.get('current_order_items', [])
+        # Check item was added to the cart
+        order_items = SessionCart(client.session).items()
         assert len(order_items) == 1
         assert order_items[0]['product_id'] == product.id
         assert order_items[0]['size'] == Size.ADULT_L
@@ -131,7 +132,7 @@ class TestAddItemView:
             'color': product_variant.color.id
         })
 
-        order_items = client.session.get('current_order_items', [])
+        order_items = SessionCart(client.session).items()
         assert Decimal(order_items[0]['price']) == product_variant.price
 
     def test_add_item_size_upcharge(self, client, product, product_variant):
@@ -143,7 +144,7 @@ class TestAddItemView:
             'category': product_variant.category.id
         })
 
-        order_items = client.session.get('current_order_items', [])
+        order_items = SessionCart(client.session).items()
         # Base price should be stored, upcharges applied later
         assert Decimal(order_items[0]['price']) == product_variant.price
 
@@ -626,6 +627,50 @@ class TestConfirmOrderView:
             })
 
 
+@pytest.mark.django_db
+class TestPaymentSuccessView:
+    """Tests for payment_success view"""
+
+    @patch('stripe.checkout.Session.retrieve')
+    def test_payment_success_completes_pending_order(self, mock_retrieve, client, product, multiple_products):
+        """Test a paid session completes its pending order from the saved items, once"""
+        from order.checkout import create_pending_order
+
+        products = [product, *multiple_products]
+        order = create_pending_order('Coach', 'coach@test.com', [
+            {'product_id': p.id, 'product_name': p.name, 'size': Size.ADULT_L, 'quantity': 2, 'unit_cents': 2500}
+            for p in products
+        ])
+        mock_retrieve.return_value = Mock(metadata={'order_id': order.order_id}, payment_status='paid')
+        params = {'session_id': 'cs_test_paid', 'order': order.order_id}
+
+        response = client.get(reverse('order:payment-success'), params)
+        client.get(reverse('order:payment-success'), params)
+
+        order = response.context['order']
+        assert order.has_paid
+        assert order.stripe_session_id == 'cs_test_paid'
+        assert sorted(item.product_id for item in order.items.all()) == sorted(p.id for p in products)
+        assert response.context['total_cost'] == Decimal('25.00') * 2 * len(products)
+        assert mock_retrieve.call_count == 1
+
+    @patch('stripe.checkout.Session.retrieve')
+    def test_unpaid_session_leaves_order_pending(self, mock_retrieve, client, product):
+        """Test an unpaid or mismatched session does not complete the order"""
+        from order.checkout import create_pending_order
+
+        order = create_pending_order('Coach', 'coach@test.com', [
+            {'product_id': product.id, 'product_name': product.name, 'quantity': 1, 'unit_cents': 2500},
+        ])
+        mock_retrieve.return_value = Mock(metadata={'order_id': 'someone-else'}, payment_status='paid')
+
+        response = client.get(reverse('order:payment-success'), {'session_id': 'cs_x', 'order': order.order_id})
+
+        assert response.context['order'] is None
+        order.refresh_from_db()
+        assert not order.has_paid and order.pending_items
+
+
 @pytest.mark.django_db
 class TestAdminViews:
     """Tests for admin-only views"""
@@ -7,9 +7,11 @@ app_name = 'order'
 urlpatterns = [
     path('', views.index, name='index'),
     path('add-item', views.add_item, name='add_item'),
+    path('add-items', views.add_items, name='add_items'),
+    path('upload-roster', views.upload_roster, name='upload_roster'),
     path('confirm-order', views.confirm_order, name='confirm_order'),
     path('order-summary', views.view_summary, name='order_summary'),
-    path('delete-item/<int:product_id>/<str:size>', views.delete_item, name='delete-item'),
+    path('delete-item/<int:line_id>', views.delete_item, name='delete-item'),
     path('product-create', views.product_create, name='product_create'),
     path('product-list', views.product_list, name='product_list'),
     path('product-update/<int:pk>', views.product_update, name='product_update'),
@@ -33,6 +35,8 @@ urlpatterns = [
     path('product/<int:product_id>/sizes/', views.get_variant_sizes, name='get_variant_sizes'),
     path('product/<int:product_id>/price/', views.get_variant_price, name='get_variant_price'),
     path('collection/<int:collection_id>', views.products, name='products'),
+    path('collection/<int:collection_id>/availability', views.collection_availability, name='collection_availability'),
+    path('collection/<int:collection_id>/search', views.product_search, name='product_search'),
     path("payment-success/", views.payment_success, name="payment-success"),
     path("payment-cancel/", views.payment_cancel, name="payment-cancel"),
     path("about", views.about, name='about'),
@@ -11,17 +11,30 @@ from django.core.cache import cache
 from django.core.mail import send_mail
 from django.core.paginator import Paginator
 from django.db.models import Sum, Q
-from django.http import HttpResponse, BadHeaderError
+from django.http import HttpResponse, BadHeaderError, Http404, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from core.decorators import rate_limit
+from core.decorators import cache_policy, rate_limit
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.safestring import mark_safe
 
 from core import settings
 from core.http import HTMXResponse
 from core.utils import ExcelDownloadResponse
+from .cart import (
+    MAX_LINE_QUANTITY, cart_fragment_response, cart_oob_response, get_cart, get_selected_collection_id,
+    select_collection,
+)
+from .catalog import get_active_products, get_collection_availability, get_collection_snapshot, get_variant_index
+from .checkout import CheckoutError, checkout_line_items, complete_order, create_pending_order
 from .forms import ProductForm, CollectionForm, ColorForm, CategoryForm, ProductVariantForm, CollectionSelectForm, \
     CollectionFilterForm, ContactForm, ProductFilterForm
+from .fragments import products_fragment_response, products_page, render_products_fragment
 from .models import Product, Size, Order, OrderItem, Collection, ProductColor, ProductCategory, ProductVariant
+from .pricing import from_cents, parse_id, upcharge_cents
+from .roster import RosterError, read_roster_frame, resolve_roster
+from .search import search_products
+from .stripe_client import stripe_call
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
@@ -31,133 +44,201 @@ def is_admin(user):
     return user.is_superuser
 
 
+@cache_policy()
 def index(request):
     form = CollectionSelectForm(request.POST or None)
     collection = None
     products = Product.objects.none()
-    order_items = request.session.get("current_order_items", [])
+    snapshot_name = None
 
     if request.method == "POST" and form.is_valid():
         selected_collection = form.cleaned_data["collection"]
-        request.session["selected_collection_id"] = selected_collection.id
-
-        products = Product.objects.filter(
-            active=True, collection=selected_collection
-        ).select_related("collection").prefetch_related(
-            "category", "colors", "variants",
-            "variants__category", "variants__color",
-        ).order_by("name")
+        select_collection(request, selected_collection.id)
 
         if request.headers.get('HX-Request'):
-            return render(request, "order/partials/_products.html", {
-                "products": products,
-                "collection": selected_collection
-            })
+            snapshot = get_collection_snapshot(selected_collection.id)
+            return products_fragment_response(
+                request, f"collection:{selected_collection.id}",
+                snapshot["products"], snapshot["collection"],
+            )
 
         return redirect("order:index")
 
-    collection_id = request.session.get("selected_collection_id")
+    collection_id = get_selected_collection_id(request)
     if is_admin(request.user):
-        request.session.pop("selected_collection_id", None)
-        products = Product.objects.filter(
-            active=True, collection__active=True
-        )
+        select_collection(request, None)
+        products = get_active_products()
+        snapshot_name = "active-products"
     elif collection_id:
-        collection = get_object_or_404(Collection, pk=collection_id)
-        products = Product.objects.filter(
-            active=True, collection=collection
+        snapshot = get_collection_snapshot(collection_id)
+        if snapshot is None:
+            raise Http404("No Collection matches the given query.")
+        collection = snapshot["collection"]
+        products = snapshot["products"]
+        snapshot_name = f"collection:{collection_id}"
+
+    if request.headers.get("HX-Request") and snapshot_name:
+        return products_fragment_response(
+            request, snapshot_name, products, collection, request.GET.get("cursor"),
         )
 
-    products = products.select_related("collection").prefetch_related(
-        "category", "colors", "variants",
-        "variants__category", "variants__color",
-    ).order_by("name")
-
     context = {
         "form": form,
         "products": products,
-        "order_items": order_items,
         "collection": collection,
     }
 
     if request.headers.get("HX-Request"):
         return render(request, "order/partials/_products.html", context)
 
+    if collection:
+        context["products_html"] = mark_safe(
+            render_products_fragment(request, snapshot_name, products, collection)
+        )
+
     return render(request, "order/index.html", context)
 
 
 
+@cache_policy()
 def products(request, collection_id):
-    selected_products = Product.objects.filter(collection=collection_id)
-    context = {
-        "selected_products": selected_products,
+    snapshot = get_collection_snapshot(collection_id)
+    if snapshot is None:
+        raise Http404("No Collection matches the given query.")
+
+    return products_fragment_response(
+        request, f"collection:{collection_id}",
+        snapshot["products"], snapshot["collection"], request.GET.get("cursor"),
+    )
+
+
+@cache_policy()
+def product_search(request, collection_id):
+    query = request.GET.get("q", "").strip()
+    category_ids = request.GET.getlist("category")
+    color_ids = request.GET.getlist("color")
+
+    snapshot = get_collection_snapshot(collection_id)
+    if snapshot is None:
+        raise Http404("No Collection matches the given query.")
+    results = search_products(snapshot["products"], query, category_ids, color_ids, collection_id)
+
+    params = {"q": query, "category": category_ids, "color": color_ids}
+    template, context = products_page(
+        results["products"], snapshot["collection"],
+        request.GET.get("cursor"),
+        page_url=reverse("order:product_search", args=[collection_id]),
+        params=params,
+        facets=results["facets"],
+    )
+    context.update({"query": query, "searching": bool(query or category_ids or color_ids)})
+    return render(request, template, context)
+
+
+def _selected_variant(request):
+    """
+    Product and variant details posted by a product card, resolved from the
+    variant index. Returns (product, details) where details are the keyword
+    arguments for the cart's add methods.
+    """
+    color_id = request.POST.get("color")
+    category_id = request.POST.get("category")
+
+    index = get_variant_index()
+    product = index.get_product(request.POST.get("product"))
+    if product is None:
+        raise Http404("No Product matches the given query.")
+
+    # Store the base variant price only; upcharges are applied by price_cart
+    base_cents = index.prices.base_cents(product["id"], category_id, color_id)
+    return product, {
+        "color_id": color_id,
+        "color_name": index.color_name(color_id) if color_id else None,
+        "category_id": category_id,
+        "category_name": index.category_name(category_id) if category_id else None,
+        "price": from_cents(base_cents or 0),
+        "back_name": request.POST.get("back_name", "").strip(),
     }
-    return render(request, "order/partials/_products.html", context)
+
 
 @rate_limit('add_item', limit=30, period=60, message='You are adding items too quickly. Please slow down.')
 def add_item(request):
     if request.method != "POST":
         return HttpResponse(status=400)
 
-    product_id = request.POST.get("product")
+    product, details = _selected_variant(request)
     size = request.POST.get("size")
     quantity = int(request.POST.get("quantity", 1))
-    color_id = request.POST.get("color")
-    category_id = request.POST.get("category")
-    back_name = request.POST.get("back_name", "").strip()
-
-    product = get_object_or_404(Product, id=product_id)
-
-    color_name = None
-    if color_id:
-        color = ProductColor.objects.filter(id=color_id).first()
-        if color:
-            color_name = color.name
-
-    category_name = None
-    price = Decimal("0.00")
-
-    if category_id:
-        category = ProductCategory.objects.filter(id=category_id).first()
-        if category:
-            category_name = category.name
-            variant = product.variants.filter(category=category).first()
-            if variant:
-                price = variant.price
-
-    if price == Decimal("0.00"):
-        first_variant = product.variants.first()
-        if first_variant:
-            price = first_variant.price
-
-        if size == Size.ADULT_2X or size == Size.ADULT_3X:
-            price += 2
-
-        if back_name:
-            price += 2
-
-        if size == Size.ADULT_4X:
-            price += 3
-
-    order_items = request.session.get("current_order_items", [])
-    order_items.append({
-        "product_id": product.id,
-        "product_name": product.name,
-        "size": size,
-        "quantity": quantity,
-        "color_id": color_id,
-        "color_name": color_name,
-        "category_id": category_id,
-        "category_name": category_name,
-        "price": str(price),
-        "back_name": back_name,
-    })
-    request.session["current_order_items"] = order_items
-    request.session.modified = True
+
+    get_cart(request).add(product["id"], product["name"], size, quantity, **details)
 
     messages.success(request, "Added to cart")
-    return HTMXResponse(trigger="items-updated")
+    return cart_oob_response(request, trigger="items-updated")
+
+
+@rate_limit('add_item', limit=30, period=60, message='You are adding items too quickly. Please slow down.')
+def add_items(request):
+    """
+    Add a size -> quantity grid (qty-<size> fields) for one product variant
+    to the cart. Shares add_item's rate limit bucket and counts as one add.
+    """
+    if request.method != "POST":
+        return HttpResponse(status=400)
+
+    product, details = _selected_variant(request)
+    sizes = get_variant_index().available_sizes(product["id"], details["category_id"], details["color_id"])
+
+    quantities = {}
+    for field, value in request.POST.items():
+        if not field.startswith("qty-") or not value.strip():
+            continue
+        size = field[len("qty-"):]
+        quantity = parse_id(value)
+        if quantity is None or not 0 <= quantity <= MAX_LINE_QUANTITY:
+            messages.error(request, f"Enter a quantity between 0 and {MAX_LINE_QUANTITY} for size {size}.")
+            return HttpResponse(status=400)
+        if quantity and size not in sizes:
+            messages.error(request, f"Size {size} is not available for this item.")
+            return HttpResponse(status=400)
+        if quantity:
+            quantities[size] = quantity
+
+    if not quantities:
+        messages.error(request, "Enter a quantity for at least one size.")
+        return HttpResponse(status=400)
+
+    get_cart(request).add_many(product["id"], product["name"], quantities, **details)
+
+    messages.success(request, f"Added {sum(quantities.values())} items to cart")
+    return cart_oob_response(request, trigger="items-updated")
+
+
+@rate_limit('roster', limit=10, period=60, message='You are uploading rosters too quickly. Please slow down.')
+def upload_roster(request):
+    """
+    Build cart lines from an uploaded CSV/XLSX roster in one request. Rows
+    are resolved against the selected collection; if any row is invalid
+    nothing is added and a per-row error report is returned instead.
+    """
+    if request.method != "POST" or "roster" not in request.FILES:
+        return HttpResponse(status=400)
+
+    collection_id = get_selected_collection_id(request)
+    snapshot = get_collection_snapshot(collection_id) if collection_id else None
+    products = snapshot["products"] if snapshot else get_active_products()
+
+    try:
+        lines, errors = resolve_roster(read_roster_frame(request.FILES["roster"]), products)
+    except RosterError as error:
+        lines, errors = [], [(None, str(error))]
 
+    if errors:
+        return render(request, "order/partials/_roster-report.html", {"errors": errors})
+
+    get_cart(request).add_lines(lines)
+
+    messages.success(request, f"Added {sum(line['quantity'] for line in lines)} items from the roster")
+    return cart_oob_response(request, trigger="items-updated")
 
 
 # def confirm_order(request):
@@ -231,44 +312,12 @@ def add_item(request):
 
 @rate_limit('checkout', limit=5, period=300, message='Too many checkout attempts. Please wait 5 minutes before trying again.')
 def confirm_order(request):
-    order_items = request.session.get("current_order_items", [])
-    if not order_items or request.method != "POST":
+    cart = get_cart(request)
+    if request.method != "POST" or not cart.items():
         return redirect("order:index")
 
-    valid_items = []
-    total_cost = Decimal("0.00")
-
-    for item in order_items:
-        product = Product.objects.filter(pk=item.get("product_id")).first()
-        if not product:
-            continue
-
-        size = item.get("size")
-        back_name = item.get("back_name")
-        price = Decimal(item.get("price", "0.00"))
-
-        if size in [Size.ADULT_2X, Size.ADULT_3X]:
-            price += 2
-        if size == Size.ADULT_4X:
-            price += 3
-        if back_name:
-            price += 2
-
-        valid_items.append({
-            "product_id": product.id,
-            "product_name": product.name,
-            "size": size,
-            "quantity": int(item.get("quantity", 1)),
-            "color_name": item.get("color_name"),
-            "category_name": item.get("category_name"),
-            "category_id": item.get("category_id"),
-            "price": str(price),
-            "back_name": back_name,
-        })
-
-        total_cost += price * int(item.get("quantity", 1))
-
-    if not valid_items:
+    priced_lines, total_cents = cart.priced()
+    if not priced_lines:
         return redirect("order:index")
 
     customer_data = {
@@ -276,69 +325,52 @@ def confirm_order(request):
         "customer_email": request.POST.get("customer_email", ""),
     }
 
-    line_items = []
-    for item in valid_items:
-        product = Product.objects.get(pk=item["product_id"])
-        line_items.append({
-            "price_data": {
-                "currency": "usd",
-                "product_data": {
-                    "images": [request.build_absolute_uri(product.image.url)],
-                    "name": item["product_name"],
-                    "description": f"Size: {item['size']}, Color: {item['color_name'] or ''}, Category: {item['category_name'] or ''}, Custom Name: {item['back_name'] or ''}",
-                    "metadata": {
-                        "product_id": str(item["product_id"]),
-                        "size": item['size'],
-                        "color": item['color_name'] or '',
-                        "category": item['category_name'] or '',
-                        "back_name": item['back_name'] or '',
-                    }
-                },
-                "unit_amount": int(Decimal(item["price"]) * 100),
-            },
-            "quantity": item["quantity"],
-        })
+    try:
+        line_items = checkout_line_items(request, priced_lines)
+    except CheckoutError as error:
+        messages.error(request, str(error))
+        return redirect("order:index")
 
-    request.session['pending_order_data'] = {
-        'customer_name': customer_data["customer_name"],
-        'customer_email': customer_data["customer_email"],
-        'items': valid_items,
-    }
+    # The order waits in the database; Stripe only carries its order_id
+    order = create_pending_order(customer_data["customer_name"], customer_data["customer_email"], priced_lines)
 
     metadata = {
         "customer_name": customer_data["customer_name"],
         "customer_email": customer_data["customer_email"],
-        "session_key": request.session.session_key,
+        "order_id": order.order_id,
     }
 
-    checkout_session = stripe.checkout.Session.create(
-        payment_method_types=['card'],
-        mode='payment',
-        line_items=line_items,
-        success_url=request.build_absolute_uri(reverse('order:payment-success')) + '?session_id={CHECKOUT_SESSION_ID}',
-        cancel_url=request.build_absolute_uri(reverse('order:payment-cancel')),
-        metadata=metadata,
-        customer_email=customer_data["customer_email"],
-    )
+    try:
+        checkout_session = stripe_call(
+            "checkout.session.create",
+            stripe.checkout.Session.create,
+            payment_method_types=['card'],
+            mode='payment',
+            line_items=line_items,
+            success_url=(
+                request.build_absolute_uri(reverse('order:payment-success'))
+                + f'?session_id={{CHECKOUT_SESSION_ID}}&order={order.order_id}'
+            ),
+            cancel_url=request.build_absolute_uri(reverse('order:payment-cancel')),
+            metadata=metadata,
+            client_reference_id=order.order_id,
+            customer_email=customer_data["customer_email"],
+        )
+    except stripe.StripeError as error:
+        logger.warning("Checkout session could not be created: %s", error)
+        order.delete()
+        messages.error(request, "We couldn't reach the payment processor. Your cart is saved, please try again shortly.")
+        return redirect("order:index")
 
-    request.session.pop("current_order_items", None)
+    cart.clear()
 
     return redirect(checkout_session.url, code=303)
 
 
-def delete_item(request, product_id, size):
+def delete_item(request, line_id):
     if request.method == "POST":
-        order_items = request.session.get("current_order_items", [])
-
-        for i, item in enumerate(order_items):
-            if item["product_id"] == product_id and item["size"] == size:
-                del order_items[i]
-                break
-
-        request.session["current_order_items"] = order_items
-        request.session.modified = True
-
-        return HTMXResponse(trigger="items-updated")
+        get_cart(request).remove(line_id)
+        return cart_oob_response(request, trigger="items-updated")
 
     return HTMXResponse()
 
@@ -348,72 +380,30 @@ def payment_success(request):
     if not session_id:
         return redirect("order:index")
 
-    try:
+    order_id = request.GET.get("order")
+    if order_id:
+        order = Order.objects.filter(order_id=order_id).first()
+    else:
         order = Order.objects.filter(stripe_session_id=session_id).first()
 
-        if not order:
-            session = stripe.checkout.Session.retrieve(session_id)
-
-            order = Order.objects.create(
-                customer_name=session['metadata'].get('customer_name', ''),
-                customer_email=session['metadata'].get('customer_email', ''),
-                stripe_session_id=session_id,
-                has_paid=True,
-            )
-
-            line_items = stripe.checkout.Session.list_line_items(
-                session_id,
-                limit=100,
-                expand=['data.price.product']
-            )
-
-            for line_item in line_items.data:
-                product_name = ""
-                if hasattr(line_item.price, 'product') and isinstance(line_item.price.product, stripe.Product):
-                    product_name = line_item.price.product.name
-                    metadata = line_item.price.product.metadata if hasattr(line_item.price.product, 'metadata') else {}
-                else:
-                    metadata = {}
-
-                size = metadata.get('size', '')
-                color = metadata.get('color', '')
-                back_name = metadata.get('back_name', '')
-                category = metadata.get('category', '')
-                product_id = metadata.get('product_id', '')  # Get product_id from metadata
-
-                unit_price = Decimal(line_item.amount_total) / 100 / line_item.quantity
-
-                product = None
-                if product_id:
-                    try:
-                        product = Product.objects.get(pk=int(product_id))
-                    except (Product.DoesNotExist, ValueError):
-                        product = None
-
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    product_name=product_name,
-                    size=size,
-                    quantity=line_item.quantity,
-                    product_color=color,
-                    product_category=category,
-                    product_cost=unit_price,
-                    back_name=back_name if back_name else "",
-                )
+    if order is not None and order.pending_items is not None:
+        # Stripe sends the shopper here before (or instead of) the webhook; confirm the payment directly
+        try:
+            session = stripe_call("checkout.session.retrieve", stripe.checkout.Session.retrieve, session_id)
+            if session.metadata.get("order_id") == order.order_id and session.payment_status in ("paid", "no_payment_required"):
+                complete_order(order.order_id, session_id)
+            order.refresh_from_db()
+        except stripe.StripeError as error:
+            logger.warning("Could not confirm payment for Stripe session %s: %s", session_id, error)
 
-        total_cost = Decimal("0.00")
+    total_cost = Decimal("0.00")
+    if order is None or not order.has_paid:
+        order = None
+    else:
         for item in order.items.all():
             price = item.product_cost or Decimal("0.00")
             total_cost += price * item.quantity
 
-    except Exception as e:
-        print(f"Payment success error: {e}")
-        import traceback
-        traceback.print_exc()
-        order = None
-        total_cost = Decimal("0.00")
-
     return render(request, "order/payment-success.html", {
         "order": order,
         "total_cost": total_cost
@@ -424,95 +414,29 @@ def payment_cancel(request):
     return render(request, "order/payment-cancel.html")
 
 def view_summary(request):
-    order_items = request.session.get("current_order_items", [])
     collections = Collection.objects.filter(active=True)
 
-    total_cost = Decimal("0.00")
-    cleaned_items = []
-
-    for item in order_items:
-        try:
-            product = Product.objects.get(id=item["product_id"])
-        except Product.DoesNotExist:
-            continue
-
-        price = Decimal(item.get("price", "0.00"))
-
-        size = item.get("size")
-
-        back_name = item.get("back_name")
-
-        if size == Size.ADULT_2X or size == Size.ADULT_3X:
-            price = price + 2
-
-        if size == Size.ADULT_4X:
-            price = price + 3
+    priced_lines, total_cents = get_cart(request).priced()
 
-        if back_name:
-            price = price + 2
-
-        quantity = int(item.get("quantity", 1))
-        total_cost += price * quantity
-
-        cleaned_items.append({
-            **item,
-            "product": product,
-            "product_color": item.get("color_name"),
-            "product_category": item.get("category_name"),
-            "product_price": price,
-        })
+    cleaned_items = [
+        {
+            **line,
+            "product_color": line.get("color_name"),
+            "product_category": line.get("category_name"),
+            "product_price": from_cents(line["unit_cents"]),
+        }
+        for line in priced_lines
+    ]
 
     return render(request, "order/modals/order-summary.html", {
         "order_items": cleaned_items,
         "collections": collections,
-        "total_cost": total_cost,
+        "total_cost": from_cents(total_cents),
     })
 
 
 def shopping_cart(request):
-    order_items = request.session.get("current_order_items", [])
-    collection_id = request.session.get("selected_collection_id")
-    collection = None
-    total_cost = Decimal("0.00")
-
-    if collection_id:
-        from .models import Collection
-        collection = Collection.objects.filter(pk=collection_id).first()
-
-    enriched_items = []
-    for item in order_items:
-        try:
-            product = Product.objects.get(id=item["product_id"])
-            price = Decimal(item.get("price", "0.00"))
-
-            # Apply size upcharges
-            size = item.get("size")
-            if size in [Size.ADULT_2X, Size.ADULT_3X]:
-                price += Decimal("2.00")
-            elif size == Size.ADULT_4X:
-                price += Decimal("3.00")
-
-            # Apply back name upcharge
-            if item.get("back_name"):
-                price += Decimal("2.00")
-
-            quantity = int(item.get("quantity", 1))
-            total_cost += price * quantity
-
-            enriched_items.append({
-                **item,
-                "product": product,
-                "product_price": price,
-            })
-        except Product.DoesNotExist:
-            continue
-
-    context = {
-        "order_items": enriched_items,
-        "collection": collection,
-        "total_cost": total_cost,
-    }
-    return render(request, "order/partials/_shopping-cart.html", context)
+    return cart_fragment_response(request)
 
 @user_passes_test(is_admin)
 @login_required
@@ -583,7 +507,7 @@ def order_list(request):
     page = request.GET.get('page', 1)
     orders_per_page = 20
 
-    all_orders = Order.objects.filter(archived=False).prefetch_related("items__product").order_by("-created_at")
+    all_orders = Order.objects.filter(archived=False, pending_items__isnull=True).prefetch_related("items__product").order_by("-created_at")
 
     paginator = Paginator(all_orders, orders_per_page)
     orders = paginator.get_page(page)
@@ -737,7 +661,7 @@ def collection_list(request):
     return render(request, "order/partials/_collections-list.html", context)
 
 def order_download(request):
-    orders = Order.objects.filter(archived=False).prefetch_related("items")
+    orders = Order.objects.filter(archived=False, pending_items__isnull=True).prefetch_related("items")
 
     rows = []
     for order in orders:
@@ -877,28 +801,34 @@ def get_variant_sizes(request, product_id):
     category_id = request.GET.get('category')
     color_id = request.GET.get('color')
 
-    product = get_object_or_404(Product, pk=product_id)
-
-    variant_qs = ProductVariant.objects.filter(product=product)
-    if category_id:
-        variant_qs = variant_qs.filter(category_id=category_id)
-    if color_id:
-        variant_qs = variant_qs.filter(color_id=color_id)
+    index = get_variant_index()
+    if index.get_product(product_id) is None:
+        raise Http404("No Product matches the given query.")
 
-    variant = variant_qs.first()
-
-    if variant and variant.available_sizes:
-        sizes = [(size_code, Size(size_code).label) for size_code in variant.available_sizes]
-    else:
-        sizes = product.get_available_sizes
+    labels = dict(Size.choices)
+    sizes = [
+        (size_code, labels.get(size_code, size_code))
+        for size_code in index.available_sizes(product_id, category_id, color_id)
+    ]
 
     return render(request, "order/partials/_variant-info.html", {
-        "product": product,
         "sizes": sizes,
         "current_size": None
     })
 
 
+def collection_availability(request, collection_id):
+    availability = get_collection_availability(collection_id)
+    etag = f'"availability-{collection_id}-{availability["v"]}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(availability)
+        response.headers["ETag"] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
 def get_variant_price(request, product_id):
     category_id = request.GET.get('category')
     color_id = request.GET.get('color')
@@ -906,38 +836,21 @@ def get_variant_price(request, product_id):
     back_name = request.GET.get('back_name')
 
     if not category_id or category_id == '':
-        return HttpResponse('<i class="bi bi-currency-dollar"></i>0.00')
+        return HttpResponse('$0.00')
 
-    variant_qs = ProductVariant.objects.filter(product_id=product_id)
-
-    if category_id and category_id.isdigit():
-        variant_qs = variant_qs.filter(category_id=int(category_id))
-
-    if color_id and color_id.isdigit():
-        variant_qs = variant_qs.filter(color_id=int(color_id))
-
-    variant = variant_qs.first()
-
-    if not variant and category_id and category_id.isdigit():
-        variant_qs = ProductVariant.objects.filter(product_id=product_id, category_id=int(category_id))
-        variant = variant_qs.first()
-
-    if not variant:
-        return HttpResponse('<i class="bi bi-currency-dollar"></i>0.00')
-
-    price = variant.price
+    base_cents = get_variant_index().prices.base_cents(
+        product_id, category_id, color_id, product_fallback=False
+    )
 
-    if back_name:
-        price += 2
+    if base_cents is None:
+        return HttpResponse('$0.00')
 
-    if size in [Size.ADULT_2X, Size.ADULT_3X]:
-        price += 2
-    elif size == Size.ADULT_4X:
-        price += 3
+    price = from_cents(base_cents + upcharge_cents(size, back_name))
 
-    return HttpResponse(f'<i class="bi bi-currency-dollar"></i>{price:.2f}')
+    return HttpResponse(f'${price:.2f}')
 
 
+@cache_policy()
 def about(request):
     return render(request, "order/about.html")
 
@@ -975,7 +888,7 @@ def bulk_archive_orders(request):
 @login_required
 def archived_orders(request):
     """View archived orders"""
-    orders = Order.objects.filter(archived=True).prefetch_related("items__product").order_by("-created_at")
+    orders = Order.objects.filter(archived=True, pending_items__isnull=True).prefetch_related("items__product").order_by("-created_at")
     total = orders.count()
     context = {'orders': orders, 'is_archived_view': True, 'total_orders': total}
     return render(request, "order/order-archive.html", context)
@@ -996,6 +909,7 @@ def restore_order(request, order_id):
 
 
 @rate_limit('contact', limit=3, period=300, message='Too many contact form submissions. Please wait 5 minutes before trying again.')
+@cache_policy()
 def contact_page(request):
     if request.method == 'POST':
         form = ContactForm(request.POST)
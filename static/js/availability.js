@@ -0,0 +1,73 @@
+// static/js/availability.js
+
+// Loads the collection availability matrix (order:collection_availability)
+// once per product grid and switches size options locally when a card's
+// category or color changes. Until the matrix has loaded, the card's own
+// hx-get to get_variant_sizes runs as before.
+const availabilityByUrl = new Map();
+
+function loadAvailability(root) {
+  const container = root.querySelector ? root : document;
+  container.querySelectorAll('[data-availability-url]').forEach(function(grid) {
+    const url = grid.dataset.availabilityUrl;
+    if (availabilityByUrl.has(url)) return;
+
+    availabilityByUrl.set(url, null);
+    fetch(url, { credentials: 'same-origin' })
+      .then((response) => response.ok ? response.json() : Promise.reject(response))
+      .then((data) => availabilityByUrl.set(url, data))
+      .catch(() => availabilityByUrl.delete(url));
+  });
+}
+
+function availabilityFor(element) {
+  const grid = element.closest('[data-availability-url]');
+  return grid ? availabilityByUrl.get(grid.dataset.availabilityUrl) : null;
+}
+
+// Mirrors get_variant_sizes: first variant matching the selected category
+// and color, falling back to the product's sizes when it has none.
+function resolveSizes(product, categoryId, colorId) {
+  const variant = product.variants.find(function(v) {
+    return (!categoryId || String(v[0]) === categoryId)
+      && (!colorId || String(v[1]) === colorId);
+  });
+  return variant && variant[3].length ? variant[3] : product.sizes;
+}
+
+function renderSizes(select, sizes, labels) {
+  select.innerHTML = '';
+  sizes.forEach(function(code) {
+    const option = document.createElement('option');
+    option.value = code;
+    option.textContent = labels[code] || code;
+    select.appendChild(option);
+  });
+  select.dispatchEvent(new Event('change', { bubbles: true }));
+}
+
+// Cancel the per-card get_variant_sizes request when the matrix can answer it
+document.addEventListener('htmx:confirm', function(event) {
+  const elt = event.detail.elt;
+  const form = elt.closest && elt.closest('form[data-product-id]');
+  if (!form || (elt.name !== 'category' && elt.name !== 'color')) return;
+
+  const availability = availabilityFor(form);
+  const product = availability && availability.products[form.dataset.productId];
+  if (!product) return;
+
+  event.preventDefault();
+
+  const category = form.querySelector('[name="category"]');
+  const color = form.querySelector('[name="color"]');
+  const sizes = resolveSizes(product, category ? category.value : '', color ? color.value : '');
+  renderSizes(form.querySelector('[name="size"]'), sizes, availability.labels);
+});
+
+document.addEventListener('DOMContentLoaded', function() {
+  loadAvailability(document);
+});
+
+document.addEventListener('htmx:afterSwap', function(event) {
+  loadAvailability(event.detail.target);
+});
@@ -17,4 +17,17 @@ function updateCartUI(itemCount, totalCost) {
   if (checkoutBtn) {
     checkoutBtn.disabled = itemCount === 0;
   }
-}
\ No newline at end of file
+}
+// The cart fragment carries its count and total on #cart-state rather than
+// an inline script, since the rendered fragment is cached server-side. It
+// arrives either from the sidebar's own load or out of band from a cart action.
+['htmx:afterSwap', 'htmx:oobAfterSwap'].forEach(function(eventName) {
+  document.addEventListener(eventName, function(event) {
+    if (event.detail.target.id !== 'cart-items-container') return;
+
+    const state = document.getElementById('cart-state');
+    if (state) {
+      updateCartUI(parseInt(state.dataset.count, 10) || 0, state.dataset.total || 0);
+    }
+  });
+});
@@ -10,11 +10,10 @@ function toggleCart() {
     sidebar.classList.add('translate-x-full');
     overlay.classList.add('opacity-0', 'pointer-events-none');
   } else {
-    // Open cart
+    // Open cart; its contents are kept current by the cart actions'
+    // out-of-band swaps, so there is nothing to reload
     sidebar.classList.remove('translate-x-full');
     overlay.classList.remove('opacity-0', 'pointer-events-none');
-    // Trigger HTMX to load cart items
-    htmx.trigger('#cart-items-container', 'items-updated');
   }
 }
 
@@ -39,10 +38,18 @@ function updateCartCount(count) {
   }
 }
 
+// Line count from the signed "cart" cookie ("<count>.<version>.<cart id>:<signature>")
+// set by the server whenever the cart changes (order.cart.set_cart_cookie)
+function cartCookieCount() {
+  const match = document.cookie.match(/(?:^|;\s*)cart="?(\d+)\./);
+  return match ? parseInt(match[1], 10) : 0;
+}
+
 // Initialize cart on page load
 document.addEventListener('DOMContentLoaded', function() {
-  // Load cart items on page load
-  htmx.trigger('#cart-items-container', 'items-updated');
+  // Show the badge straight away; the sidebar loads its items itself
+  // (hx-trigger="load" in base.html)
+  updateCartCount(cartCookieCount());
 
   // Close cart with Escape key
   document.addEventListener('keydown', function(e) {
@@ -54,17 +61,10 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   });
 
-  // Handle successful item deletion
-  document.body.addEventListener('htmx:afterRequest', function(event) {
-    if (event.detail.pathInfo.requestPath.includes('delete-item')) {
-      // Reload cart items after deletion
-      htmx.trigger('#cart-items-container', 'items-updated');
-    }
-  });
-
-  // Auto-open cart when items are added
-  document.body.addEventListener('htmx:afterRequest', function(event) {
-    if (event.detail.pathInfo.requestPath.includes('add-item')) {
+  // Auto-open cart when items are added (item, size grid or roster)
+  document.body.addEventListener('items-updated', function() {
+    const sidebar = document.getElementById('cart-sidebar');
+    if (sidebar.classList.contains('translate-x-full')) {
       toggleCart();
     }
   });
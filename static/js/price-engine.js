@@ -0,0 +1,80 @@
+// static/js/price-engine.js
+
+// Prices product cards in the browser from the matrix the server embeds in
+// each card (order.pricing.product_price_matrix). Cards without a usable
+// matrix fall back to the get_variant_price endpoint via "price-fallback".
+const PRICING_VERSION = 1;
+
+function readPriceMatrix(form) {
+  try {
+    const matrix = JSON.parse(form.dataset.priceMatrix);
+    return matrix && matrix.v === PRICING_VERSION ? matrix : null;
+  } catch (e) {
+    return null;
+  }
+}
+
+// Mirrors get_variant_price: exact category/color match first, then the
+// first variant in the category.
+function variantPriceCents(matrix, categoryId, colorId) {
+  if (!categoryId) return null;
+
+  if (colorId) {
+    const exact = matrix.p[categoryId + ':' + colorId];
+    if (exact !== undefined) return exact;
+  }
+
+  const byCategory = matrix.c[categoryId];
+  return byCategory !== undefined ? byCategory : null;
+}
+
+function formatPrice(cents) {
+  return '$' + (cents / 100).toFixed(2);
+}
+
+function updateCardPrice(form) {
+  const productId = form.dataset.productId;
+  const priceEl = document.getElementById('product-price-' + productId);
+  if (!priceEl) return;
+
+  const matrix = readPriceMatrix(form);
+  if (!matrix) {
+    htmx.trigger(priceEl, 'price-fallback');
+    return;
+  }
+
+  const field = (name) => {
+    const el = form.querySelector('[name="' + name + '"]');
+    return el ? el.value : '';
+  };
+
+  const base = variantPriceCents(matrix, field('category'), field('color'));
+  if (base === null) {
+    priceEl.innerHTML = formatPrice(0);
+    return;
+  }
+
+  let cents = base + (matrix.u[field('size')] || 0);
+  if (field('back_name')) {
+    cents += matrix.b;
+  }
+  priceEl.innerHTML = formatPrice(cents);
+}
+
+['change', 'input'].forEach(function(eventName) {
+  document.addEventListener(eventName, function(event) {
+    const form = event.target.closest && event.target.closest('form[data-product-id]');
+    if (form) {
+      updateCardPrice(form);
+    }
+  });
+});
+
+// Re-price after get_variant_sizes swaps in a new size list, since the
+// selected size may have been cleared without a change event.
+document.addEventListener('htmx:afterSwap', function(event) {
+  const form = event.detail.target.closest && event.detail.target.closest('form[data-product-id]');
+  if (form) {
+    updateCardPrice(form);
+  }
+});
@@ -0,0 +1,14 @@
+/** Tailwind build for `python manage.py build_assets` (see bin/post_compile) */
+module.exports = {
+  content: [
+    "./templates/**/*.html",
+    "./order/templates/**/*.html",
+    "./order/**/*.py",
+    "./core/**/*.py",
+    "./static/js/**/*.js",
+  ],
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+};